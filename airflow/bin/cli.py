@@ -378,6 +378,9 @@ def run(args, dag=None):
         if not os.path.exists(filename):
             open(filename, "a").close()
             os.chmod(filename, 0o666)
+        # the log of the previous runs on this host is already stored
+        # remotely, only what this run appends is uploaded
+        log_offset = os.path.getsize(filename)
 
         logging.basicConfig(
             filename=filename,
@@ -478,18 +481,19 @@ def run(args, dag=None):
         remote_base = conf.get('core', 'S3_LOG_FOLDER')
 
     if os.path.exists(filename):
-        # read log and remove old logs to get just the latest additions
-
-        with open(filename, 'r') as logfile:
-            log = logfile.read()
+        # upload just the latest additions to the log, streamed from the file
+        if log_offset > os.path.getsize(filename):
+            log_offset = 0
 
         remote_log_location = filename.replace(log_base, remote_base)
         # S3
         if remote_base.startswith('s3:/'):
-            logging_utils.S3Log().write(log, remote_log_location)
+            logging_utils.S3Log().write_file(
+                filename, remote_log_location, offset=log_offset)
         # GCS
         elif remote_base.startswith('gs:/'):
-            logging_utils.GCSLog().write(log, remote_log_location)
+            logging_utils.GCSLog().write_file(
+                filename, remote_log_location, offset=log_offset)
         # Other
         elif remote_base and remote_base != 'None':
             logging.error(
@@ -882,6 +886,32 @@ def scheduler(args):
         job.run()
 
 
+def heartbeat_agent(args):
+    job = jobs.HeartbeatAgentJob()
+
+    if args.daemon:
+        pid, stdout, stderr, log_file = setup_locations("heartbeat_agent", args.pid, args.stdout, args.stderr, args.log_file)
+        handle = setup_logging(log_file)
+        stdout = open(stdout, 'w+')
+        stderr = open(stderr, 'w+')
+
+        ctx = daemon.DaemonContext(
+            pidfile=TimeoutPIDLockFile(pid, -1),
+            files_preserve=[handle],
+            stdout=stdout,
+            stderr=stderr,
+        )
+        with ctx:
+            job.run()
+
+        stdout.close()
+        stderr.close()
+    else:
+        signal.signal(signal.SIGINT, sigint_handler)
+        signal.signal(signal.SIGTERM, sigint_handler)
+        job.run()
+
+
 def serve_logs(args):
     print("Starting flask")
     import flask
@@ -890,11 +920,32 @@ def serve_logs(args):
     @flask_app.route('/log/<path:filename>')
     def serve_logs(filename):  # noqa
         log = os.path.expanduser(conf.get('core', 'BASE_LOG_FOLDER'))
-        return flask.send_from_directory(
-            log,
-            filename,
-            mimetype="application/json",
-            as_attachment=False)
+        byte_range = flask.request.range
+        if byte_range is None:
+            return flask.send_from_directory(
+                log,
+                filename,
+                mimetype="application/json",
+                as_attachment=False)
+
+        # serve only the requested bytes, so that the web server can show
+        # big logs a chunk at a time
+        path = flask.safe_join(log, filename)
+        if not os.path.isfile(path):
+            flask.abort(404)
+        length = os.path.getsize(path)
+        requested = byte_range.range_for_length(length)
+        if requested is None:
+            response = flask.Response(status=416)
+            response.headers['Content-Range'] = 'bytes */{}'.format(length)
+            return response
+        start, stop = requested
+        with open(path, 'rb') as f:
+            f.seek(start)
+            data = f.read(stop - start)
+        response = flask.Response(data, status=206, mimetype="application/json")
+        response.headers['Content-Range'] = byte_range.to_content_range_header(length)
+        return response
     WORKER_LOG_SERVER_PORT = \
         int(conf.get('celery', 'WORKER_LOG_SERVER_PORT'))
     flask_app.run(
@@ -1579,6 +1630,11 @@ class CLIFactory(object):
             'args': ('dag_id_opt', 'subdir', 'run_duration', 'num_runs',
                      'do_pickle', 'pid', 'daemon', 'stdout', 'stderr',
                      'log_file'),
+        }, {
+            'func': heartbeat_agent,
+            'help': "Start a heartbeat agent, which writes the heartbeats "
+                    "of all the jobs running on this host at once",
+            'args': ('pid', 'daemon', 'stdout', 'stderr', 'log_file'),
         }, {
             'func': worker,
             'help': "Start a Celery worker node",
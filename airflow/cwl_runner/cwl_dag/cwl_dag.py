@@ -13,8 +13,9 @@ import shutil
 import ruamel.yaml as yaml
 import logging
 import tempfile
-import re
-from airflow.cwl_runner.cwlutils import conf_get_default, get_only_files
+from airflow.cwl_runner.cwlutils import conf_get_default, get_only_files, get_jobs_folder_structure
+from airflow.cwl_runner.jobwatcher import read_jobs_state
+from airflow.cwl_runner.workflowindex import WorkflowIndex
 
 class SkipException(Exception):
     pass
@@ -143,37 +144,10 @@ def make_dag(job_file, workflow_file):
 
 
 def find_workflow(job_filename):
-    workflows_folder = conf.get('biowardrobe', 'CWL_WORKFLOWS')
-    all_workflows = {}
-    for root, dirs, files in os.walk(workflows_folder):
-        all_workflows.update( \
-                              { filename: os.path.join(root, filename) \
-                                for filename in files \
-                                if  os.path.splitext(filename)[1]=='.cwl' \
-                                    and (filename not in all_workflows \
-                                                 or os.path.getctime(os.path.join(root, filename)) < \
-                                                 os.path.getctime( all_workflows[filename]) ) \
-                              } \
-                            )
-    for key in sorted(all_workflows, key=len, reverse=True):
-        if re.match(os.path.splitext(key)[0], os.path.basename(job_filename)):
-            return all_workflows[key]
-    raise cwltool.errors.WorkflowException("Correspondent workflow is not found")
-
-
-def get_jobs_folder_structure(monitor_folder):
-    jobs = []
-    for root, dirs, files in os.walk(monitor_folder):
-        if 'new' in dirs:
-            job_rec = { "new": os.path.join(root, "new"),
-                        "running": os.path.join(root, "running"),
-                        "fail": os.path.join(root, "fail"),
-                        "success": os.path.join(root, "success")}
-            for key,value in job_rec.iteritems():
-                if not os.path.exists(value):
-                    raise ValueError("Failed to find {}".format(value))
-            jobs.append(job_rec)
-    return jobs
+    workflow = workflow_index.find(job_filename)
+    if not workflow:
+        raise cwltool.errors.WorkflowException("Correspondent workflow is not found")
+    return workflow
 
 
 logging.getLogger('cwltool').setLevel(eval_log_level(conf_get_default('biowardrobe', 'LOG_LEVEL', 'INFO').upper()))
@@ -181,25 +155,33 @@ logging.getLogger('salad').setLevel(eval_log_level(conf_get_default('biowardrobe
 
 max_jobs_to_run = get_max_jobs_to_run()
 monitor_folder = conf.get('biowardrobe', 'CWL_JOBS')
+workflow_index = WorkflowIndex(conf.get('biowardrobe', 'CWL_WORKFLOWS'))
 
-jobs_list = get_jobs_folder_structure (monitor_folder)
+jobs_state = read_jobs_state(monitor_folder)
 
-tot_files_run = len(get_only_files(jobs_list, key="running"))
-tot_files_new = len(get_only_files(jobs_list, key="new"))
+if jobs_state:
+    # job watcher is running and has already moved new jobs into running
+    running_jobs = jobs_state["jobs"]["running"]
+else:
+    jobs_list = get_jobs_folder_structure (monitor_folder)
 
-# add new jobs into running
-if tot_files_run < max_jobs_to_run and tot_files_new > 0:
-    for i in range(min(max_jobs_to_run - tot_files_run, tot_files_new)):
-        oldest = min(get_only_files(jobs_list, key="new", excl_key='running'), key=os.path.getctime)
-        print "mv {0} {1}".format (oldest, os.path.join('/'.join(oldest.split('/')[0:-2]), 'running'))
-        try:
-            shutil.move(oldest, os.path.join('/'.join(oldest.split('/')[0:-2]), 'running'))
-        except IOError as ex:
-            print "Job file was moved to running folder by another dag: "+str(ex)
+    tot_files_run = len(get_only_files(jobs_list, key="running"))
+    tot_files_new = len(get_only_files(jobs_list, key="new"))
 
+    # add new jobs into running
+    if tot_files_run < max_jobs_to_run and tot_files_new > 0:
+        for i in range(min(max_jobs_to_run - tot_files_run, tot_files_new)):
+            oldest = min(get_only_files(jobs_list, key="new", excl_key='running'), key=os.path.getctime)
+            print "mv {0} {1}".format (oldest, os.path.join('/'.join(oldest.split('/')[0:-2]), 'running'))
+            try:
+                shutil.move(oldest, os.path.join('/'.join(oldest.split('/')[0:-2]), 'running'))
+            except IOError as ex:
+                print "Job file was moved to running folder by another dag: "+str(ex)
 
+    running_jobs = get_only_files(jobs_list, key="running")
 
-for fn in get_only_files(jobs_list, key="running"):
+
+for fn in running_jobs:
     try:
         make_dag(fn, find_workflow(fn))
     except SkipException:
@@ -0,0 +1,144 @@
+#
+# CWL workflow cache
+#   Keeps loaded and validated workflows in memory and pickled on disk,
+#   so schema-salad resolves the same workflow only once. Entry is keyed
+#   by workflow location, strict flag and file content and is invalidated
+#   when the workflow or any of the files it imports changes its mtime
+#
+
+import cwltool.load_tool
+import cwltool.workflow
+import cwltool.main
+from cwltool.resolver import tool_resolver
+from schema_salad.ref_resolver import Loader, uri_file_path
+from airflow.configuration import AIRFLOW_HOME
+from airflow.cwl_runner.cwlutils import conf_get_default
+from six.moves import urllib, cPickle as pickle
+import hashlib
+import logging
+import os
+import tempfile
+
+
+_loaded_workflows = {}
+_cwltool_version = None
+
+
+def get_cache_folder():
+    return conf_get_default('biowardrobe', 'CWL_CACHE_FOLDER', os.path.join(AIRFLOW_HOME, 'cwl_cache'))
+
+
+def get_cache_key(workflow, strict):
+    global _cwltool_version
+    if _cwltool_version is None:
+        _cwltool_version = cwltool.main.versionstring()
+    key = hashlib.sha1()
+    key.update(_cwltool_version.encode('utf-8'))
+    key.update(os.path.abspath(workflow).encode('utf-8'))
+    key.update(b'strict' if strict else b'relaxed')
+    with open(workflow, 'rb') as workflow_stream:
+        for chunk in iter(lambda: workflow_stream.read(65536), b''):
+            key.update(chunk)
+    return key.hexdigest()
+
+
+def get_dependencies(cwlwf):
+    """
+    Returns {filename: mtime} for the workflow file and every local
+    file that was fetched while loading it (embedded tools, $import, $include)
+    """
+    locations = set()
+
+    def visit(process):
+        locations.add(process.tool["id"])
+        if process.doc_loader:
+            locations.update(process.doc_loader.idx.keys())
+        for step in getattr(process, "steps", []):
+            visit(step.embedded_tool)
+
+    visit(cwlwf)
+    dependencies = {}
+    for location in locations:
+        location = urllib.parse.urldefrag(location)[0]
+        if not location.startswith("file://"):
+            continue
+        filename = uri_file_path(location)
+        if filename not in dependencies and os.path.isfile(filename):
+            dependencies[filename] = os.path.getmtime(filename)
+    return dependencies
+
+
+def is_outdated(dependencies):
+    try:
+        return any(os.path.getmtime(filename) != mtime for filename, mtime in dependencies.items())
+    except OSError:
+        return True
+
+
+def _persistent_id(obj):
+    # Loader keeps bound methods and lambdas that can't be pickled.
+    # Loaded process doesn't need it after validation is done
+    return "loader" if isinstance(obj, Loader) else None
+
+
+def _persistent_load(persistent_id):
+    return None
+
+
+def read_cache(key):
+    cache_file = os.path.join(get_cache_folder(), key + ".pickle")
+    if not os.path.isfile(cache_file):
+        return None
+    try:
+        with open(cache_file, 'rb') as cache_stream:
+            unpickler = pickle.Unpickler(cache_stream)
+            unpickler.persistent_load = _persistent_load
+            return unpickler.load()
+    except Exception as ex:
+        logging.warning("Failed to read cached workflow {0}: {1}".format(cache_file, str(ex)))
+        return None
+
+
+def write_cache(key, entry):
+    cache_folder = get_cache_folder()
+    try:
+        if not os.path.exists(cache_folder):
+            os.makedirs(cache_folder)
+        fd, tmp_file = tempfile.mkstemp(dir=cache_folder, prefix=key, suffix=".tmp")
+        with os.fdopen(fd, 'wb') as cache_stream:
+            pickler = pickle.Pickler(cache_stream, pickle.HIGHEST_PROTOCOL)
+            pickler.persistent_id = _persistent_id
+            pickler.dump(entry)
+        os.rename(tmp_file, os.path.join(cache_folder, key + ".pickle"))
+    except Exception as ex:
+        logging.warning("Failed to cache workflow in {0}: {1}".format(cache_folder, str(ex)))
+
+
+def load_tool(workflow, strict=False):
+    """
+    Cached version of cwltool.load_tool.load_tool. Looks for the workflow
+    in the current process first, then in the cache folder, and loads it
+    with cwltool only if both are missing or outdated
+    """
+    key = get_cache_key(workflow, strict)
+
+    entry = _loaded_workflows.get(key)
+    if entry and not is_outdated(entry["dependencies"]):
+        return entry["tool"]
+
+    entry = read_cache(key)
+    if entry and not is_outdated(entry["dependencies"]):
+        _loaded_workflows[key] = entry
+        return entry["tool"]
+
+    cwlwf = cwltool.load_tool.load_tool(argsworkflow=workflow,
+                                        makeTool=cwltool.workflow.defaultMakeTool,
+                                        resolver=tool_resolver,
+                                        strict=strict)
+    if type(cwlwf) == int:
+        return cwlwf
+
+    entry = {"dependencies": get_dependencies(cwlwf), "tool": cwlwf}
+    _loaded_workflows[key] = entry
+    write_cache(key, entry)
+    return cwlwf
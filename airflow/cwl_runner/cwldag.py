@@ -4,24 +4,51 @@
 #
 
 import cwltool.main
-import cwltool.load_tool
-import cwltool.workflow
 import cwltool.errors
-from cwltool.resolver import tool_resolver
 from airflow.models import DAG
+from airflow.utils.operator_resources import Resources
 from airflow.cwl_runner.cwlstepoperator import CWLStepOperator
 from airflow.cwl_runner.cwlutils import shortname, flatten
+from airflow.cwl_runner.cwlcache import load_tool
 import os
 from airflow.cwl_runner.jobdispatcher import JobDispatcher
 from airflow.cwl_runner.jobcleanup import JobCleanup
 import json
+import math
+import numbers
 from six.moves import urllib
 
 
-def check_unsupported_feature (tool):
-    if tool["class"] == "Workflow" and [step["id"] for step in tool["steps"] if "scatter" in step]:
-        return True, "Scatter is not supported"
-    return False, None
+def get_resource_value(requirement, name):
+    """
+    Returns numeric <name>Min (or <name>Max if only the latter is set) from
+    ResourceRequirement, None for expressions which are evaluated at runtime
+    """
+    value = requirement.get(name + "Min", requirement.get(name + "Max"))
+    return value if isinstance(value, numbers.Real) else None
+
+
+def get_step_resources(step, scatter_fanout=1):
+    """
+    Translates ResourceRequirement of the step into resources of CWLStepOperator.
+    Scattered step runs up to scatter_fanout jobs at once, so it requests resources for all of them
+    """
+    requirement, _ = step.embedded_tool.get_requirement("ResourceRequirement")
+    if not requirement:
+        return None
+    jobs = scatter_fanout if step.tool.get("scatter") else 1
+    resources = {}
+    cores = get_resource_value(requirement, "cores")
+    if cores is not None:
+        resources["cpus"] = int(math.ceil(cores)) * jobs
+    ram = get_resource_value(requirement, "ram")
+    if ram is not None:
+        resources["ram"] = int(math.ceil(ram)) * jobs
+    disk = [get_resource_value(requirement, name) for name in ["tmpdir", "outdir"]]
+    if any(value is not None for value in disk):
+        resources["disk"] = int(math.ceil(sum(value for value in disk if value is not None))) * jobs
+    return resources
+
 
 class CWLDAG(DAG):
 
@@ -42,25 +69,25 @@ class CWLDAG(DAG):
         super(self.__class__, self).__init__(dag_id=_dag_id,
                                              default_args=default_args, *args, **kwargs)
 
-        self.cwlwf = cwltool.load_tool.load_tool(argsworkflow = default_args["cwl_workflow"],
-                                                 makeTool = cwltool.workflow.defaultMakeTool,
-                                                 resolver = tool_resolver,
-                                                 strict = default_args['strict'])
+        self.cwlwf = load_tool(default_args["cwl_workflow"], strict = default_args['strict'])
 
-        if type(self.cwlwf) == int or check_unsupported_feature(self.cwlwf.tool)[0]:
-            raise cwltool.errors.UnsupportedRequirement(check_unsupported_feature(self.cwlwf.tool)[1])
+        if type(self.cwlwf) == int:
+            raise cwltool.errors.WorkflowException("Failed to load workflow " + default_args["cwl_workflow"])
 
         if self.cwlwf.tool["class"] == "CommandLineTool" or self.cwlwf.tool["class"] == "ExpressionTool":
             dirname = os.path.dirname(default_args["cwl_workflow"])
             filename, ext = os.path.splitext(os.path.basename(default_args["cwl_workflow"]))
             new_workflow_name = os.path.join(dirname, filename + '_workflow' + ext)
-            generated_workflow = self.gen_workflow (self.cwlwf.tool, default_args["cwl_workflow"])
-            with open(new_workflow_name, 'w') as generated_workflow_stream:
-                generated_workflow_stream.write(json.dumps(generated_workflow, indent=4))
-            self.cwlwf = cwltool.load_tool.load_tool(argsworkflow = new_workflow_name,
-                                                     makeTool = cwltool.workflow.defaultMakeTool,
-                                                     resolver=tool_resolver,
-                                                     strict = default_args['strict'])
+            generated_workflow = json.dumps(self.gen_workflow (self.cwlwf.tool, default_args["cwl_workflow"]), indent=4)
+            # Rewriting unchanged file would update its mtime and invalidate cached workflow
+            previous_workflow = None
+            if os.path.isfile(new_workflow_name):
+                with open(new_workflow_name, 'r') as generated_workflow_stream:
+                    previous_workflow = generated_workflow_stream.read()
+            if previous_workflow != generated_workflow:
+                with open(new_workflow_name, 'w') as generated_workflow_stream:
+                    generated_workflow_stream.write(generated_workflow)
+            self.cwlwf = load_tool(new_workflow_name, strict = default_args['strict'])
 
         self.requirements = self.cwlwf.tool.get("requirements", [])
 
@@ -119,6 +146,9 @@ class CWLDAG(DAG):
         outputs = {}
         for step in self.cwlwf.steps:
             cwl_task = CWLStepOperator(cwl_step=step, dag=self)
+            resources = get_step_resources(step, cwl_task.scatter_fanout)
+            if resources:
+                cwl_task.resources = Resources(**resources)
             outputs[shortname(step.tool["id"])] = cwl_task
             for out in step.tool["outputs"]:
                 outputs[shortname(out["id"])] = cwl_task
@@ -14,9 +14,13 @@ from jsonmerge import merge
 import json
 import os
 import copy
-from airflow.cwl_runner.cwlutils import shortname, flatten
+from airflow.cwl_runner.cwlutils import shortname, flatten, conf_get_default
+from airflow.cwl_runner.stepcache import get_step_cache
 import tempfile
 import cwltool.stdfsaccess
+from cwltool.process import aslist
+import itertools
+from multiprocessing.pool import ThreadPool
 import sys
 
 
@@ -29,6 +33,7 @@ class CWLStepOperator(BaseOperator):
     def __init__(
             self,
             cwl_step,
+            scatter_fanout=None,
             ui_color=None,
             op_args=None,
             op_kwargs=None,
@@ -43,6 +48,7 @@ class CWLStepOperator(BaseOperator):
 
         self.op_args = op_args or []
         self.op_kwargs = op_kwargs or {}
+        self.scatter_fanout = scatter_fanout or int(conf_get_default('biowardrobe', 'SCATTER_FANOUT', 4))
 
         if ui_color:
             self.ui_color = ui_color
@@ -110,33 +116,26 @@ class CWLStepOperator(BaseOperator):
 
         logging.info('{0}: Step inputs with valueFrom: \n{1}'.format(self.task_id, json.dumps(valueFrom,indent=4)))
 
-        def postScatterEval(shortio):
-            def valueFromFunc(k, v):
-                if k in valueFrom:
-                    return cwltool.workflow.expression.do_eval(
-                        valueFrom[k], shortio, self.dag.requirements,
-                        None, None, {}, context=v)
-                else:
-                    return v
-            return {k: valueFromFunc(k, v) for k, v in shortio.items()}
-
-        job = postScatterEval(jobobj)
-        logging.info('{0}: Collected job object after valueFrom evaluation: \n {1}'.format(self.task_id, json.dumps(job,indent=4)))
-        # maybe need to add here scatter functionality too
-
-        kwargs = self.dag.default_args
-        kwargs['outdir'] = tempfile.mkdtemp(prefix=os.path.join(self.outdir, "step_tmp"))
-        kwargs['tmpdir_prefix']=kwargs['tmpdir_prefix'] if kwargs.get('tmpdir_prefix') else os.path.join(kwargs['outdir'], 'cwl_tmp_')
-        kwargs['tmp_outdir_prefix']=kwargs['tmp_outdir_prefix'] if kwargs.get('tmp_outdir_prefix') else os.path.join(kwargs['outdir'], 'cwl_outdir_')
-
-        output, status = cwltool.main.single_job_executor(self.cwl_step.embedded_tool,
-                                                          job,
-                                                          makeTool=cwltool.workflow.defaultMakeTool,
-                                                          select_resources=None,
-                                                          make_fs_access=cwltool.stdfsaccess.StdFsAccess,
-                                                          **kwargs)
-        if not output and status == "permanentFail":
-            raise ValueError
+        if "scatter" in self.cwl_step.tool:
+            jobs, dims = scatter_jobs(jobobj,
+                                      [shortname(s).split("/")[-1] for s in aslist(self.cwl_step.tool["scatter"])],
+                                      self.cwl_step.tool.get("scatterMethod", "dotproduct"))
+            jobs = [eval_value_from(job, valueFrom, self.dag.requirements) for job in jobs]
+            logging.info('{0}: Scattered into {1} jobs, running {2} at a time'.format(self.task_id, len(jobs), self.scatter_fanout))
+            pool = ThreadPool(processes=max(1, min(self.scatter_fanout, len(jobs))))
+            try:
+                scattered_outputs = pool.map(self.run_job, jobs)
+            finally:
+                pool.close()
+                pool.join()
+            output = {}
+            for out in self.cwl_step.tool["outputs"]:
+                jobout_id = shortname(out["id"]).split("/")[-1]
+                output[jobout_id] = nest([o.get(jobout_id) for o in scattered_outputs], dims)
+        else:
+            job = eval_value_from(jobobj, valueFrom, self.dag.requirements)
+            logging.info('{0}: Collected job object after valueFrom evaluation: \n {1}'.format(self.task_id, json.dumps(job,indent=4)))
+            output = self.run_job(job)
 
         logging.info(
             '{0}: Embedded tool outputs: \n {1}'.format(self.task_id, json.dumps(output,indent=4)))
@@ -158,3 +157,74 @@ class CWLStepOperator(BaseOperator):
             '{0}: Output: \n {1}'.format(self.task_id, json.dumps(data,indent=4)))
 
         return data
+
+    def run_job(self, job):
+        kwargs = copy.copy(self.dag.default_args)
+        kwargs['outdir'] = tempfile.mkdtemp(prefix=os.path.join(self.outdir, "step_tmp"))
+        kwargs['tmpdir_prefix']=kwargs['tmpdir_prefix'] if kwargs.get('tmpdir_prefix') else os.path.join(kwargs['outdir'], 'cwl_tmp_')
+        kwargs['tmp_outdir_prefix']=kwargs['tmp_outdir_prefix'] if kwargs.get('tmp_outdir_prefix') else os.path.join(kwargs['outdir'], 'cwl_outdir_')
+
+        step_cache = get_step_cache()
+        if step_cache:
+            cache_key = step_cache.get_key(self.cwl_step.embedded_tool, job)
+            output = step_cache.restore(cache_key, kwargs['outdir'])
+            if output is not None:
+                logging.info('{0}: Outputs are restored from cache {1}'.format(self.task_id, cache_key))
+                return output
+
+        output, status = cwltool.main.single_job_executor(self.cwl_step.embedded_tool,
+                                                          job,
+                                                          makeTool=cwltool.workflow.defaultMakeTool,
+                                                          select_resources=None,
+                                                          make_fs_access=cwltool.stdfsaccess.StdFsAccess,
+                                                          **kwargs)
+        if not output and status == "permanentFail":
+            raise ValueError
+
+        if step_cache and status == "success":
+            step_cache.store(cache_key, output, kwargs['outdir'])
+        return output
+
+
+def nest(items, dims):
+    """
+    Splits flat list of scatter outputs into nested lists, one level per dimension
+    """
+    if len(dims) <= 1:
+        return items
+    size = len(items) // dims[0] if dims[0] else 0
+    return [nest(items[i*size:(i+1)*size], dims[1:]) for i in range(dims[0])]
+
+
+def scatter_jobs(jobobj, scatter, method="dotproduct"):
+    """
+    Splits job object into the list of jobs, one per element of the scatter
+    inputs, and returns it together with the dimensions to nest the gathered outputs
+    """
+    if method == "dotproduct":
+        if len(set(len(jobobj[s]) for s in scatter)) > 1:
+            raise cwltool.errors.WorkflowException("Length of input arrays must be equal when performing dotproduct scatter.")
+        combinations = zip(*[jobobj[s] for s in scatter])
+    else:
+        combinations = itertools.product(*[jobobj[s] for s in scatter])
+    jobs = []
+    for combination in combinations:
+        job = copy.copy(jobobj)
+        job.update(zip(scatter, combination))
+        jobs.append(job)
+    dims = [len(jobobj[s]) for s in scatter] if method == "nested_crossproduct" else [len(jobs)]
+    return jobs, dims
+
+
+def eval_value_from(job, value_from, requirements):
+    """
+    Returns the job with valueFrom expressions of the step inputs evaluated,
+    self being the value of the input and inputs the job before evaluation
+    """
+    def eval_input(k, v):
+        if k in value_from:
+            return cwltool.workflow.expression.do_eval(
+                value_from[k], job, requirements,
+                None, None, {}, context=v)
+        return v
+    return {k: eval_input(k, v) for k, v in job.items()}
@@ -3,6 +3,7 @@
 import urlparse
 import os
 import glob
+import shutil
 from airflow.configuration import conf
 from airflow.exceptions import AirflowConfigException
 
@@ -44,6 +45,21 @@ def get_only_files (jobs, key, excl_key = None):
     return key_filtered
 
 
+def get_jobs_folder_structure(monitor_folder):
+    jobs = []
+    for root, dirs, files in os.walk(monitor_folder):
+        if 'new' in dirs:
+            job_rec = { "new": os.path.join(root, "new"),
+                        "running": os.path.join(root, "running"),
+                        "fail": os.path.join(root, "fail"),
+                        "success": os.path.join(root, "success")}
+            for key,value in job_rec.iteritems():
+                if not os.path.exists(value):
+                    raise ValueError("Failed to find {}".format(value))
+            jobs.append(job_rec)
+    return jobs
+
+
 def set_permissions (item, dir_perm=0777, file_perm=0666, grp_own = os.getgid(), user_own=-1):
     os.chown(item, user_own, grp_own)
     if os.path.isfile(item):
@@ -56,4 +72,22 @@ def set_permissions (item, dir_perm=0777, file_perm=0666, grp_own = os.getgid(),
                 os.chown(os.path.join(root,file), user_own, grp_own)
             for dir in dirs:
                 os.chmod(os.path.join(root,dir), dir_perm)
-                os.chown(os.path.join(root,dir), user_own, grp_own)
\ No newline at end of file
+                os.chown(os.path.join(root,dir), user_own, grp_own)
+
+def link_or_copy (src, dst):
+    """
+    Hardlinks file or every file of the directory from src to dst,
+    copies them if src and dst are on different filesystems
+    """
+    if os.path.isdir(src):
+        for root, dirs, files in os.walk(src):
+            dst_root = os.path.join(dst, os.path.relpath(root, src))
+            if not os.path.exists(dst_root):
+                os.makedirs(dst_root)
+            for file in files:
+                link_or_copy(os.path.join(root, file), os.path.join(dst_root, file))
+    else:
+        try:
+            os.link(src, dst)
+        except OSError:
+            shutil.copy2(src, dst)
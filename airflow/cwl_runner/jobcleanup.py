@@ -6,7 +6,8 @@ from jsonmerge import merge
 import cwltool.errors
 import shutil
 import json
-from airflow.cwl_runner.cwlutils import set_permissions
+from airflow.cwl_runner.cwlutils import conf_get_default
+from airflow.cwl_runner.outputstager import OutputStager
 
 class JobCleanup(BaseOperator):
 
@@ -31,6 +32,7 @@ class JobCleanup(BaseOperator):
         self.output_folder = self.dag.default_args["output_folder"]
         self.rm_files = rm_files or []
         self.rm_files_dest_folder = rm_files_dest_folder
+        self.staging_threads = int(conf_get_default('biowardrobe', 'STAGING_THREADS', 4))
 
     def execute(self, context):
         upstream_task_ids = [t.task_id for t in self.upstream_list]
@@ -61,21 +63,17 @@ class JobCleanup(BaseOperator):
                 visit(item)
 
         collected_workflow_outputs = {}
+        item_list = []
 
         for out,val in self.outputs.iteritems():
             if out in promises:
                 collected_workflow_outputs = merge(collected_workflow_outputs, {val.split("/")[-1]: promises[out]})
                 if isinstance(promises[out], dict) and "class" in promises[out] and promises[out]["class"] in ['File', 'Directory']:
-                    item_list = []
                     visit(promises[out])
-                    for item in item_list:
-                        src = item.replace("file://",'')
-                        dst = os.path.join(self.output_folder, os.path.basename(src))
-                        logging.info('{0}: Moving: \n {1} --> {2}'.format(self.task_id, src, dst))
-                        if os.path.exists(dst):
-                            os.remove(dst) if promises[out]["class"] == 'File' else shutil.rmtree (dst, True)
-                        shutil.move(src, dst)
-                        set_permissions(dst, dir_perm=0775, file_perm=0664)
+
+        logging.info('{0}: Moving: \n {1}'.format(self.task_id, json.dumps(item_list, indent=4)))
+        stager = OutputStager(self.output_folder, threads=self.staging_threads, dir_perm=0775, file_perm=0664)
+        stager.stage([item.replace("file://",'') for item in item_list])
 
         for rmf in self.rm_files:
             if os.path.isfile(rmf):
@@ -93,3 +91,6 @@ class JobCleanup(BaseOperator):
 
         print "WORKFLOW RESULTS"
         print json.dumps(collected_workflow_outputs, indent=4)
+
+        # returned value is pushed to XCom, where airflow-cwl-runner reads it from
+        return collected_workflow_outputs
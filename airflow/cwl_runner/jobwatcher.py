@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+#
+# JobWatcher moves job files from new to running folders as soon as there
+#   are free slots and publishes the state of all job folders to the state
+#   file, which is read by cwl_dag.py instead of scanning CWL_JOBS on every
+#   DAG folder parse. Uses inotify when pyinotify is installed and falls back
+#   to polling the folders otherwise
+#
+
+import argparse
+import glob
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+from airflow.configuration import conf
+from airflow.cwl_runner.cwlcache import get_cache_folder
+from airflow.cwl_runner.cwlutils import conf_get_default, get_jobs_folder_structure
+
+try:
+    import pyinotify
+except ImportError:
+    pyinotify = None
+
+
+JOB_STATES = ["new", "running", "fail", "success"]
+
+
+def get_state_file(monitor_folder):
+    return os.path.join(get_cache_folder(),
+                        "jobs_state_" + hashlib.sha1(os.path.abspath(monitor_folder).encode('utf-8')).hexdigest() + ".json")
+
+
+def read_jobs_state(monitor_folder, missed_intervals=3):
+    """
+    Returns the last state published by JobWatcher or None if
+    watcher is not running (state file is missing or wasn't refreshed
+    for missed_intervals of the interval the watcher runs with)
+    """
+    state_file = get_state_file(monitor_folder)
+    try:
+        with open(state_file, 'r') as state_stream:
+            state = json.load(state_stream)
+    except (IOError, OSError, ValueError):
+        return None
+    if time.time() - state["timestamp"] > missed_intervals * state.get("interval", 1):
+        return None
+    return state
+
+
+class JobWatcher(object):
+
+    def __init__(self, monitor_folder, max_jobs_to_run=1, interval=1):
+        self.monitor_folder = os.path.abspath(monitor_folder)
+        self.max_jobs_to_run = max_jobs_to_run
+        self.interval = interval
+        self.state_file = get_state_file(self.monitor_folder)
+        self.jobs_list = []
+        self.jobs = {state: [] for state in JOB_STATES}
+        self.published = None
+        self.published_at = 0
+
+    def scan(self):
+        self.jobs_list = get_jobs_folder_structure(self.monitor_folder)
+        for state in JOB_STATES:
+            self.jobs[state] = sorted([filename for job_rec in self.jobs_list
+                                                for filename in glob.iglob(job_rec[state] + "/*")
+                                                if os.path.isfile(filename)],
+                                      key=os.path.getctime)
+
+    def admit(self):
+        running = set(os.path.basename(filename) for filename in self.jobs["running"])
+        for filename in list(self.jobs["new"]):
+            if len(self.jobs["running"]) >= self.max_jobs_to_run:
+                break
+            if os.path.basename(filename) in running:
+                continue
+            destination = os.path.join('/'.join(filename.split('/')[0:-2]), 'running')
+            logging.info("mv {0} {1}".format(filename, destination))
+            try:
+                shutil.move(filename, destination)
+            except (IOError, OSError) as ex:
+                logging.warning("Job file was moved by another process: " + str(ex))
+                continue
+            self.jobs["new"].remove(filename)
+            self.jobs["running"].append(os.path.join(destination, os.path.basename(filename)))
+            running.add(os.path.basename(filename))
+
+    def publish(self):
+        if self.jobs == self.published and time.time() - self.published_at < self.interval:
+            return
+        state_folder = os.path.dirname(self.state_file)
+        if not os.path.exists(state_folder):
+            os.makedirs(state_folder)
+        fd, tmp_file = tempfile.mkstemp(dir=state_folder, suffix=".tmp")
+        with os.fdopen(fd, 'w') as state_stream:
+            json.dump({"timestamp": time.time(), "interval": self.interval, "jobs": self.jobs}, state_stream)
+        os.rename(tmp_file, self.state_file)
+        self.published = {state: list(filenames) for state, filenames in self.jobs.items()}
+        self.published_at = time.time()
+
+    def process(self):
+        try:
+            self.scan()
+        except (OSError, ValueError) as ex:
+            # job file was moved while scanning or job folder is incomplete, try again next time
+            logging.warning("Failed to scan {0}: {1}".format(self.monitor_folder, str(ex)))
+            return
+        self.admit()
+        self.publish()
+
+    def run(self):
+        logging.info("Watching {0} for new jobs, {1}".format(self.monitor_folder,
+                                                            "inotify is used" if pyinotify else "polling every {0} sec".format(self.interval)))
+        self.process()
+        if pyinotify:
+            self.run_inotify()
+        else:
+            self.run_polling()
+
+    def run_polling(self):
+        while True:
+            time.sleep(self.interval)
+            self.process()
+
+    def run_inotify(self):
+        watch_manager = pyinotify.WatchManager()
+        mask = pyinotify.IN_CREATE | pyinotify.IN_DELETE | pyinotify.IN_MOVED_FROM | \
+               pyinotify.IN_MOVED_TO | pyinotify.IN_CLOSE_WRITE
+        watch_manager.add_watch(self.monitor_folder, mask, rec=True, auto_add=True)
+        notifier = pyinotify.Notifier(watch_manager, timeout=self.interval * 1000)
+        try:
+            while True:
+                # the state is refreshed on every event and at least once per interval to keep the state file alive
+                if notifier.check_events():
+                    notifier.read_events()
+                    notifier.process_events()
+                self.process()
+        finally:
+            notifier.stop()
+
+
+def arg_parser():
+    parser = argparse.ArgumentParser(description='BioWardrobe2 Airflow job watcher')
+    parser.add_argument("--jobs", help="Jobs folder to watch. Default: CWL_JOBS from Airflow configuration file")
+    parser.add_argument("--max-jobs", type=int, help="Maximum number of jobs to run. Default: MAX_JOBS_TO_RUN from Airflow configuration file")
+    parser.add_argument("--interval", type=int, help="Polling interval, sec. Default: JOB_WATCHER_INTERVAL from Airflow configuration file")
+    return parser
+
+
+def main(argsl=None):
+    if argsl is None:
+        argsl = sys.argv[1:]
+    args = arg_parser().parse_args(argsl)
+    logging.basicConfig(level=logging.INFO)
+    watcher = JobWatcher(monitor_folder=args.jobs or conf.get('biowardrobe', 'CWL_JOBS'),
+                         max_jobs_to_run=args.max_jobs or int(conf_get_default('biowardrobe', 'MAX_JOBS_TO_RUN', 1)),
+                         interval=args.interval or int(conf_get_default('biowardrobe', 'JOB_WATCHER_INTERVAL', 1)))
+    try:
+        watcher.run()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
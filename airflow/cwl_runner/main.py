@@ -1,14 +1,18 @@
 #!/usr/bin/env python
 import argparse
+import errno
 from typing import Text
 import os
 import ruamel.yaml as yaml
 from argparse import Namespace
 import logging
+import json
 import shutil
 import sys
 import tempfile
-from datetime import datetime
+import time
+import multiprocessing
+from datetime import datetime, timedelta
 import cwltool.errors
 
 def suppress_stdout():
@@ -30,13 +34,19 @@ def restore_stdout():
 suppress_stdout()
 from airflow.bin.cli import backfill
 from airflow import models, settings
-from airflow.configuration import conf
+from airflow.jobs import BackfillJob
+from airflow.utils.state import State
+from airflow.ti_deps.dep_context import DepContext
+from airflow.ti_deps.deps.trigger_rule_dep import TriggerRuleDep
+from airflow.configuration import conf, AIRFLOW_HOME
 from airflow.cwl_runner.cwldag import CWLDAG
 from airflow.cwl_runner.jobdispatcher import JobDispatcher
 from airflow.cwl_runner.jobcleanup import JobCleanup
 from airflow.cwl_runner.cwlutils import conf_get_default
 restore_stdout()
 
+RUN_PARAM_ENV = "AIRFLOW_CWL_RUN_PARAM"
+
 
 def arg_parser():
     parser = argparse.ArgumentParser(description='BioWardrobe2 Airflow')
@@ -63,17 +73,59 @@ def arg_parser():
     parser.add_argument("job", type=Text)
     # ADDITIONAL
     parser.add_argument("--ignore-def-outdir", action="store_true", help="Disable default output directory to be set to current directory. Use OUTPUT_FOLDER from Airflow configuration file instead")
+    parser.add_argument("--in-process", action="store_true", help="Run workflow steps in the pool of processes forked from the runner instead of backfill with airflow run per step")
+    parser.add_argument("--parallelism", type=int, default=multiprocessing.cpu_count(), help="Maximum number of steps to run at the same time with --in-process")
     return parser
 
+def get_backup_filename (dag_id):
+    return os.path.join(AIRFLOW_HOME, "cwl_run_params", dag_id + ".yaml")
+
+
 def create_backup(args):
-    with open(os.path.join(os.getcwd(), "run_param.tmp"), 'w') as backup_file:
+    """
+    Saves run parameters into the file keyed by dag_id and passes dag_id to
+    the airflow run subprocesses through the environment, so several runners
+    can be started from the same directory at the same time. Creating the file
+    reserves dag_id, if another runner has just reserved the same one the next
+    free dag_id is taken and args["dag_id"] is updated
+    """
+    backup_folder = os.path.dirname(get_backup_filename(args["dag_id"]))
+    try:
+        os.makedirs(backup_folder)
+    except OSError:
+        if not os.path.isdir(backup_folder):
+            raise
+    while True:
+        try:
+            backup_fd = os.open(get_backup_filename(args["dag_id"]), os.O_WRONLY | os.O_CREAT | os.O_EXCL)
+            break
+        except OSError as ex:
+            if ex.errno != errno.EEXIST:
+                raise
+        # the backup file of the other runner is there now, so it's skipped
+        args["dag_id"] = gen_dag_id(args["workflow"], args["job"])
+    with os.fdopen(backup_fd, 'w') as backup_file:
         yaml.safe_dump(args, stream=backup_file)
+    os.environ[RUN_PARAM_ENV] = args["dag_id"]
 
 def remove_backup():
-    os.remove(os.path.join(os.getcwd(), "run_param.tmp"))
+    # there is nothing to remove if create_backup failed
+    dag_id = os.environ.get(RUN_PARAM_ENV)
+    if not dag_id:
+        return
+    backup_filename = get_backup_filename(dag_id)
+    if os.path.exists(backup_filename):
+        os.remove(backup_filename)
 
 def read_backup():
-    with open(os.path.join(os.getcwd(), "run_param.tmp"), 'r') as backup_file:
+    """
+    Returns run parameters saved by create_backup, None if they weren't passed
+    to this process
+    """
+    dag_id = os.environ.get(RUN_PARAM_ENV)
+    if not dag_id:
+        return None
+    with open(get_backup_filename(dag_id), 'r') as backup_file:
         return yaml.safe_load(backup_file)
 
 def gen_uid (job_file):
@@ -85,6 +137,10 @@ def gen_uid (job_file):
 def gen_dag_id (workflow_file, job_file):
     dag_id = ".".join(workflow_file.split("/")[-1].split(".")[0:-1]) + "-" + gen_uid(job_file) + "-" + datetime.fromtimestamp(os.path.getctime(job_file)).isoformat().replace(':', '-')
     duplicate_dag_id = [dag_run.dag_id for dag_run in settings.Session().query(models.DagRun).filter(models.DagRun.dag_id.like(dag_id+'%'))]
+    backup_folder = os.path.dirname(get_backup_filename(dag_id))
+    if os.path.isdir(backup_folder):
+        # runners which are started but haven't created their DagRuns yet
+        duplicate_dag_id.extend([os.path.splitext(filename)[0] for filename in os.listdir(backup_folder)])
     if dag_id not in duplicate_dag_id:
         return dag_id
     else:
@@ -112,12 +168,6 @@ def set_logger ():
     cwl_logger.setLevel(eval_log_level(conf_get_default('biowardrobe','LOG_LEVEL','INFO').upper()))
 
 
-def get_log_filename (args):
-    log_base = os.path.expanduser(conf.get('core', 'BASE_LOG_FOLDER'))
-    directory = log_base + "/{args.dag_id}/cleanup".format(args=args)
-    return "{0}/{1}".format(directory, args.start_date.isoformat())
-
-
 def clear_previous_log (args):
     log_base = os.path.expanduser(conf.get('core', 'BASE_LOG_FOLDER'))
     directory = log_base + "/{args.dag_id}".format(args=args)
@@ -125,18 +175,84 @@ def clear_previous_log (args):
 
 
 def print_workflow_output (args):
-    found_output = False
-    results = ''
-    with open(get_log_filename(args), 'r') as results_file:
-        for line in results_file.readlines():
-            if 'Subtask:' not in line: continue
-            if 'WORKFLOW RESULTS' in line:
-                found_output = True
-                results = ''
-                continue
-            if found_output:
-                results = results + line.split('Subtask: ')[1]
-    print results.rstrip('\n')
+    results = models.XCom.get_one(execution_date=args.start_date,
+                                  key=models.XCOM_RETURN_KEY,
+                                  task_id="cleanup",
+                                  dag_id=args.dag_id)
+    if results is not None:
+        print json.dumps(results, indent=4)
+
+
+def init_worker ():
+    # Connections inherited from the parent process can't be shared with it
+    settings.engine.dispose()
+    settings.Session.remove()
+
+
+def run_task_instance (dag_id, task_id, execution_date, mark_success, pool):
+    ti = models.TaskInstance(globals()[dag_id].get_task(task_id), execution_date)
+    try:
+        ti.run(ignore_task_deps=True, mark_success=mark_success, pool=pool)
+    except Exception:
+        # failure is already recorded by TaskInstance.handle_failure
+        pass
+    ti.refresh_from_db()
+    return ti.state
+
+
+def run_dag_inprocess (args):
+    """
+    Runs all tasks of already created dag in the pool of processes forked from
+    the current one, so workflow is loaded only once. Trigger rules are checked
+    here against the states of the dag run, TaskInstance.run still records the
+    states and XComs
+    """
+    dag = globals()[args.dag_id]
+    session = settings.Session()
+    dag_run = dag.create_dagrun(run_id=BackfillJob.ID_FORMAT_PREFIX.format(args.start_date.isoformat()),
+                                execution_date=args.start_date,
+                                start_date=datetime.now(),
+                                state=State.RUNNING,
+                                external_trigger=False,
+                                session=session)
+    done_states = State.finished() + [State.UPSTREAM_FAILED]
+    states = {ti.task_id: ti.state for ti in dag_run.get_task_instances(session=session)}
+    pending = {task_id: datetime.now() for task_id, state in states.items() if state not in done_states}
+    running = {}
+    # more processes than dag.concurrency would only get their task instances refused
+    pool = multiprocessing.Pool(processes=max(min(args.parallelism, dag.concurrency), 1), initializer=init_worker)
+    trigger_rule_dep = TriggerRuleDep()
+    try:
+        while pending or running:
+            # upstream_failed and skipped states flagged by the trigger rules are
+            # written to the db and to states, so downstream tasks see them in the same pass
+            dep_context = DepContext(flag_upstream_failed=True, task_states=states)
+            for task_id, not_before in list(pending.items()):
+                ti = models.TaskInstance(dag.get_task(task_id), args.start_date, state=states[task_id])
+                trigger_rule_met = trigger_rule_dep.is_met(ti=ti, session=session, dep_context=dep_context)
+                if ti.state in done_states:
+                    states[task_id] = ti.state
+                    del pending[task_id]
+                elif trigger_rule_met and not_before <= datetime.now():
+                    running[task_id] = pool.apply_async(run_task_instance,
+                                                        (args.dag_id, task_id, args.start_date, args.mark_success, args.pool))
+                    del pending[task_id]
+            for task_id, result in list(running.items()):
+                if not result.ready():
+                    continue
+                states[task_id] = result.get()
+                del running[task_id]
+                if states[task_id] == State.UP_FOR_RETRY:
+                    pending[task_id] = datetime.now() + dag.get_task(task_id).retry_delay
+                elif states[task_id] not in done_states:
+                    # the task instance wasn't run, e.g. its dependencies weren't met, try again later
+                    pending[task_id] = datetime.now() + timedelta(seconds=1)
+            time.sleep(0.1)
+    finally:
+        pool.close()
+        pool.join()
+    dag_run.update_state(session=session)
+    session.close()
 
 
 def run_job (**kwargs):
@@ -144,6 +260,18 @@ def run_job (**kwargs):
     kwargs['subdir'] = os.path.splitext(__file__)[0]+'.py'
     kwargs['start_date'] = datetime.fromtimestamp(os.path.getctime(kwargs.get('job')))
     kwargs['end_date'] = datetime.fromtimestamp(os.path.getctime(kwargs.get('job')))
+    if kwargs.get('in_process'):
+        args = Namespace (**kwargs)
+        if args.quiet:
+            suppress_stdout()
+        try:
+            make_dag(kwargs)
+            run_dag_inprocess(args)
+        finally:
+            if args.quiet:
+                restore_stdout()
+        print_workflow_output (args)
+        return
     create_backup(kwargs)
     try:
         args = Namespace (**kwargs)
@@ -264,7 +392,9 @@ def make_dag(args):
     globals()[args["dag_id"]] = dag
 
 try:
-    make_dag(read_backup())
+    run_params = read_backup()
+    if run_params:
+        make_dag(run_params)
 except cwltool.errors.UnsupportedRequirement as feature_ex:
     print feature_ex
     remove_backup()
@@ -0,0 +1,114 @@
+#
+# OutputStager moves workflow outputs into the output folder.
+#   Outputs on the same filesystem are renamed, outputs on the other
+#   filesystems are copied file by file in a thread pool. Permissions are set
+#   while moving, so the output folder doesn't need to be walked afterwards
+#
+
+import errno
+import logging
+import os
+import shutil
+import time
+from multiprocessing.pool import ThreadPool
+
+
+def set_item_permissions (item, perm, grp_own, user_own):
+    os.chown(item, user_own, grp_own)
+    os.chmod(item, perm)
+
+
+class OutputStager(object):
+
+    def __init__(self, dest_folder, threads=4, dir_perm=0775, file_perm=0664, grp_own=None, user_own=-1):
+        self.dest_folder = dest_folder
+        self.threads = threads
+        self.dir_perm = dir_perm
+        self.file_perm = file_perm
+        self.grp_own = os.getgid() if grp_own is None else grp_own
+        self.user_own = user_own
+
+    def stage(self, items):
+        """
+        Moves each of items (absolute paths) into dest_folder,
+        returns the list of {"src", "dst", "size", "duration", "method"}
+        """
+        report = []
+        copy_items = []
+        for src in items:
+            dst = os.path.join(self.dest_folder, os.path.basename(src))
+            if os.path.exists(dst):
+                shutil.rmtree(dst, True) if os.path.isdir(dst) else os.remove(dst)
+            start = time.time()
+            try:
+                os.rename(src, dst)
+            except OSError as ex:
+                if ex.errno != errno.EXDEV:
+                    raise
+                copy_items.append((src, dst))
+                continue
+            size = self.set_permissions(dst)
+            report.append({"src": src, "dst": dst, "size": size, "duration": time.time() - start, "method": "rename"})
+
+        if copy_items:
+            start = time.time()
+            files = []
+            for index, (src, dst) in enumerate(copy_items):
+                files.extend((index, src_file, dst_file) for src_file, dst_file in self.prepare_copy(src, dst))
+            pool = ThreadPool(processes=self.threads)
+            try:
+                copied = pool.map(self.copy_file, files)
+            finally:
+                pool.close()
+                pool.join()
+            for index, (src, dst) in enumerate(copy_items):
+                item_copied = [(size, finished) for file_index, size, finished in copied if file_index == index]
+                shutil.rmtree(src, True) if os.path.isdir(src) else os.remove(src)
+                report.append({"src": src,
+                               "dst": dst,
+                               "size": sum(size for size, _ in item_copied),
+                               "duration": max([finished for _, finished in item_copied] + [start]) - start,
+                               "method": "copy"})
+
+        for item in report:
+            logging.info("Staged {src} --> {dst} by {method}: {size} bytes in {duration:.2f} sec, {rate:.2f} MB/sec".format(
+                rate=item["size"] / max(item["duration"], 1e-6) / 1024**2, **item))
+        return report
+
+    def set_permissions(self, item):
+        """
+        Sets permissions of the renamed item, returns its size
+        """
+        if not os.path.isdir(item):
+            set_item_permissions(item, self.file_perm, self.grp_own, self.user_own)
+            return os.path.getsize(item)
+        size = 0
+        set_item_permissions(item, self.dir_perm, self.grp_own, self.user_own)
+        for root, dirs, files in os.walk(item):
+            for dir in dirs:
+                set_item_permissions(os.path.join(root, dir), self.dir_perm, self.grp_own, self.user_own)
+            for file in files:
+                set_item_permissions(os.path.join(root, file), self.file_perm, self.grp_own, self.user_own)
+                size += os.path.getsize(os.path.join(root, file))
+        return size
+
+    def prepare_copy(self, src, dst):
+        """
+        Creates folder structure of src in dst, returns the list of files to be copied
+        """
+        if not os.path.isdir(src):
+            return [(src, dst)]
+        files = []
+        for root, dirs, filenames in os.walk(src):
+            dst_root = os.path.join(dst, os.path.relpath(root, src))
+            if not os.path.exists(dst_root):
+                os.makedirs(dst_root)
+            set_item_permissions(dst_root, self.dir_perm, self.grp_own, self.user_own)
+            files.extend((os.path.join(root, filename), os.path.join(dst_root, filename)) for filename in filenames)
+        return files
+
+    def copy_file(self, file_to_copy):
+        index, src, dst = file_to_copy
+        shutil.copyfile(src, dst)
+        set_item_permissions(dst, self.file_perm, self.grp_own, self.user_own)
+        return index, os.path.getsize(dst), time.time()
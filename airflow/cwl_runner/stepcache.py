@@ -0,0 +1,196 @@
+#
+# StepCache keeps outputs of successfully finished CWL steps.
+#   Entry is keyed by the tool definition and the checksums of its input files,
+#   so re-running a workflow with the same inputs restores step outputs by
+#   copying them instead of running the tool again. Outputs are stored by
+#   hardlinks, restored files are copies, so that staging them (chmod, rename)
+#   or modifying them never changes the cache entry. The least recently used
+#   entries are removed when the cache grows over its size limit
+#
+
+from cwltool.pathmapper import adjustFileObjs, adjustDirObjs
+from airflow.cwl_runner.cwlutils import conf_get_default, link_or_copy
+from schema_salad.ref_resolver import file_uri, uri_file_path
+import copy
+import errno
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+
+
+OUTDIR_PREFIX = "outdir://"
+
+
+def get_step_cache():
+    """
+    Returns StepCache if STEP_CACHE_FOLDER is set in Airflow configuration file, None otherwise
+    """
+    cache_folder = conf_get_default('biowardrobe', 'STEP_CACHE_FOLDER', None)
+    if not cache_folder:
+        return None
+    max_size = float(conf_get_default('biowardrobe', 'STEP_CACHE_SIZE', 100)) * 1024**3
+    return StepCache(cache_folder, max_size)
+
+
+def file_checksum(location):
+    checksum = hashlib.sha1()
+    with open(location, 'rb') as file_stream:
+        for chunk in iter(lambda: file_stream.read(1024*1024), b''):
+            checksum.update(chunk)
+    return "sha1$" + checksum.hexdigest()
+
+
+class StepCache(object):
+
+    _checksums = {}
+
+    def __init__(self, cache_folder, max_size):
+        self.cache_folder = os.path.abspath(cache_folder)
+        self.max_size = max_size
+
+    def checksum(self, location):
+        """
+        Checksum of the local file, memoized by file size and mtime
+        """
+        stat = os.stat(location)
+        memo_key = (location, stat.st_size, stat.st_mtime)
+        if memo_key not in self._checksums:
+            self._checksums[memo_key] = file_checksum(location)
+        return self._checksums[memo_key]
+
+    def content(self, value):
+        """
+        Replaces locations of File and Directory objects with their content checksums
+        """
+        if isinstance(value, dict) and value.get("class") == "File":
+            content = {"class": "File", "basename": value.get("basename"), "contents": value.get("contents")}
+            if value.get("checksum"):
+                content["checksum"] = value["checksum"]
+            elif value.get("location", "").startswith("file://"):
+                content["checksum"] = self.checksum(uri_file_path(value["location"]))
+            else:
+                content["location"] = value.get("location")
+            content["secondaryFiles"] = self.content(value.get("secondaryFiles", []))
+            return content
+        if isinstance(value, dict) and value.get("class") == "Directory":
+            content = {"class": "Directory", "basename": value.get("basename"), "listing": self.content(value.get("listing", []))}
+            if value.get("location", "").startswith("file://") and os.path.isdir(uri_file_path(value["location"])):
+                root_folder = uri_file_path(value["location"])
+                content["files"] = sorted([(os.path.relpath(os.path.join(root, file), root_folder), self.checksum(os.path.join(root, file)))
+                                           for root, dirs, files in os.walk(root_folder) for file in files])
+            return content
+        if isinstance(value, dict):
+            return {k: self.content(v) for k, v in value.items()}
+        if isinstance(value, list):
+            return [self.content(v) for v in value]
+        return value
+
+    def get_key(self, tool, job):
+        key = hashlib.sha1()
+        key.update(json.dumps({"tool": tool.tool,
+                               "requirements": tool.requirements,
+                               "hints": tool.hints}, sort_keys=True, default=str).encode('utf-8'))
+        key.update(json.dumps(self.content(job), sort_keys=True).encode('utf-8'))
+        return key.hexdigest()
+
+    def restore(self, key, outdir):
+        """
+        Copies cached outputs into outdir and returns the output object with
+        the updated locations, returns None if there is no such entry in the cache
+        """
+        entry = os.path.join(self.cache_folder, key)
+        restored = []
+        try:
+            with open(os.path.join(entry, "output.json"), 'r') as output_stream:
+                output = json.load(output_stream)["output"]
+            for item in os.listdir(os.path.join(entry, "files")):
+                cached_item = os.path.join(entry, "files", item)
+                restored_item = os.path.join(outdir, item)
+                if os.path.lexists(restored_item):
+                    raise OSError(errno.EEXIST, "Output already exists", restored_item)
+                # a failed copy can leave a partial file or directory behind,
+                # so it's removed as well
+                restored.append(restored_item)
+                if os.path.isdir(cached_item):
+                    shutil.copytree(cached_item, restored_item)
+                else:
+                    shutil.copy2(cached_item, restored_item)
+            os.utime(entry, None)
+        except (IOError, OSError, ValueError, shutil.Error):
+            # entry is missing or was evicted while restoring
+            for item in restored:
+                if os.path.isdir(item):
+                    shutil.rmtree(item, True)
+                elif os.path.lexists(item):
+                    os.remove(item)
+            return None
+
+        def relocate(item):
+            if item.get("location", "").startswith(OUTDIR_PREFIX):
+                item["location"] = file_uri(os.path.join(outdir, item["location"][len(OUTDIR_PREFIX):]))
+                item.pop("path", None)
+
+        adjustFileObjs(output, relocate)
+        adjustDirObjs(output, relocate)
+        return output
+
+    def store(self, key, output, outdir):
+        """
+        Hardlinks outputs which are located in outdir into the cache entry
+        """
+        entry = os.path.join(self.cache_folder, key)
+        if os.path.exists(entry):
+            return
+        if not os.path.exists(self.cache_folder):
+            os.makedirs(self.cache_folder)
+        tmp_entry = tempfile.mkdtemp(dir=self.cache_folder, prefix=key, suffix=".tmp")
+        cached_output = copy.deepcopy(output)
+        try:
+            os.makedirs(os.path.join(tmp_entry, "files"))
+
+            def relocate(item):
+                location = uri_file_path(item["location"]) if item.get("location", "").startswith("file://") else None
+                if not location or not os.path.abspath(location).startswith(os.path.join(os.path.abspath(outdir), "")):
+                    return
+                relative_location = os.path.relpath(location, outdir)
+                cached_location = os.path.join(tmp_entry, "files", relative_location)
+                if not os.path.exists(cached_location):
+                    if not os.path.exists(os.path.dirname(cached_location)):
+                        os.makedirs(os.path.dirname(cached_location))
+                    link_or_copy(location, cached_location)
+                item["location"] = OUTDIR_PREFIX + relative_location
+                item.pop("path", None)
+
+            adjustDirObjs(cached_output, relocate)
+            adjustFileObjs(cached_output, relocate)
+            size = sum(os.path.getsize(os.path.join(root, file))
+                       for root, dirs, files in os.walk(tmp_entry) for file in files)
+            with open(os.path.join(tmp_entry, "output.json"), 'w') as output_stream:
+                json.dump({"output": cached_output, "size": size}, output_stream)
+            os.rename(tmp_entry, entry)
+        except (IOError, OSError) as ex:
+            # entry could be already stored by another task
+            logging.warning("Failed to cache step outputs into {0}: {1}".format(entry, str(ex)))
+            shutil.rmtree(tmp_entry, True)
+            return
+        self.evict()
+
+    def evict(self):
+        entries = []
+        for key in os.listdir(self.cache_folder):
+            entry = os.path.join(self.cache_folder, key)
+            try:
+                with open(os.path.join(entry, "output.json"), 'r') as output_stream:
+                    entries.append((os.path.getmtime(entry), json.load(output_stream)["size"], entry))
+            except (IOError, OSError, ValueError):
+                continue
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, entry in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            logging.info("Remove cached step outputs {0}".format(entry))
+            shutil.rmtree(entry, True)
+            total_size -= size
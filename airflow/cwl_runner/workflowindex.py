@@ -0,0 +1,118 @@
+#
+# WorkflowIndex keeps the list of workflow descriptor files from CWL_WORKFLOWS
+#   folder and looks for the workflow with the longest name that is the prefix
+#   of job filename. Index is saved into the cache folder and refreshed only
+#   for the folders which mtime has changed since the last scan
+#
+
+from airflow.cwl_runner.cwlcache import get_cache_folder
+import hashlib
+import json
+import logging
+import os
+import tempfile
+
+
+class WorkflowIndex(object):
+
+    END = ""
+
+    def __init__(self, workflows_folder, index_file=None):
+        self.workflows_folder = os.path.abspath(workflows_folder)
+        self.index_file = index_file or os.path.join(get_cache_folder(),
+                                                     "workflow_index_" +
+                                                     hashlib.sha1(self.workflows_folder.encode('utf-8')).hexdigest() +
+                                                     ".json")
+        self.folders = {}
+        self.workflows = {}
+        self.trie = {}
+        self.load()
+        self.refresh()
+
+    def load(self):
+        if not os.path.isfile(self.index_file):
+            return
+        try:
+            with open(self.index_file, 'r') as index_stream:
+                self.folders = json.load(index_stream)
+        except Exception as ex:
+            logging.warning("Failed to read workflow index {0}: {1}".format(self.index_file, str(ex)))
+            self.folders = {}
+        self.build()
+
+    def save(self):
+        index_folder = os.path.dirname(self.index_file)
+        try:
+            if not os.path.exists(index_folder):
+                os.makedirs(index_folder)
+            fd, tmp_file = tempfile.mkstemp(dir=index_folder, suffix=".tmp")
+            with os.fdopen(fd, 'w') as index_stream:
+                json.dump(self.folders, index_stream)
+            os.rename(tmp_file, self.index_file)
+        except Exception as ex:
+            logging.warning("Failed to save workflow index {0}: {1}".format(self.index_file, str(ex)))
+
+    def scan_folder(self, folder, mtime):
+        record = {"mtime": mtime, "subfolders": [], "workflows": {}}
+        for filename in os.listdir(folder):
+            location = os.path.join(folder, filename)
+            if os.path.isdir(location):
+                # os.walk doesn't follow symlinks to folders either
+                if not os.path.islink(location):
+                    record["subfolders"].append(filename)
+            elif os.path.splitext(filename)[1] == '.cwl' and os.path.isfile(location):
+                record["workflows"][filename] = os.path.getctime(location)
+        return record
+
+    def refresh(self):
+        folders = {}
+        changed = False
+        pending = [self.workflows_folder]
+        while pending:
+            folder = pending.pop()
+            try:
+                mtime = os.stat(folder).st_mtime
+            except OSError:
+                continue
+            record = self.folders.get(folder)
+            if not record or record["mtime"] != mtime:
+                record = self.scan_folder(folder, mtime)
+                changed = True
+            folders[folder] = record
+            pending.extend(os.path.join(folder, subfolder) for subfolder in record["subfolders"])
+        if changed or len(folders) != len(self.folders):
+            self.folders = folders
+            self.build()
+            self.save()
+
+    def build(self):
+        workflows = {}
+        ctimes = {}
+        for folder, record in self.folders.items():
+            for filename, ctime in record["workflows"].items():
+                # the oldest file wins when the same workflow name is found in several folders
+                if filename not in workflows or ctime < ctimes[filename]:
+                    workflows[filename] = os.path.join(folder, filename)
+                    ctimes[filename] = ctime
+        trie = {}
+        for filename, location in workflows.items():
+            node = trie
+            for char in os.path.splitext(filename)[0]:
+                node = node.setdefault(char, {})
+            node[self.END] = location
+        self.workflows = workflows
+        self.trie = trie
+
+    def find(self, job_filename):
+        """
+        Returns the location of the workflow with the longest name that
+        job_filename starts with, or None if there is no such workflow
+        """
+        node = self.trie
+        found = node.get(self.END)
+        for char in os.path.basename(job_filename):
+            node = node.get(char)
+            if node is None:
+                break
+            found = node.get(self.END, found)
+        return found
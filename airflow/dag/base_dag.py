@@ -50,6 +50,14 @@ class BaseDag(object):
         """
         raise NotImplementedError()
 
+    @abstractproperty
+    def task_resources(self):
+        """
+        :return: A map from task IDs to the resources required by the tasks
+        :rtype: dict[unicode, airflow.utils.operator_resources.Resources]
+        """
+        raise NotImplementedError()
+
     @abstractmethod
     def concurrency(self):
         """
@@ -12,18 +12,25 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from builtins import range
+import heapq
+import itertools
+
+from sqlalchemy import and_, or_
 
 from airflow import configuration
+from airflow.utils.db import provide_session
 from airflow.utils.state import State
 from airflow.utils.logging import LoggingMixin
 
 PARALLELISM = configuration.getint('core', 'PARALLELISM')
+MAX_TIS_PER_QUERY = configuration.getint('scheduler', 'MAX_TIS_PER_QUERY')
+EXECUTOR_CPUS = configuration.getint('core', 'EXECUTOR_CPUS')
+EXECUTOR_RAM = configuration.getint('core', 'EXECUTOR_RAM')
 
 
 class BaseExecutor(LoggingMixin):
 
-    def __init__(self, parallelism=PARALLELISM):
+    def __init__(self, parallelism=PARALLELISM, cpus=EXECUTOR_CPUS, ram=EXECUTOR_RAM):
         """
         Class to derive in order to interface with executor-type systems
         like Celery, Mesos, Yarn and the likes.
@@ -31,11 +38,25 @@ class BaseExecutor(LoggingMixin):
         :param parallelism: how many jobs should run at one time. Set to
             ``0`` for infinity
         :type parallelism: int
+        :param cpus: how many CPU cores the running jobs can request in
+            total. Set to ``0`` for infinity
+        :type cpus: int
+        :param ram: how much RAM (MB) the running jobs can request in
+            total. Set to ``0`` for infinity
+        :type ram: int
         """
         self.parallelism = parallelism
+        self.cpus = cpus
+        self.ram = ram
         self.queued_tasks = {}
+        # (-priority, sequence, key, queued task) of the queued task instances,
+        # the ones queued first come first among the same priority
+        self.queued_heap = []
+        self.queued_sequence = itertools.count()
         self.running = {}
         self.event_buffer = {}
+        # (cpus, ram) requested by the queued and running task instances
+        self.task_resources = {}
 
     def start(self):  # pragma: no cover
         """
@@ -44,11 +65,15 @@ class BaseExecutor(LoggingMixin):
         """
         pass
 
-    def queue_command(self, task_instance, command, priority=1, queue=None):
+    def queue_command(self, task_instance, command, priority=1, queue=None, resources=None):
         key = task_instance.key
         if key not in self.queued_tasks and key not in self.running:
             self.logger.info("Adding to queue: {}".format(command))
             self.queued_tasks[key] = (command, priority, queue, task_instance)
+            heapq.heappush(self.queued_heap, (-priority, next(self.queued_sequence),
+                                              key, self.queued_tasks[key]))
+            if resources:
+                self.task_resources[key] = (resources.cpus.qty, resources.ram.qty)
 
     def queue_task_instance(
             self,
@@ -74,7 +99,8 @@ class BaseExecutor(LoggingMixin):
             task_instance,
             command,
             priority=task_instance.task.priority_weight_total,
-            queue=task_instance.task.queue)
+            queue=task_instance.task.queue,
+            resources=task_instance.task.resources)
 
     def has_task(self, task_instance):
         """
@@ -104,25 +130,46 @@ class BaseExecutor(LoggingMixin):
         self.logger.debug("{} in queue".format(len(self.queued_tasks)))
         self.logger.debug("{} open slots".format(open_slots))
 
-        sorted_queue = sorted(
-            [(k, v) for k, v in self.queued_tasks.items()],
-            key=lambda x: x[1][1],
-            reverse=True)
-        for i in range(min((open_slots, len(self.queued_tasks)))):
-            key, (command, _, queue, ti) = sorted_queue.pop(0)
-            # TODO(jlowin) without a way to know what Job ran which tasks,
-            # there is a danger that another Job started running a task
-            # that was also queued to this executor. This is the last chance
-            # to check if that happened. The most probable way is that a
-            # Scheduler tried to run a task that was originally queued by a
-            # Backfill. This fix reduces the probability of a collision but
-            # does NOT eliminate it.
+        # pop the task instances with the highest priority from the heap,
+        # lower priority tasks that fit into the remaining budget are
+        # still launched
+        free_cpus, free_ram = self.free_resources()
+        to_launch = []
+        postponed = []
+        while self.queued_heap and len(to_launch) < open_slots:
+            entry = heapq.heappop(self.queued_heap)
+            key, item = entry[2], entry[3]
+            if self.queued_tasks.get(key) is not item:
+                # removed from the queue or queued again since
+                continue
+            cpus, ram = self.get_task_resources(key)
+            if cpus > free_cpus or ram > free_ram:
+                self.logger.debug(
+                    'Not enough resources to run {}: {} cpus and {} MB RAM '
+                    'are requested'.format(key, cpus, ram))
+                postponed.append(entry)
+                continue
+            free_cpus -= cpus
+            free_ram -= ram
+            to_launch.append((key, item))
+        for entry in postponed:
+            heapq.heappush(self.queued_heap, entry)
+
+        # TODO(jlowin) without a way to know what Job ran which tasks,
+        # there is a danger that another Job started running a task
+        # that was also queued to this executor. This is the last chance
+        # to check if that happened. The most probable way is that a
+        # Scheduler tried to run a task that was originally queued by a
+        # Backfill. This fix reduces the probability of a collision but
+        # does NOT eliminate it.
+        self.refresh_task_instance_states([ti for _, (_, _, _, ti) in to_launch])
+        for key, (command, _, queue, ti) in to_launch:
             self.queued_tasks.pop(key)
-            ti.refresh_from_db()
             if ti.state != State.RUNNING:
                 self.running[key] = command
                 self.execute_async(key, command=command, queue=queue)
             else:
+                self.task_resources.pop(key, None)
                 self.logger.debug(
                     'Task is already running, not sending to '
                     'executor: {}'.format(key))
@@ -131,8 +178,57 @@ class BaseExecutor(LoggingMixin):
         self.logger.debug("Calling the {} sync method".format(self.__class__))
         self.sync()
 
+    @provide_session
+    def refresh_task_instance_states(self, task_instances, session=None):
+        """
+        Refreshes the state of the task instances from the database with
+        one query per max_tis_per_query task instances
+        """
+        # airflow.models imports the executors
+        from airflow import models
+        TI = models.TaskInstance
+        states = {}
+        for i in range(0, len(task_instances), MAX_TIS_PER_QUERY):
+            filter_for_tis = or_(*[and_(TI.dag_id == ti.dag_id,
+                                        TI.task_id == ti.task_id,
+                                        TI.execution_date == ti.execution_date)
+                                   for ti in task_instances[i:i + MAX_TIS_PER_QUERY]])
+            qry = (
+                session
+                .query(TI.dag_id, TI.task_id, TI.execution_date, TI.state)
+                .filter(filter_for_tis)
+            )
+            for dag_id, task_id, execution_date, state in qry:
+                states[(dag_id, task_id, execution_date)] = state
+        for ti in task_instances:
+            ti.state = states.get(ti.key)
+
+    def get_task_resources(self, key):
+        """
+        Returns (cpus, ram) requested by the task instance. Requests larger
+        than the whole budget are capped, so such task instances can still
+        run when nothing else is running.
+        """
+        cpus, ram = self.task_resources.get(key, (0, 0))
+        if self.cpus:
+            cpus = min(cpus, self.cpus)
+        if self.ram:
+            ram = min(ram, self.ram)
+        return cpus, ram
+
+    def free_resources(self):
+        """
+        Returns (cpus, ram) not requested by the running task instances,
+        infinity for the resources without limit
+        """
+        used = [self.get_task_resources(key) for key in self.running]
+        free_cpus = self.cpus - sum(cpus for cpus, _ in used) if self.cpus else float('inf')
+        free_ram = self.ram - sum(ram for _, ram in used) if self.ram else float('inf')
+        return free_cpus, free_ram
+
     def change_state(self, key, state):
         self.running.pop(key)
+        self.task_resources.pop(key, None)
         self.event_buffer[key] = state
 
     def fail(self, key):
@@ -13,25 +13,33 @@
 # limitations under the License.
 
 import multiprocessing
+import os
+import shlex
 import subprocess
+import sys
 import time
 
 from builtins import range
 
 from airflow import configuration
+from airflow import settings
 from airflow.executors.base_executor import BaseExecutor
 from airflow.utils.state import State
 from airflow.utils.logging import LoggingMixin
 
 PARALLELISM = configuration.get('core', 'PARALLELISM')
+FORK_TASKS = configuration.getboolean('local_executor', 'FORK_TASKS')
 
 
 class LocalWorker(multiprocessing.Process, LoggingMixin):
 
-    def __init__(self, task_queue, result_queue):
+    def __init__(self, task_queue, result_queue, fork_tasks=False):
         multiprocessing.Process.__init__(self)
         self.task_queue = task_queue
         self.result_queue = result_queue
+        self.fork_tasks = fork_tasks
+        # DagBags of the DAG files the forked tasks were loaded from
+        self.dagbags = {}
         self.daemon = True
 
     def run(self):
@@ -43,31 +51,95 @@ class LocalWorker(multiprocessing.Process, LoggingMixin):
                 break
             self.logger.info("{} running {}".format(
                 self.__class__.__name__, command))
-            command = "exec bash -c '{0}'".format(command)
-            try:
-                subprocess.check_call(command, shell=True)
-                state = State.SUCCESS
-            except subprocess.CalledProcessError as e:
-                state = State.FAILED
-                self.logger.error("failed to execute task {}:".format(str(e)))
-                # raise e
+            state = self.execute_work(command)
             self.result_queue.put((key, state))
             self.task_queue.task_done()
-            time.sleep(1)
+            if not self.fork_tasks:
+                time.sleep(1)
+
+    def execute_work(self, command):
+        argv = shlex.split(command)
+        if self.fork_tasks and argv[:2] == ['airflow', 'run']:
+            return self.fork_work(argv[1:])
+        command = "exec bash -c '{0}'".format(command)
+        try:
+            subprocess.check_call(command, shell=True)
+            return State.SUCCESS
+        except subprocess.CalledProcessError as e:
+            self.logger.error("failed to execute task {}:".format(str(e)))
+            return State.FAILED
+
+    def fork_work(self, argv):
+        """
+        Runs the airflow run command in a process forked from this worker,
+        so the command doesn't import airflow and the DAG file again. The
+        LocalTaskJob it starts still runs the task in an airflow run --raw
+        subprocess, which does.
+        """
+        # airflow.bin.cli imports the executors
+        from airflow.bin import cli
+        try:
+            args = cli.CLIFactory.get_parser().parse_args(argv)
+            dag = self.get_dag(args)
+        except (Exception, SystemExit) as e:
+            self.logger.error("failed to load task {}: {}".format(argv, str(e)))
+            return State.FAILED
+
+        pid = os.fork()
+        if pid == 0:
+            exit_code = 1
+            try:
+                # the connections inherited from the worker can't be shared
+                # with it
+                settings.engine.dispose()
+                settings.Session.remove()
+                cli.run(args, dag=dag)
+                exit_code = 0
+            except Exception:
+                self.logger.exception("failed to execute task {}".format(argv))
+            finally:
+                sys.stdout.flush()
+                sys.stderr.flush()
+                os._exit(exit_code)
+
+        _, status = os.waitpid(pid, 0)
+        if status != 0:
+            self.logger.error("failed to execute task {}: exit status {}".format(
+                argv, status))
+            return State.FAILED
+        return State.SUCCESS
+
+    def get_dag(self, args):
+        """
+        Returns the DAG of the task from the DagBag kept by the worker,
+        the DAG file is imported again only if it was changed
+        """
+        if args.pickle:
+            return None
+        from airflow.bin import cli
+        from airflow.models import DagBag
+        subdir = cli.process_subdir(args.subdir)
+        if subdir not in self.dagbags:
+            self.dagbags[subdir] = DagBag(subdir)
+        else:
+            self.dagbags[subdir].collect_dags(subdir)
+        return self.dagbags[subdir].dags.get(args.dag_id)
 
 
 class LocalExecutor(BaseExecutor):
     """
     LocalExecutor executes tasks locally in parallel. It uses the
     multiprocessing Python library and queues to parallelize the execution
-    of tasks.
+    of tasks. With fork_tasks set in the [local_executor] section the
+    workers fork a process per airflow run command instead of starting the
+    airflow CLI.
     """
 
     def start(self):
         self.queue = multiprocessing.JoinableQueue()
         self.result_queue = multiprocessing.Queue()
         self.workers = [
-            LocalWorker(self.queue, self.result_queue)
+            LocalWorker(self.queue, self.result_queue, fork_tasks=FORK_TASKS)
             for i in range(self.parallelism)
         ]
 
@@ -35,7 +35,7 @@ import time
 from time import sleep
 
 import psutil
-from sqlalchemy import Column, Integer, String, DateTime, func, Index, or_, and_
+from sqlalchemy import Column, Integer, String, DateTime, func, Index, or_, and_, not_, case
 from sqlalchemy import update
 from sqlalchemy.exc import OperationalError
 from sqlalchemy.orm.session import make_transient
@@ -54,6 +54,7 @@ from airflow.utils.dag_processing import (AbstractDagFileProcessor,
                                           DagFileProcessorManager,
                                           SimpleDag,
                                           SimpleDagBag,
+                                          SimpleDagStore,
                                           list_py_file_paths)
 from airflow.utils.email import send_email
 from airflow.utils.logging import LoggingMixin
@@ -62,6 +63,9 @@ from airflow.utils import asciiart
 
 Base = models.Base
 ID_LEN = models.ID_LEN
+HEARTBEAT_AGENT_FOLDER = os.path.expanduser(
+    conf.get('scheduler', 'JOB_HEARTBEAT_AGENT_FOLDER'))
+HEARTBEAT_AGENT_INTERVAL = conf.getfloat('scheduler', 'JOB_HEARTBEAT_AGENT_INTERVAL')
 
 
 class BaseJob(Base, LoggingMixin):
@@ -154,7 +158,14 @@ class BaseJob(Base, LoggingMixin):
         will sleep 50 seconds to complete the 60 seconds and keep a steady
         heart rate. If you go over 60 seconds before calling it, it won't
         sleep at all.
+
+        While the HeartbeatAgentJob is running on this host, the heartbeat
+        is only left in its folder and the agent writes it to the database.
         '''
+        if self.use_heartbeat_agent():
+            self.heartbeat_through_agent()
+            return
+
         session = settings.Session()
         job = session.query(BaseJob).filter_by(id=self.id).one()
         make_transient(job)
@@ -186,6 +197,29 @@ class BaseJob(Base, LoggingMixin):
         session.close()
         self.logger.debug('[heart] Boom.')
 
+    def use_heartbeat_agent(self):
+        return HeartbeatAgentJob.is_agent_alive(HEARTBEAT_AGENT_FOLDER,
+                                                HEARTBEAT_AGENT_INTERVAL)
+
+    def heartbeat_through_agent(self):
+        heartbeat_file = os.path.join(HEARTBEAT_AGENT_FOLDER, str(self.id))
+        if os.path.exists(heartbeat_file + HeartbeatAgentJob.SHUTDOWN_SUFFIX):
+            self.kill()
+
+        if self.latest_heartbeat:
+            sleep(max(
+                0,
+                self.heartrate - (datetime.now() - self.latest_heartbeat).total_seconds()))
+
+        with open(heartbeat_file, 'a'):
+            os.utime(heartbeat_file, None)
+        self.latest_heartbeat = datetime.now()
+
+        session = settings.Session()
+        self.heartbeat_callback(session=session)
+        session.close()
+        self.logger.debug('[heart] Boom.')
+
     def run(self):
         Stats.incr(self.__class__.__name__.lower() + '_start', 1, 1)
         # Adding an entry in the DB
@@ -198,7 +232,10 @@ class BaseJob(Base, LoggingMixin):
         self.id = id_
 
         # Run
-        self._execute()
+        try:
+            self._execute()
+        finally:
+            HeartbeatAgentJob.remove_heartbeat(HEARTBEAT_AGENT_FOLDER, self.id)
 
         # Marking the success in the DB
         self.end_date = datetime.now()
@@ -241,7 +278,8 @@ class DagFileProcessor(AbstractDagFileProcessor):
     # Counter that increments everytime an instance of this class is created
     class_creation_counter = 0
 
-    def __init__(self, file_path, pickle_dags, dag_id_white_list, log_file):
+    def __init__(self, file_path, pickle_dags, dag_id_white_list, log_file,
+                 simple_dag_store):
         """
         :param file_path: a Python file containing Airflow DAG definitions
         :type file_path: unicode
@@ -251,9 +289,12 @@ class DagFileProcessor(AbstractDagFileProcessor):
         :type dag_id_whitelist: list[unicode]
         :param log_file: the path to the file where log lines should be output
         :type log_file: unicode
+        :param simple_dag_store: store for the SimpleDags found in the file
+        :type simple_dag_store: SimpleDagStore
         """
         self._file_path = file_path
         self._log_file = log_file
+        self._simple_dag_store = simple_dag_store
         # Queue that's used to pass results from the child process.
         self._result_queue = multiprocessing.Queue()
         # The process that was launched to process the given .
@@ -285,7 +326,8 @@ class DagFileProcessor(AbstractDagFileProcessor):
                         pickle_dags,
                         dag_id_white_list,
                         thread_name,
-                        log_file):
+                        log_file,
+                        simple_dag_store):
         """
         Launch a process to process the given file.
 
@@ -304,6 +346,9 @@ class DagFileProcessor(AbstractDagFileProcessor):
         :param log_file: the logging output for the process should be directed
         to this file
         :type log_file: unicode
+        :param simple_dag_store: the store to put the SimpleDags found in the
+        file into
+        :type simple_dag_store: SimpleDagStore
         :return: the process that was launched
         :rtype: multiprocessing.Process
         """
@@ -345,7 +390,7 @@ class DagFileProcessor(AbstractDagFileProcessor):
                 scheduler_job = SchedulerJob(dag_ids=dag_id_white_list)
                 result = scheduler_job.process_file(file_path,
                                                     pickle_dags)
-                result_queue.put(result)
+                result_queue.put(simple_dag_store.write(file_path, result))
                 end_time = time.time()
                 logging.info("Processing %s took %.3f seconds",
                              file_path,
@@ -375,7 +420,8 @@ class DagFileProcessor(AbstractDagFileProcessor):
             self._pickle_dags,
             self._dag_id_white_list,
             "DagFileProcessor{}".format(self._instance_id),
-            self.log_file)
+            self.log_file,
+            self._simple_dag_store)
         self._start_time = datetime.now()
 
     def terminate(self, sigkill=False):
@@ -451,8 +497,9 @@ class DagFileProcessor(AbstractDagFileProcessor):
     @property
     def result(self):
         """
-        :return: result of running SchedulerJob.process_file()
-        :rtype: SimpleDag
+        :return: the version of the SimpleDags returned by
+        SchedulerJob.process_file() in the SimpleDagStore
+        :rtype: unicode
         """
         if not self.done:
             raise AirflowException("Tried to get the result before it's done!")
@@ -546,6 +593,13 @@ class SchedulerJob(BaseJob):
         # Parse and schedule each file no faster than this interval. Default
         # to 3 minutes.
         self.file_process_interval = file_process_interval
+        # Parse and schedule each file which wasn't modified no faster than
+        # this interval
+        self.unchanged_file_process_interval = conf.getint(
+            'scheduler', 'unchanged_file_process_interval')
+        # Directory where the SimpleDags found in the DAG files are kept
+        self.simple_dag_store_folder = os.path.expanduser(
+            conf.get('scheduler', 'simple_dag_store_folder'))
         # Directory where log files for the processes that scheduled the DAGs reside
         self.child_process_log_directory = conf.get('scheduler',
                                                     'child_process_log_directory')
@@ -885,13 +939,18 @@ class SchedulerJob(BaseJob):
         for run in active_dag_runs:
             self.logger.debug("Examining active DAG run {}".format(run))
             # this needs a fresh session sometimes tis get detached
-            tis = run.get_task_instances(state=(State.NONE,
-                                                State.UP_FOR_RETRY))
+            tis = run.get_task_instances()
+
+            # upstream states of all the task instances of the run are counted
+            # from this single snapshot, which is updated by the dependency
+            # checks that flag task instances as upstream_failed or skipped
+            dep_context = DepContext(flag_upstream_failed=True,
+                                     task_states={ti.task_id: ti.state for ti in tis})
 
-            # this loop is quite slow as it uses are_dependencies_met for
-            # every task (in ti.is_runnable). This is also called in
-            # update_state above which has already checked these tasks
             for ti in tis:
+                if ti.state not in (State.NONE, State.UP_FOR_RETRY):
+                    continue
+
                 task = dag.get_task(ti.task_id)
 
                 # fixme: ti.task is transient but needs to be set
@@ -902,7 +961,7 @@ class SchedulerJob(BaseJob):
                     continue
 
                 if ti.are_dependencies_met(
-                        dep_context=DepContext(flag_upstream_failed=True),
+                        dep_context=dep_context,
                         session=session):
                     self.logger.debug('Queuing task: {}'.format(ti))
                     queue.append(ti.key)
@@ -975,6 +1034,11 @@ class SchedulerJob(BaseJob):
         Fetches task instances from ORM in the specified states, figures
         out pool limits, and sends them to the executor for execution.
 
+        Candidates, pool usage and DAG concurrency are read with a fixed
+        number of queries, admission is computed in memory and the admitted
+        task instances are set to QUEUED with one UPDATE per batch of
+        [scheduler] max_tis_per_query rows.
+
         :param simple_dag_bag: TaskInstances associated with DAGs in the
         simple_dag_bag will be fetched from the DB and executed
         :type simple_dag_bag: SimpleDagBag
@@ -987,11 +1051,17 @@ class SchedulerJob(BaseJob):
         # Get all the queued task instances from associated with scheduled
         # DagRuns.
         TI = models.TaskInstance
+        DR = models.DagRun
+        # todo: remove the backfill filter when backfills will be part of the scheduler
         task_instances_to_examine = (
             session
             .query(TI)
+            .outerjoin(DR, and_(DR.dag_id == TI.dag_id,
+                                DR.execution_date == TI.execution_date))
             .filter(TI.dag_id.in_(simple_dag_bag.dag_ids))
             .filter(TI.state.in_(states))
+            .filter(or_(DR.run_id.is_(None),
+                        not_(DR.run_id.like(BackfillJob.ID_PREFIX + '%'))))
             .all()
         )
 
@@ -1004,23 +1074,56 @@ class SchedulerJob(BaseJob):
             ["{}".format(x) for x in task_instances_to_examine])
         self.logger.info("Tasks up for execution:\n\t{}".format(task_instance_str))
 
+        # The rows are updated in bulk below, detach the objects, so they
+        # keep the loaded attributes after commit
+        for task_instance in task_instances_to_examine:
+            make_transient(task_instance)
+
         # Get the pool settings
         pools = {p.pool: p for p in session.query(models.Pool).all()}
+        pool_to_used_slots = dict(
+            session
+            .query(TI.pool, func.count())
+            .filter(TI.pool.in_(list(pools.keys())))
+            .filter(TI.state.in_([State.RUNNING, State.QUEUED]))
+            .group_by(TI.pool)
+            .all()
+        ) if pools else {}
+
+        # DAG IDs with running tasks that equal the concurrency limit of the dag
+        # TODO(saguziel): also check against QUEUED state, see AIRFLOW-1104
+        dag_id_to_possibly_running_task_count = defaultdict(int)
+        running_task_counts = (
+            session
+            .query(TI.dag_id, TI.task_id, func.count())
+            .filter(TI.dag_id.in_(simple_dag_bag.dag_ids))
+            .filter(TI.state == State.RUNNING)
+            .group_by(TI.dag_id, TI.task_id)
+            .all()
+        )
+        for dag_id, task_id, count in running_task_counts:
+            if task_id in simple_dag_bag.get_dag(dag_id).task_ids:
+                dag_id_to_possibly_running_task_count[dag_id] += count
 
         pool_to_task_instances = defaultdict(list)
         for task_instance in task_instances_to_examine:
             pool_to_task_instances[task_instance.pool].append(task_instance)
 
-        # Go through each pool, and queue up a task for execution if there are
+        # Go through each pool, and pick a task for execution if there are
         # any open slots in the pool.
+        task_instances_to_queue = []
         for pool, task_instances in pool_to_task_instances.items():
             if not pool:
                 # Arbitrary:
                 # If queued outside of a pool, trigger no more than
                 # non_pooled_task_slot_count per run
                 open_slots = conf.getint('core', 'non_pooled_task_slot_count')
+            elif pool not in pools:
+                self.logger.warning("Tasks using non-existent pool '{}' will not "
+                                    "be scheduled".format(pool))
+                continue
             else:
-                open_slots = pools[pool].open_slots(session=session)
+                open_slots = pools[pool].slots - pool_to_used_slots.get(pool, 0)
 
             num_queued = len(task_instances)
             self.logger.info("Figuring out tasks to run in Pool(name={pool}) "
@@ -1033,9 +1136,6 @@ class SchedulerJob(BaseJob):
             priority_sorted_task_instances = sorted(
                 task_instances, key=lambda ti: (-ti.priority_weight, ti.execution_date))
 
-            # DAG IDs with running tasks that equal the concurrency limit of the dag
-            dag_id_to_possibly_running_task_count = {}
-
             for task_instance in priority_sorted_task_instances:
                 if open_slots <= 0:
                     self.logger.info("No more slots free")
@@ -1052,24 +1152,9 @@ class SchedulerJob(BaseJob):
                                      .format(task_instance, task_instance.dag_id))
                     continue
 
-                # todo: remove this logic when backfills will be part of the scheduler
-                dag_run = task_instance.get_dagrun()
-                if dag_run and dag_run.is_backfill:
-                    continue
-
                 # Check to make sure that the task concurrency of the DAG hasn't been
                 # reached.
                 dag_id = task_instance.dag_id
-
-                if dag_id not in dag_id_to_possibly_running_task_count:
-                    # TODO(saguziel): also check against QUEUED state, see AIRFLOW-1104
-                    dag_id_to_possibly_running_task_count[dag_id] = \
-                        DAG.get_num_task_instances(
-                            dag_id,
-                            simple_dag_bag.get_dag(dag_id).task_ids,
-                            states=[State.RUNNING],
-                            session=session)
-
                 current_task_concurrency = dag_id_to_possibly_running_task_count[dag_id]
                 task_concurrency_limit = simple_dag_bag.get_dag(dag_id).concurrency
                 self.logger.info("DAG {} has {}/{} running and queued tasks"
@@ -1086,60 +1171,108 @@ class SchedulerJob(BaseJob):
                                              task_concurrency_limit))
                     continue
 
-                command = " ".join(TI.generate_command(
-                    task_instance.dag_id,
-                    task_instance.task_id,
-                    task_instance.execution_date,
-                    local=True,
-                    mark_success=False,
-                    ignore_all_deps=False,
-                    ignore_depends_on_past=False,
-                    ignore_task_deps=False,
-                    ignore_ti_state=False,
-                    pool=task_instance.pool,
-                    file_path=simple_dag_bag.get_dag(task_instance.dag_id).full_filepath,
-                    pickle_id=simple_dag_bag.get_dag(task_instance.dag_id).pickle_id))
-
-                priority = task_instance.priority_weight
-                queue = task_instance.queue
-                self.logger.info("Sending to executor {} with priority {} and queue {}"
-                                 .format(task_instance.key, priority, queue))
-
-                # Set the state to queued
-                task_instance.refresh_from_db(lock_for_update=True, session=session)
-                if task_instance.state not in states:
-                    self.logger.info("Task {} was set to {} outside this scheduler."
-                                     .format(task_instance.key, task_instance.state))
-                    session.commit()
-                    continue
-
-                self.logger.info("Setting state of {} to {}".format(
-                    task_instance.key, State.QUEUED))
-                task_instance.state = State.QUEUED
-                task_instance.queued_dttm = (datetime.now()
-                                             if not task_instance.queued_dttm
-                                             else task_instance.queued_dttm)
-                session.merge(task_instance)
-                session.commit()
-
-                # These attributes will be lost after the object expires, so save them.
-                task_id_ = task_instance.task_id
-                dag_id_ = task_instance.dag_id
-                execution_date_ = task_instance.execution_date
-                make_transient(task_instance)
-                task_instance.task_id = task_id_
-                task_instance.dag_id = dag_id_
-                task_instance.execution_date = execution_date_
-
-                self.executor.queue_command(
-                    task_instance,
-                    command,
-                    priority=priority,
-                    queue=queue)
-
+                task_instances_to_queue.append(task_instance)
                 open_slots -= 1
                 dag_id_to_possibly_running_task_count[dag_id] += 1
 
+        batch_size = conf.getint('scheduler', 'max_tis_per_query')
+        for i in range(0, len(task_instances_to_queue), batch_size):
+            queued = self._change_state_for_executable_task_instances(
+                task_instances_to_queue[i:i + batch_size], states, session=session)
+            for task_instance in queued:
+                self._enqueue_task_instance(simple_dag_bag, task_instance)
+
+    @provide_session
+    def _change_state_for_executable_task_instances(self,
+                                                    task_instances,
+                                                    acceptable_states,
+                                                    session=None):
+        """
+        Sets the state of task instances which are still in one of the
+        acceptable states to QUEUED with a single UPDATE.
+
+        :param task_instances: task instances to set to QUEUED
+        :type task_instances: List[TaskInstance]
+        :param acceptable_states: states the task instances are expected
+            to be in, the ones changed outside this scheduler are skipped
+        :type acceptable_states: Tuple[State]
+        :return: the task instances set to QUEUED
+        :rtype: List[TaskInstance]
+        """
+        TI = models.TaskInstance
+        filter_for_tis = or_(*[and_(TI.dag_id == ti.dag_id,
+                                    TI.task_id == ti.task_id,
+                                    TI.execution_date == ti.execution_date)
+                               for ti in task_instances])
+
+        # Lock the rows which are still in the acceptable states, so nobody
+        # changes them between the SELECT and the UPDATE
+        locked_keys = set(
+            tuple(key) for key in session
+            .query(TI.dag_id, TI.task_id, TI.execution_date)
+            .filter(filter_for_tis)
+            .filter(TI.state.in_(acceptable_states))
+            .with_for_update()
+            .all()
+        )
+        queued_dttm = datetime.now()
+        if locked_keys:
+            (
+                session
+                .query(TI)
+                .filter(filter_for_tis)
+                .filter(TI.state.in_(acceptable_states))
+                .update({TI.state: State.QUEUED,
+                         TI.queued_dttm: func.coalesce(TI.queued_dttm, queued_dttm)},
+                        synchronize_session=False)
+            )
+        session.commit()
+
+        queued = []
+        for task_instance in task_instances:
+            if task_instance.key not in locked_keys:
+                self.logger.info("Task {} was set to a new state outside this scheduler."
+                                 .format(task_instance.key))
+                continue
+            self.logger.info("Setting state of {} to {}".format(
+                task_instance.key, State.QUEUED))
+            task_instance.state = State.QUEUED
+            task_instance.queued_dttm = task_instance.queued_dttm or queued_dttm
+            queued.append(task_instance)
+        return queued
+
+    def _enqueue_task_instance(self, simple_dag_bag, task_instance):
+        """
+        Sends the QUEUED task instance to the executor.
+        """
+        TI = models.TaskInstance
+        simple_dag = simple_dag_bag.get_dag(task_instance.dag_id)
+        command = " ".join(TI.generate_command(
+            task_instance.dag_id,
+            task_instance.task_id,
+            task_instance.execution_date,
+            local=True,
+            mark_success=False,
+            ignore_all_deps=False,
+            ignore_depends_on_past=False,
+            ignore_task_deps=False,
+            ignore_ti_state=False,
+            pool=task_instance.pool,
+            file_path=simple_dag.full_filepath,
+            pickle_id=simple_dag.pickle_id))
+
+        priority = task_instance.priority_weight
+        queue = task_instance.queue
+        self.logger.info("Sending to executor {} with priority {} and queue {}"
+                         .format(task_instance.key, priority, queue))
+
+        self.executor.queue_command(
+            task_instance,
+            command,
+            priority=priority,
+            queue=queue,
+            resources=simple_dag.task_resources.get(task_instance.task_id))
+
     def _process_dags(self, dagbag, dags, tis_out):
         """
         Iterates over the dags and processes them. Processing includes:
@@ -1177,6 +1310,7 @@ class SchedulerJob(BaseJob):
             self.manage_slas(dag)
 
         models.DagStat.update([d.dag_id for d in dags])
+        models.TaskStat.update([d.dag_id for d in dags])
 
     def _process_executor_events(self):
         """
@@ -1293,11 +1427,18 @@ class SchedulerJob(BaseJob):
         self.logger.info("There are {} files in {}"
                          .format(len(known_file_paths), self.subdir))
 
+        # The DAGs stored by the previous runs are scheduled until their
+        # files are processed again
+        simple_dag_store = SimpleDagStore(self.simple_dag_store_folder)
+        for file_path in known_file_paths:
+            simple_dag_store.read(file_path)
+
         def processor_factory(file_path, log_file_path):
             return DagFileProcessor(file_path,
                                     pickle_dags,
                                     self.dag_ids,
-                                    log_file_path)
+                                    log_file_path,
+                                    simple_dag_store)
 
         processor_manager = DagFileProcessorManager(self.subdir,
                                                     known_file_paths,
@@ -1305,7 +1446,9 @@ class SchedulerJob(BaseJob):
                                                     self.file_process_interval,
                                                     self.child_process_log_directory,
                                                     self.num_runs,
-                                                    processor_factory)
+                                                    processor_factory,
+                                                    simple_dag_store,
+                                                    self.unchanged_file_process_interval)
 
         try:
             self._execute_helper(processor_manager)
@@ -1344,6 +1487,15 @@ class SchedulerJob(BaseJob):
                         child.kill()
                         child.wait()
 
+    @provide_session
+    def _get_paused_dag_ids(self, session=None):
+        """
+        :return: IDs of the DAGs which are paused
+        :rtype: set[unicode]
+        """
+        DM = models.DagModel
+        return set(dag_id for dag_id, in session.query(DM.dag_id).filter(DM.is_paused))
+
     def _execute_helper(self, processor_manager):
         """
         :param processor_manager: manager to use
@@ -1414,6 +1566,12 @@ class SchedulerJob(BaseJob):
                                   "using sqlite")
                 processor_manager.wait_until_finished()
 
+            # The DAGs of the files which weren't processed in this loop
+            # could have been paused since
+            paused_dag_ids = self._get_paused_dag_ids()
+            simple_dags = [simple_dag for simple_dag in simple_dags
+                           if simple_dag.dag_id not in paused_dag_ids]
+
             # Send tasks for execution if available
             if len(simple_dags) > 0:
                 simple_dag_bag = SimpleDagBag(simple_dags)
@@ -1565,7 +1723,8 @@ class SchedulerJob(BaseJob):
                                              dag.full_filepath,
                                              dag.concurrency,
                                              dag.is_paused,
-                                             pickle_id))
+                                             pickle_id,
+                                             dag.task_resources))
 
         if len(self.dag_ids) > 0:
             dags = [dag for dag in dagbag.dags.values()
@@ -1582,6 +1741,12 @@ class SchedulerJob(BaseJob):
         ti_keys_to_schedule = []
 
         self._process_dags(dagbag, dags, ti_keys_to_schedule)
+        # Paused DAGs aren't processed, but their running task instances
+        # still finish and their dag runs can be changed from the UI. Their
+        # dag stats are updated after the task stats, which tell the changed
+        # dag runs by the dirty dag stats
+        models.TaskStat.update(paused_dag_ids, changed_only=True)
+        models.DagStat.update(paused_dag_ids)
 
         for ti_key in ti_keys_to_schedule:
             dag = dagbag.dags[ti_key[0]]
@@ -1676,8 +1841,8 @@ class BackfillJob(BaseJob):
         :param failed:
         :param tasks_to_run:
         """
+        self._refresh_task_instances(list(started.values()))
         for key, ti in list(started.items()):
-            ti.refresh_from_db()
             if ti.state == State.SUCCESS:
                 succeeded.add(key)
                 self.logger.debug("Task instance {} succeeded. "
@@ -1716,6 +1881,42 @@ class BackfillJob(BaseJob):
                 started.pop(key)
                 tasks_to_run[key] = ti
 
+    @provide_session
+    def _refresh_task_instances(self, tis, session=None):
+        """
+        Refreshes the task instances from the database with a single query
+        over the range of their execution dates, instead of a query per
+        task instance.
+        :param tis: task instances of the backfilled dag to refresh
+        """
+        if not tis:
+            return
+
+        TI = models.TaskInstance
+        execution_dates = [ti.execution_date for ti in tis]
+        rows = (
+            session
+            .query(TI.task_id, TI.execution_date, TI.state, TI.start_date,
+                   TI.end_date, TI.try_number, TI.hostname, TI.pid)
+            .filter(TI.dag_id == self.dag.dag_id)
+            .filter(TI.execution_date >= min(execution_dates))
+            .filter(TI.execution_date <= max(execution_dates))
+            .all()
+        )
+        rows = {(row.task_id, row.execution_date): row for row in rows}
+
+        for ti in tis:
+            row = rows.get((ti.task_id, ti.execution_date))
+            if row:
+                ti.state = row.state
+                ti.start_date = row.start_date
+                ti.end_date = row.end_date
+                ti.try_number = row.try_number
+                ti.hostname = row.hostname
+                ti.pid = row.pid
+            else:
+                ti.state = None
+
     def _manage_executor_state(self, started):
         """
         Checks if the executor agrees with the state of task instances
@@ -1782,6 +1983,7 @@ class BackfillJob(BaseJob):
         executor.start()
 
         # Build a list of all instances to run
+        all_tis = {}
         tasks_to_run = {}
         failed = set()
         succeeded = set()
@@ -1840,31 +2042,61 @@ class BackfillJob(BaseJob):
                 if ti.state == State.NONE:
                     ti.set_state(State.SCHEDULED, session=session)
                 tasks_to_run[ti.key] = ti
+                all_tis[ti.key] = ti
 
             next_run_date = self.dag.following_schedule(next_run_date)
 
         finished_runs = 0
         total_runs = len(active_dag_runs)
 
+        # states of the task instances at the start of the previous pass
+        # and the ones started at its end
+        last_states = {}
+        last_started = set()
+
         # Triggering what is ready to get triggered
         while (len(tasks_to_run) > 0 or len(started) > 0) and not deadlocked:
             self.logger.debug("*** Clearing out not_ready list ***")
+            last_not_ready = set(not_ready)
             not_ready.clear()
 
+            # refresh the whole backfill with one query, a task instance which
+            # wasn't ready is only evaluated again if it or its upstream changed
+            # since the previous pass, or a running task instance freed its slot
+            self._refresh_task_instances(list(all_tis.values()), session=session)
+            changed = set(key for key, ti in all_tis.items()
+                          if key not in last_states or last_states[key] != ti.state)
+            last_states = {key: ti.state for key, ti in all_tis.items()}
+            slots_freed = bool(last_started - set(started))
+
+            # index the task instances to run by task, so every task
+            # only visits its own task instances
+            task_id_to_keys = defaultdict(list)
+            for key, ti in tasks_to_run.items():
+                task_id_to_keys[ti.task_id].append(key)
+
             # we need to execute the tasks bottom to top
             # or leaf to root, as otherwise tasks might be
             # determined deadlocked while they are actually
             # waiting for their upstream to finish
             for task in self.dag.topological_sort():
-                for key, ti in list(tasks_to_run.items()):
-                    if task.task_id != ti.task_id:
-                        continue
-
-                    ti.refresh_from_db()
+                for key in task_id_to_keys.get(task.task_id, []):
+                    ti = tasks_to_run[key]
 
                     task = self.dag.get_task(ti.task_id)
                     ti.task = task
 
+                    if (key in last_not_ready and
+                            key not in changed and
+                            not slots_freed and
+                            ti.state != State.UP_FOR_RETRY and
+                            not task.depends_on_past and
+                            not any((ti.dag_id, upstream_task_id, ti.execution_date) in changed
+                                    for upstream_task_id in task.upstream_task_ids)):
+                        self.logger.debug("Task instance {} is still not ready".format(ti))
+                        not_ready.add(key)
+                        continue
+
                     ignore_depends_on_past = (
                         self.ignore_first_depends_on_past and
                         ti.execution_date == (start_date or ti.start_date))
@@ -1965,6 +2197,8 @@ class BackfillJob(BaseJob):
                     self.logger.debug('Adding {} to not_ready'.format(ti))
                     not_ready.add(key)
 
+            last_started = set(started)
+
             # execute the tasks in the queue
             self.heartbeat()
             executor.heartbeat()
@@ -1996,6 +2230,7 @@ class BackfillJob(BaseJob):
 
                 if run.dag.is_paused:
                     models.DagStat.update([run.dag_id], session=session)
+                    models.TaskStat.update([run.dag_id], session=session)
 
             msg = ' | '.join([
                 "[backfill progress]",
@@ -2197,3 +2432,150 @@ class LocalTaskJob(BaseJob):
                 "{}. Taking the poison pill. So long.".format(ti.state))
             self.task_runner.terminate()
             self.terminating = True
+
+
+class HeartbeatAgentJob(BaseJob):
+    """
+    Writes the heartbeats of all the jobs running on this host into the
+    database at once and lets them know when they are shut down externally.
+    The jobs leave their heartbeats as modification times of the <job id>
+    files in the folder and find the <job id>.shutdown file there once
+    their state is set to shutdown.
+    """
+
+    __mapper_args__ = {
+        'polymorphic_identity': 'HeartbeatAgentJob'
+    }
+
+    AGENT_FILE = 'agent'
+    SHUTDOWN_SUFFIX = '.shutdown'
+
+    def __init__(
+            self,
+            folder=HEARTBEAT_AGENT_FOLDER,
+            interval=HEARTBEAT_AGENT_INTERVAL,
+            num_runs=-1,
+            *args, **kwargs):
+        self.folder = folder
+        self.interval = interval
+        self.num_runs = num_runs
+        # modification times of the heartbeat files on the previous run
+        self.last_heartbeats = {}
+
+        super(HeartbeatAgentJob, self).__init__(heartrate=interval, *args, **kwargs)
+
+    @classmethod
+    def is_agent_alive(cls, folder, interval):
+        try:
+            agent_heartbeat = os.path.getmtime(os.path.join(folder, cls.AGENT_FILE))
+        except OSError:
+            return False
+        return time.time() - agent_heartbeat < interval * 2.1
+
+    @classmethod
+    def remove_heartbeat(cls, folder, job_id):
+        heartbeat_file = os.path.join(folder, str(job_id))
+        for filename in [heartbeat_file, heartbeat_file + cls.SHUTDOWN_SUFFIX]:
+            try:
+                os.remove(filename)
+            except OSError:
+                pass
+
+    def use_heartbeat_agent(self):
+        return False
+
+    def read_heartbeats(self):
+        heartbeats = {}
+        for filename in os.listdir(self.folder):
+            if not filename.isdigit():
+                continue
+            try:
+                heartbeats[int(filename)] = os.path.getmtime(
+                    os.path.join(self.folder, filename))
+            except OSError:
+                # the job has finished meanwhile
+                continue
+        return heartbeats
+
+    @provide_session
+    def write_heartbeats(self, session=None):
+        """
+        Writes the new heartbeats of the jobs with one update per
+        [scheduler] max_tis_per_query jobs and marks the jobs which have to
+        be shut down. Returns the number of the written heartbeats.
+        """
+        now = time.time()
+        heartbeats = self.read_heartbeats()
+        new_heartbeats = [(job_id, heartbeat) for job_id, heartbeat in heartbeats.items()
+                          if heartbeat != self.last_heartbeats.get(job_id)]
+        batch_size = conf.getint('scheduler', 'max_tis_per_query')
+        for i in range(0, len(new_heartbeats), batch_size):
+            batch = dict(new_heartbeats[i:i + batch_size])
+            latest_heartbeat = case(
+                {job_id: datetime.fromtimestamp(heartbeat)
+                 for job_id, heartbeat in batch.items()},
+                value=BaseJob.id)
+            (
+                session
+                .query(BaseJob)
+                .filter(BaseJob.id.in_(batch.keys()))
+                .filter(BaseJob.state == State.RUNNING)
+                .update({BaseJob.latest_heartbeat: latest_heartbeat},
+                        synchronize_session=False)
+            )
+
+        job_ids = list(heartbeats.keys())
+        states = {}
+        for i in range(0, len(job_ids), batch_size):
+            states.update(
+                session
+                .query(BaseJob.id, BaseJob.state)
+                .filter(BaseJob.id.in_(job_ids[i:i + batch_size]))
+                .all()
+            )
+        session.commit()
+
+        for job_id in job_ids:
+            state = states.get(job_id)
+            if state == State.SHUTDOWN:
+                shutdown_file = os.path.join(self.folder, str(job_id) + self.SHUTDOWN_SUFFIX)
+                open(shutdown_file, 'a').close()
+            elif state != State.RUNNING:
+                # the job has ended without removing its heartbeat
+                self.remove_heartbeat(self.folder, job_id)
+        self.last_heartbeats = heartbeats
+
+        agent_file = os.path.join(self.folder, self.AGENT_FILE)
+        with open(agent_file, 'a'):
+            os.utime(agent_file, None)
+
+        if new_heartbeats:
+            # the oldest heartbeat waited this long to be written
+            lag = now - min(heartbeat for _, heartbeat in new_heartbeats)
+            Stats.gauge('heartbeat_agent_lag', lag)
+            self.logger.debug("Wrote {} heartbeats, max lag {:.2f}s".format(
+                len(new_heartbeats), lag))
+        Stats.gauge('heartbeat_agent_jobs', len(heartbeats))
+        return len(new_heartbeats)
+
+    def _execute(self):
+        self.logger.info("Writing heartbeats of the jobs from {}".format(self.folder))
+        if not os.path.exists(self.folder):
+            os.makedirs(self.folder)
+        try:
+            runs = 0
+            while True:
+                self.write_heartbeats()
+                runs += 1
+                if runs == self.num_runs:
+                    break
+                self.heartbeat()
+        finally:
+            self.on_kill()
+
+    def on_kill(self):
+        # jobs write their heartbeats to the database again
+        try:
+            os.remove(os.path.join(self.folder, self.AGENT_FILE))
+        except OSError:
+            pass
@@ -0,0 +1,41 @@
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""add description, schedule_interval and max_active_runs to dag
+
+Revision ID: 8e1a9c3d5f27
+Revises: 4b5f8e2c7a61
+Create Date: 2017-03-24 15:40:12.519087
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '8e1a9c3d5f27'
+down_revision = '4b5f8e2c7a61'
+branch_labels = None
+depends_on = None
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.add_column('dag', sa.Column('description', sa.Text(), nullable=True))
+    op.add_column('dag', sa.Column('schedule_interval', sa.String(length=1000), nullable=True))
+    op.add_column('dag', sa.Column('max_active_runs', sa.Integer(), nullable=True))
+
+
+def downgrade():
+    op.drop_column('dag', 'max_active_runs')
+    op.drop_column('dag', 'schedule_interval')
+    op.drop_column('dag', 'description')
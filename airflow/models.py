@@ -22,7 +22,7 @@ install_aliases()
 from builtins import str
 from builtins import object, bytes
 import copy
-from collections import namedtuple
+from collections import Counter, OrderedDict, deque, namedtuple
 from datetime import datetime, timedelta
 import dill
 import functools
@@ -51,7 +51,7 @@ from urllib.parse import urlparse
 from sqlalchemy import (
     Column, Integer, String, DateTime, Text, Boolean, ForeignKey, PickleType,
     Index, Float)
-from sqlalchemy import func, or_, and_
+from sqlalchemy import func, or_, and_, union_all
 from sqlalchemy.ext.declarative import declarative_base, declared_attr
 from sqlalchemy.dialects.mysql import LONGTEXT
 from sqlalchemy.orm import reconstructor, relationship, synonym
@@ -475,6 +475,104 @@ class DagBag(BaseDagBag, LoggingMixin):
         return dag_ids
 
 
+class LazyDagBag(DagBag):
+    """
+    A DagBag which doesn't import the DAG folder upfront. DAG files are
+    imported on demand by ``get_dag``, through the file locations the
+    scheduler saved in the metadata DB, and kept in memory until they change
+    on disk or are among the least recently used files once more than
+    ``max_loaded_dags`` DAGs are loaded. This is meant for the web server,
+    where most of the views only need a handful of DAGs and the list of DAGs
+    can be read from the ``DagModel`` table.
+
+    All the DAGs of a file are kept or dropped together, so a file generating
+    many DAGs is imported once for all of them. The most recently used file
+    is always kept, even if it holds more than ``max_loaded_dags`` DAGs.
+
+    :param max_loaded_dags: the number of DAGs (including subdags) to keep
+        loaded, the DAGs of the least recently used files are dropped first
+    :type max_loaded_dags: int
+    """
+    def __init__(
+            self,
+            dag_folder=None,
+            executor=DEFAULT_EXECUTOR,
+            include_examples=configuration.getboolean('core', 'LOAD_EXAMPLES'),
+            max_loaded_dags=100):
+        self.max_loaded_dags = max_loaded_dags
+        super(LazyDagBag, self).__init__(
+            dag_folder=dag_folder,
+            executor=executor,
+            include_examples=include_examples)
+
+    def collect_dags(self, dag_folder=None, only_if_updated=True):
+        """
+        Overwritten: forgets all the loaded DAGs instead of importing the
+        folder, they are imported again when requested
+        """
+        self.dags = OrderedDict()
+        self.file_last_changed = {}
+        # the DAG IDs found in each of the imported files, least recently
+        # used files first
+        self.loaded_files = OrderedDict()
+        self.dag_files = {}
+
+    def process_file(self, filepath, only_if_updated=True, safe_mode=True):
+        """
+        Overwritten: remembers the DAGs found in the file
+        """
+        found_dags = super(LazyDagBag, self).process_file(
+            filepath, only_if_updated=only_if_updated, safe_mode=safe_mode)
+        if found_dags:
+            dag_ids = [dag.dag_id for dag in found_dags]
+            # drop the DAGs the file doesn't generate anymore
+            for dag_id in self.loaded_files.pop(filepath, []):
+                if dag_id not in dag_ids and \
+                        self.dag_files.get(dag_id) == filepath:
+                    self.dags.pop(dag_id, None)
+                    del self.dag_files[dag_id]
+            self.loaded_files[filepath] = dag_ids
+            for dag_id in dag_ids:
+                self.dag_files[dag_id] = filepath
+        return found_dags
+
+    def get_dag(self, dag_id):
+        """
+        Gets the DAG, importing its file if it isn't loaded, is expired or
+        was changed on disk, and drops the DAGs of the least recently used
+        files over max_loaded_dags
+        """
+        filepath = self.dag_files.get(dag_id)
+        if filepath and self._file_changed(filepath):
+            self._drop_file(filepath)
+
+        dag = super(LazyDagBag, self).get_dag(dag_id)
+        filepath = self.dag_files.get(dag_id)
+        if dag is not None and filepath in self.loaded_files:
+            # move to the end as the most recently used
+            self.loaded_files[filepath] = self.loaded_files.pop(filepath)
+        while (len(self.dags) > max(self.max_loaded_dags, 1) and
+               len(self.loaded_files) > 1):
+            self._drop_file(next(iter(self.loaded_files)))
+        return dag
+
+    def _file_changed(self, filepath):
+        try:
+            file_last_changed_on_disk = datetime.fromtimestamp(
+                os.path.getmtime(filepath))
+        except OSError:
+            return True
+        return self.file_last_changed.get(filepath) != file_last_changed_on_disk
+
+    def _drop_file(self, filepath):
+        for dag_id in self.loaded_files.pop(filepath, []):
+            if self.dag_files.get(dag_id) == filepath:
+                self.dags.pop(dag_id, None)
+                del self.dag_files[dag_id]
+        self.file_last_changed.pop(filepath, None)
+        self.logger.debug("Dropped the DAGs of {} from the DagBag".format(filepath))
+
+
 class User(Base):
     __tablename__ = "users"
 
@@ -2520,6 +2618,8 @@ class BaseOperator(object):
                 self.append_only_new(self._downstream_task_ids, task.task_id)
                 task.append_only_new(task._upstream_task_ids, self.task_id)
 
+        dag._reset_topological_order()
+
         self.detect_downstream_cycle()
 
     def set_downstream(self, task_or_task_list):
@@ -2598,10 +2698,20 @@ class DagModel(Base):
     fileloc = Column(String(2000))
     # String representing the owners
     owners = Column(String(2000))
+    # Description of the DAG
+    description = Column(Text)
+    # String representing the schedule interval
+    schedule_interval = Column(String(1000))
+    # Maximum number of active DAG runs
+    max_active_runs = Column(Integer)
 
     def __repr__(self):
         return "<DAG: {self.dag_id}>".format(self=self)
 
+    @property
+    def safe_dag_id(self):
+        return self.dag_id.replace('.', '__dot__')
+
     @classmethod
     def get_current(cls, dag_id):
         session = settings.Session()
@@ -2729,6 +2839,7 @@ class DAG(BaseDag, LoggingMixin):
         # set file location to caller source path
         self.fileloc = inspect.getsourcefile(inspect.stack()[1][0])
         self.task_dict = dict()
+        self._topological_order = None
         self.start_date = start_date
         self.end_date = end_date
         self.schedule_interval = schedule_interval
@@ -2915,6 +3026,10 @@ class DAG(BaseDag, LoggingMixin):
     def task_ids(self):
         return list(self.task_dict.keys())
 
+    @property
+    def task_resources(self):
+        return {k: v.resources for k, v in self.task_dict.items()}
+
     @property
     def active_task_ids(self):
         return list(k for k, v in self.task_dict.items() if not v.adhoc)
@@ -3097,51 +3212,47 @@ class DAG(BaseDag, LoggingMixin):
         Sorts tasks in topographical order, such that a task comes after any of its
         upstream dependencies.
 
-        Heavily inspired by:
-        http://blog.jupo.org/2012/04/06/topological-sorting-acyclic-directed-graphs/
+        Uses Kahn's algorithm, the order is computed once and memoized until
+        tasks or relationships between them are changed.
         :returns: list of tasks in topological order
         """
+        if getattr(self, '_topological_order', None) is None:
+            self._topological_order = self._kahn_sort()
+        return self._topological_order
 
-        # copy the the tasks so we leave it unmodified
-        graph_unsorted = self.tasks[:]
+    def _kahn_sort(self):
+        tasks = self.tasks
+        # number of upstream tasks not sorted yet
+        in_degree = {
+            t.task_id: len([tid for tid in set(t._upstream_task_ids)
+                            if tid in self.task_dict])
+            for t in tasks}
+        ready = deque(t for t in tasks if not in_degree[t.task_id])
 
         graph_sorted = []
-
-        # special case
-        if len(self.tasks) == 0:
-            return tuple(graph_sorted)
-
-        # Run until the unsorted graph is empty.
-        while graph_unsorted:
-            # Go through each of the node/edges pairs in the unsorted
-            # graph. If a set of edges doesn't contain any nodes that
-            # haven't been resolved, that is, that are still in the
-            # unsorted graph, remove the pair from the unsorted graph,
-            # and append it to the sorted graph. Note here that by using
-            # using the items() method for iterating, a copy of the
-            # unsorted graph is used, allowing us to modify the unsorted
-            # graph as we move through it. We also keep a flag for
-            # checking that that graph is acyclic, which is true if any
-            # nodes are resolved during each pass through the graph. If
-            # not, we need to bail out as the graph therefore can't be
-            # sorted.
-            acyclic = False
-            for node in list(graph_unsorted):
-                for edge in node.upstream_list:
-                    if edge in graph_unsorted:
-                        break
-                # no edges in upstream tasks
-                else:
-                    acyclic = True
-                    graph_unsorted.remove(node)
-                    graph_sorted.append(node)
-
-            if not acyclic:
-                raise AirflowException("A cyclic dependency occurred in dag: {}"
-                                       .format(self.dag_id))
+        while ready:
+            task = ready.popleft()
+            graph_sorted.append(task)
+            for tid in set(task._downstream_task_ids):
+                if tid not in in_degree:
+                    continue
+                in_degree[tid] -= 1
+                if not in_degree[tid]:
+                    ready.append(self.task_dict[tid])
+
+        if len(graph_sorted) < len(tasks):
+            raise AirflowException("A cyclic dependency occurred in dag: {}"
+                                   .format(self.dag_id))
 
         return tuple(graph_sorted)
 
+    def _reset_topological_order(self):
+        """
+        Drops the memoized topological order, called when tasks or their
+        relationships change.
+        """
+        self._topological_order = None
+
     @provide_session
     def set_dag_runs_state(
             self, state=State.RUNNING, session=None):
@@ -3151,6 +3262,7 @@ class DAG(BaseDag, LoggingMixin):
             dr.state = state
             dirty_ids.append(dr.dag_id)
         DagStat.update(dirty_ids, session=session)
+        TaskStat.update(dirty_ids, session=session)
 
     def clear(
             self, start_date=None, end_date=None,
@@ -3265,6 +3377,8 @@ class DAG(BaseDag, LoggingMixin):
         if len(dag.tasks) < len(self.tasks):
             dag.partial = True
 
+        dag._reset_topological_order()
+
         return dag
 
     def has_task(self, task_id):
@@ -3356,6 +3470,7 @@ class DAG(BaseDag, LoggingMixin):
         else:
             self.tasks.append(task)
             self.task_dict[task.task_id] = task
+            self._reset_topological_order()
             task.dag = self
 
         self.task_count = len(self.tasks)
@@ -3497,6 +3612,10 @@ class DAG(BaseDag, LoggingMixin):
         orm_dag.fileloc = dag.fileloc
         orm_dag.is_subdag = dag.is_subdag
         orm_dag.owners = owner
+        orm_dag.description = dag.description
+        orm_dag.schedule_interval = (
+            str(dag.schedule_interval) if dag.schedule_interval is not None else None)
+        orm_dag.max_active_runs = dag.max_active_runs
         orm_dag.is_active = True
         orm_dag.last_scheduler_run = sync_time
         session.merge(orm_dag)
@@ -3987,6 +4106,121 @@ class DagStat(Base):
                     logging.exception(e)
 
 
+class TaskStat(Base):
+    """
+    Number of task instances in each state of the running dag runs and the
+    latest finished dag run of a dag. The counts are refreshed by the
+    scheduler, so the web server doesn't have to compute them on every
+    request.
+    """
+    __tablename__ = "task_stats"
+
+    dag_id = Column(String(ID_LEN), primary_key=True)
+    state = Column(String(50), primary_key=True)
+    count = Column(Integer, default=0)
+
+    def __init__(self, dag_id, state, count=0):
+        self.dag_id = dag_id
+        self.state = state
+        self.count = count
+
+    @staticmethod
+    @provide_session
+    def update(dag_ids, changed_only=False, session=None):
+        """
+        Recounts the task instances of the dags
+
+        :param dag_ids: dag_ids to be updated
+        :type dag_ids: list
+        :param changed_only: only recount the dags which have no stats yet,
+            whose dag runs changed since their dag stats were updated (their
+            dag stats are dirty) or which have running dag runs
+        :type changed_only: bool
+        :param session: db session to use
+        :type session: Session
+        """
+        dag_ids = set(dag_ids)
+        # avoid querying with an empty IN clause
+        if len(dag_ids) == 0:
+            return
+
+        TI = TaskInstance
+        try:
+            if changed_only:
+                counted_dag_ids = set(
+                    dag_id for dag_id, in
+                    session.query(TaskStat.dag_id)
+                    .filter(TaskStat.dag_id.in_(dag_ids))
+                    .distinct())
+                changed_dag_ids = set(
+                    dag_id for dag_id, in
+                    session.query(DagStat.dag_id)
+                    .filter(DagStat.dag_id.in_(counted_dag_ids))
+                    .filter(DagStat.dirty == True)
+                    .distinct()) if counted_dag_ids else set()
+                running_dag_ids = set(
+                    dag_id for dag_id, in
+                    session.query(DagRun.dag_id)
+                    .filter(DagRun.dag_id.in_(counted_dag_ids))
+                    .filter(DagRun.state == State.RUNNING)
+                    .distinct()) if counted_dag_ids else set()
+                dag_ids = (dag_ids - counted_dag_ids) | changed_dag_ids | \
+                    running_dag_ids
+                if len(dag_ids) == 0:
+                    session.commit()
+                    return
+
+            last_dag_run = (
+                session.query(DagRun.dag_id,
+                              func.max(DagRun.execution_date).label('execution_date'))
+                .filter(DagRun.dag_id.in_(dag_ids))
+                .filter(DagRun.state != State.RUNNING)
+                .group_by(DagRun.dag_id)
+                .subquery('last_dag_run')
+            )
+            running_dag_run = (
+                session.query(DagRun.dag_id, DagRun.execution_date)
+                .filter(DagRun.dag_id.in_(dag_ids))
+                .filter(DagRun.state == State.RUNNING)
+                .subquery('running_dag_run')
+            )
+
+            # Task instances of the running dag runs and of the most recent
+            # finished dag run
+            last_ti = (
+                session.query(TI.dag_id.label('dag_id'), TI.state.label('state'))
+                .join(last_dag_run, and_(
+                    last_dag_run.c.dag_id == TI.dag_id,
+                    last_dag_run.c.execution_date == TI.execution_date))
+            )
+            running_ti = (
+                session.query(TI.dag_id.label('dag_id'), TI.state.label('state'))
+                .join(running_dag_run, and_(
+                    running_dag_run.c.dag_id == TI.dag_id,
+                    running_dag_run.c.execution_date == TI.execution_date))
+            )
+            union_ti = union_all(last_ti, running_ti).alias('union_ti')
+            qry = (
+                session.query(union_ti.c.dag_id, union_ti.c.state, func.count())
+                .filter(union_ti.c.state.in_(State.task_states))
+                .group_by(union_ti.c.dag_id, union_ti.c.state)
+            )
+            counts = qry.all()
+
+            (
+                session.query(TaskStat)
+                .filter(TaskStat.dag_id.in_(dag_ids))
+                .delete(synchronize_session=False)
+            )
+            for dag_id, state, count in counts:
+                session.add(TaskStat(dag_id=dag_id, state=state, count=count))
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            logging.warning("Could not update task stat table")
+            logging.exception(e)
+
+
 class DagRun(Base):
     """
     DagRun describes an instance of a Dag. It can be created
@@ -3996,7 +4230,6 @@ class DagRun(Base):
 
     ID_PREFIX = 'scheduled__'
     ID_FORMAT_PREFIX = ID_PREFIX + '{0}'
-    DEADLOCK_CHECK_DEP_CONTEXT = DepContext(ignore_in_retry_period=True)
 
     id = Column(Integer, primary_key=True)
     dag_id = Column(String(ID_LEN))
@@ -4189,70 +4422,75 @@ class DagRun(Base):
             DagRun.execution_date == dag.previous_schedule(self.execution_date)
         ).first()
 
+    @provide_session
+    def get_task_state_counts(self, task_ids=None, session=None):
+        """
+        Returns the number of task instances of this dag run in each state,
+        counted by the database.
+
+        :param task_ids: count only the task instances of these tasks
+        :type task_ids: list[unicode]
+        :rtype: collections.Counter
+        """
+        TI = TaskInstance
+        qry = (
+            session
+            .query(TI.state, func.count())
+            .filter(TI.dag_id == self.dag_id,
+                    TI.execution_date == self.execution_date)
+        )
+        if task_ids is not None:
+            if not task_ids:
+                return Counter()
+            qry = qry.filter(TI.task_id.in_(task_ids))
+        return Counter(dict(qry.group_by(TI.state).all()))
+
     @provide_session
     def update_state(self, session=None):
         """
         Determines the overall state of the DagRun based on the state
         of its TaskInstances.
+
+        The decision is taken from the numbers of task instances in each
+        state. The task instances are only loaded to check for a deadlock,
+        when nothing is running or queued, so no progress is being made.
         :returns State:
         """
 
         dag = self.get_dag()
 
-        tis = self.get_task_instances(session=session)
+        state_counts = self.get_task_state_counts(session=session)
+        # skip in db?
+        state_counts.pop(State.REMOVED, None)
+        num_tis = sum(state_counts.values())
+        num_unfinished = sum(state_counts[state] for state in State.unfinished())
 
         logging.info("Updating state for {} considering {} task(s)"
-                     .format(self, len(tis)))
-
-        for ti in list(tis):
-            # skip in db?
-            if ti.state == State.REMOVED:
-                tis.remove(ti)
-            else:
-                ti.task = dag.get_task(ti.task_id)
-
-        # pre-calculate
-        # db is faster
-        start_dttm = datetime.now()
-        unfinished_tasks = self.get_task_instances(
-            state=State.unfinished(),
-            session=session
-        )
-        none_depends_on_past = all(not t.task.depends_on_past for t in unfinished_tasks)
-        # small speed up
-        if unfinished_tasks and none_depends_on_past:
-            # todo: this can actually get pretty slow: one task costs between 0.01-015s
-            no_dependencies_met = all(
-                # Use a special dependency context that ignores task's up for retry
-                # dependency, since a task that is up for retry is not necessarily
-                # deadlocked.
-                not t.are_dependencies_met(dep_context=self.DEADLOCK_CHECK_DEP_CONTEXT,
-                                           session=session)
-                for t in unfinished_tasks)
-
-        duration = (datetime.now() - start_dttm).total_seconds() * 1000
-        Stats.timing("dagrun.dependency-check.{}.{}".
-                     format(self.dag_id, self.execution_date), duration)
+                     .format(self, num_tis))
 
         # future: remove the check on adhoc tasks (=active_tasks)
-        if len(tis) == len(dag.active_tasks):
-            root_ids = [t.task_id for t in dag.roots]
-            roots = [t for t in tis if t.task_id in root_ids]
+        if num_tis == len(dag.active_tasks):
+            root_counts = self.get_task_state_counts(
+                task_ids=[t.task_id for t in dag.roots], session=session)
+            root_counts.pop(State.REMOVED, None)
+            num_roots_failed = (root_counts[State.FAILED] +
+                                root_counts[State.UPSTREAM_FAILED])
+            num_roots_succeeded = root_counts[State.SUCCESS] + root_counts[State.SKIPPED]
+            in_progress = state_counts[State.RUNNING] or state_counts[State.QUEUED]
 
             # if all roots finished and at least on failed, the run failed
-            if (not unfinished_tasks and
-                    any(r.state in (State.FAILED, State.UPSTREAM_FAILED) for r in roots)):
+            if not num_unfinished and num_roots_failed:
                 logging.info('Marking run {} failed'.format(self))
                 self.state = State.FAILED
 
             # if all roots succeeded and no unfinished tasks, the run succeeded
-            elif not unfinished_tasks and all(r.state in (State.SUCCESS, State.SKIPPED)
-                                              for r in roots):
+            elif not num_unfinished and num_roots_succeeded == sum(root_counts.values()):
                 logging.info('Marking run {} successful'.format(self))
                 self.state = State.SUCCESS
 
             # if *all tasks* are deadlocked, the run failed
-            elif unfinished_tasks and none_depends_on_past and no_dependencies_met:
+            elif (num_unfinished and not in_progress and
+                    self.is_deadlocked(dag, session=session)):
                 logging.info(
                     'Deadlock; marking run {} failed'.format(self))
                 self.state = State.FAILED
@@ -4267,6 +4505,46 @@ class DagRun(Base):
 
         return self.state
 
+    @provide_session
+    def is_deadlocked(self, dag, session=None):
+        """
+        Checks if none of the unfinished task instances of this dag run can
+        ever have its dependencies met.
+
+        :param dag: the DAG of this dag run
+        :type dag: DAG
+        :rtype: bool
+        """
+        start_dttm = datetime.now()
+
+        tis = [ti for ti in self.get_task_instances(session=session)
+               if ti.state != State.REMOVED]
+        unfinished_tasks = [ti for ti in tis if ti.state in State.unfinished()]
+        for ti in unfinished_tasks:
+            ti.task = dag.get_task(ti.task_id)
+
+        # the tasks depending on past may wait for the previous dag run
+        none_depends_on_past = all(not t.task.depends_on_past for t in unfinished_tasks)
+        no_dependencies_met = False
+        if unfinished_tasks and none_depends_on_past:
+            # Use a special dependency context that ignores task's up for retry
+            # dependency, since a task that is up for retry is not necessarily
+            # deadlocked. Upstream states are counted from the task instances
+            # loaded above instead of a query per task instance.
+            deadlock_check_dep_context = DepContext(
+                ignore_in_retry_period=True,
+                task_states={t.task_id: t.state for t in tis})
+            no_dependencies_met = all(
+                not t.are_dependencies_met(dep_context=deadlock_check_dep_context,
+                                           session=session)
+                for t in unfinished_tasks)
+
+        duration = (datetime.now() - start_dttm).total_seconds() * 1000
+        Stats.timing("dagrun.dependency-check.{}.{}".
+                     format(self.dag_id, self.execution_date), duration)
+
+        return no_dependencies_met
+
     @provide_session
     def verify_integrity(self, session=None):
         """
@@ -56,6 +56,12 @@ class DepContext(object):
     :type ignore_task_deps: boolean
     :param ignore_ti_state: Ignore the task instance's previous failure/success
     :type ignore_ti_state: boolean
+    :param task_states: The states of all the task instances of the DagRun, by task ID.
+        When set, dependencies on upstream task instances are counted from it instead of
+        querying the database for every evaluated task instance, so all the task instances
+        of one DagRun can be evaluated against a single snapshot. Must only be used for
+        the task instances of that DagRun.
+    :type task_states: dict(unicode, unicode)
     """
     def __init__(
             self,
@@ -65,7 +71,8 @@ class DepContext(object):
             ignore_depends_on_past=False,
             ignore_in_retry_period=False,
             ignore_task_deps=False,
-            ignore_ti_state=False):
+            ignore_ti_state=False,
+            task_states=None):
         self.deps = deps or set()
         self.flag_upstream_failed = flag_upstream_failed
         self.ignore_all_deps = ignore_all_deps
@@ -73,6 +80,7 @@ class DepContext(object):
         self.ignore_in_retry_period = ignore_in_retry_period
         self.ignore_task_deps = ignore_task_deps
         self.ignore_ti_state = ignore_ti_state
+        self.task_states = task_states
 
 # In order to be able to get queued a task must have one of these states
 QUEUEABLE_STATES = {
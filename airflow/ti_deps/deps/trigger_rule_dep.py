@@ -11,6 +11,8 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+from collections import Counter
+
 from sqlalchemy import case, func
 
 import airflow
@@ -30,7 +32,6 @@ class TriggerRuleDep(BaseTIDep):
 
     @provide_session
     def _get_dep_statuses(self, ti, session, dep_context):
-        TI = airflow.models.TaskInstance
         TR = airflow.models.TriggerRule
 
         # Checking that all upstream dependencies have succeeded
@@ -43,9 +44,63 @@ class TriggerRuleDep(BaseTIDep):
             yield self._passing_status(reason="The task had a dummy trigger rule set.")
             return
 
+        if dep_context.task_states is not None:
+            successes, skipped, failed, upstream_failed, done = \
+                self._count_upstream_states(ti, dep_context.task_states)
+        else:
+            successes, skipped, failed, upstream_failed, done = \
+                self._query_upstream_states(ti, session)
+
+        dep_statuses = list(self._evaluate_trigger_rule(
+            ti=ti,
+            successes=successes,
+            skipped=skipped,
+            failed=failed,
+            upstream_failed=upstream_failed,
+            done=done,
+            flag_upstream_failed=dep_context.flag_upstream_failed,
+            session=session))
+
+        if dep_context.task_states is not None:
+            # the state may have been flagged above, let the downstream tasks
+            # evaluated in the same context see it
+            dep_context.task_states[ti.task_id] = ti.state
+
+        for dep_status in dep_statuses:
+            yield dep_status
+
+    @staticmethod
+    def _count_upstream_states(ti, task_states):
+        """
+        Counts the states of the upstream task instances from the states of
+        all the task instances of the DagRun.
+
+        :return: the numbers of successful, skipped, failed, upstream_failed and
+            completed upstream task instances
+        :rtype: tuple(int)
+        """
+        counts = Counter(task_states.get(task_id)
+                         for task_id in ti.task.upstream_task_ids)
+        successes = counts[State.SUCCESS]
+        skipped = counts[State.SKIPPED]
+        failed = counts[State.FAILED]
+        upstream_failed = counts[State.UPSTREAM_FAILED]
+        return (successes, skipped, failed, upstream_failed,
+                successes + skipped + failed + upstream_failed)
+
+    @staticmethod
+    def _query_upstream_states(ti, session):
+        """
+        Counts the states of the upstream task instances in the database.
+
+        :return: the numbers of successful, skipped, failed, upstream_failed and
+            completed upstream task instances
+        :rtype: tuple(int)
+        """
+        TI = airflow.models.TaskInstance
+
         # TODO(unknown): this query becomes quite expensive with dags that have many
-        # tasks. It should be refactored to let the task report to the dag run and get the
-        # aggregates from there.
+        # tasks. Pass the states of the whole DagRun in DepContext.task_states instead.
         qry = (
             session
             .query(
@@ -68,18 +123,7 @@ class TriggerRuleDep(BaseTIDep):
                     State.UPSTREAM_FAILED, State.SKIPPED]),
             )
         )
-
-        successes, skipped, failed, upstream_failed, done = qry.first()
-        for dep_status in self._evaluate_trigger_rule(
-                ti=ti,
-                successes=successes,
-                skipped=skipped,
-                failed=failed,
-                upstream_failed=upstream_failed,
-                done=done,
-                flag_upstream_failed=dep_context.flag_upstream_failed,
-                session=session):
-            yield dep_status
+        return qry.first()
 
     @provide_session
     def _evaluate_trigger_rule(
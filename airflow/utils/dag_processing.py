@@ -17,9 +17,13 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import errno
+import hashlib
 import logging
 import os
+import pickle
 import re
+import tempfile
 import time
 
 from abc import ABCMeta, abstractmethod
@@ -43,7 +47,8 @@ class SimpleDag(BaseDag):
                  full_filepath,
                  concurrency,
                  is_paused,
-                 pickle_id):
+                 pickle_id,
+                 task_resources=None):
         """
         :param dag_id: ID of the DAG
         :type dag_id: unicode
@@ -60,6 +65,8 @@ class SimpleDag(BaseDag):
         :type is_paused: bool
         :param pickle_id: ID associated with the pickled version of this DAG.
         :type pickle_id: unicode
+        :param task_resources: resources required by the tasks of the DAG
+        :type task_resources: dict[unicode, airflow.utils.operator_resources.Resources]
         """
         self._dag_id = dag_id
         self._task_ids = task_ids
@@ -67,6 +74,7 @@ class SimpleDag(BaseDag):
         self._is_paused = is_paused
         self._concurrency = concurrency
         self._pickle_id = pickle_id
+        self._task_resources = task_resources or {}
 
     @property
     def dag_id(self):
@@ -116,6 +124,14 @@ class SimpleDag(BaseDag):
         """
         return self._pickle_id
 
+    @property
+    def task_resources(self):
+        """
+        :return: A map from task IDs to the resources required by the tasks
+        :rtype: dict[unicode, airflow.utils.operator_resources.Resources]
+        """
+        return self._task_resources
+
 
 class SimpleDagBag(BaseDagBag):
     """
@@ -156,6 +172,121 @@ class SimpleDagBag(BaseDagBag):
         return self.dag_id_to_simple_dag[dag_id]
 
 
+class SimpleDagStore(LoggingMixin):
+    """
+    Keeps the SimpleDags found in each DAG definition file in a folder, so
+    that the DAGs of all the known files can be scheduled, not only the ones
+    of the files that were processed in the current loop. The SimpleDags of a
+    file are versioned by the checksum of their pickle: the store file is
+    rewritten only when they change and they are read again only when the
+    version differs from the one read last time.
+
+    :type _simple_dags: dict[unicode, (unicode, list[SimpleDag])]
+    """
+
+    def __init__(self, folder):
+        """
+        :param folder: the folder to keep the store files in
+        :type folder: unicode
+        """
+        self._folder = folder
+        # Map from file path to the version and the SimpleDags read last time
+        self._simple_dags = {}
+
+    @property
+    def simple_dags(self):
+        """
+        :return: the SimpleDags of all the files read from the store
+        :rtype: list[SimpleDag]
+        """
+        return [simple_dag
+                for _, simple_dags in self._simple_dags.values()
+                for simple_dag in simple_dags]
+
+    def _get_store_file_path(self, file_path):
+        return os.path.join(
+            self._folder,
+            hashlib.sha1(file_path.encode('utf-8')).hexdigest() + '.pickle')
+
+    @staticmethod
+    def _read_version(store_file_path):
+        try:
+            with open(store_file_path, 'rb') as f:
+                return f.readline().strip().decode('ascii')
+        except (IOError, OSError):
+            return None
+
+    def write(self, file_path, simple_dags):
+        """
+        Store the SimpleDags found in the file, unless the same SimpleDags are
+        already stored.
+
+        :param file_path: the path to the DAG definition file
+        :type file_path: unicode
+        :param simple_dags: the SimpleDags found in the file
+        :type simple_dags: list[SimpleDag]
+        :return: the version of the stored SimpleDags
+        :rtype: unicode
+        """
+        data = pickle.dumps((file_path, simple_dags), pickle.HIGHEST_PROTOCOL)
+        version = hashlib.sha1(data).hexdigest()
+        store_file_path = self._get_store_file_path(file_path)
+        if self._read_version(store_file_path) == version:
+            return version
+
+        try:
+            os.makedirs(self._folder)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+        # Readers never see a partially written file
+        fd, tmp_file_path = tempfile.mkstemp(dir=self._folder, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(version.encode('ascii') + b'\n')
+            f.write(data)
+        os.rename(tmp_file_path, store_file_path)
+        return version
+
+    def read(self, file_path, version=None):
+        """
+        Read the SimpleDags of the file from the store, unless the given
+        version was already read.
+
+        :param file_path: the path to the DAG definition file
+        :type file_path: unicode
+        :param version: the version returned by write()
+        :type version: unicode
+        :return: None
+        """
+        if version is not None and version == self._simple_dags.get(file_path, (None,))[0]:
+            return
+        store_file_path = self._get_store_file_path(file_path)
+        try:
+            with open(store_file_path, 'rb') as f:
+                stored_version = f.readline().strip().decode('ascii')
+                _, simple_dags = pickle.load(f)
+        except (IOError, OSError):
+            # The file was never processed
+            return
+        except Exception:
+            self.logger.exception("Failed to read the DAGs of {} from {}"
+                                  .format(file_path, store_file_path))
+            return
+        self._simple_dags[file_path] = (stored_version, simple_dags)
+
+    def set_file_paths(self, file_paths):
+        """
+        Forget the SimpleDags of the files which are not known anymore.
+
+        :param file_paths: list of paths to DAG definition files
+        :type file_paths: list[unicode]
+        :return: None
+        """
+        file_paths = set(file_paths)
+        self._simple_dags = {x: simple_dags for x, simple_dags in self._simple_dags.items()
+                             if x in file_paths}
+
+
 def list_py_file_paths(directory, safe_mode=True):
     """
     Traverse a directory and look for Python files.
@@ -300,12 +431,16 @@ class DagFileProcessorManager(LoggingMixin):
     Given a list of DAG definition files, this kicks off several processors
     in parallel to process them. The parallelism is limited and as the
     processors finish, more are launched. The files are processed over and
-    over again, but no more often than the specified interval.
+    over again, but no more often than the specified interval. Files which
+    are new or were modified since they were processed last time jump the
+    queue, the fastest to process go first. The processors put the
+    SimpleDags they find into the SimpleDagStore.
 
     :type _file_path_queue: list[unicode]
     :type _processors: dict[unicode, AbstractDagFileProcessor]
     :type _last_runtime: dict[unicode, float]
     :type _last_finish_time: dict[unicode, datetime]
+    :type _file_stats: dict[unicode, (float, int, unicode)]
     """
 
     def __init__(self,
@@ -315,7 +450,9 @@ class DagFileProcessorManager(LoggingMixin):
                  process_file_interval,
                  child_process_log_directory,
                  max_runs,
-                 processor_factory):
+                 processor_factory,
+                 simple_dag_store,
+                 unchanged_file_process_interval=0):
         """
         :param dag_directory: Directory where DAG definitions are kept. All
         files in file_paths should be under this directory
@@ -337,6 +474,13 @@ class DagFileProcessorManager(LoggingMixin):
         :param processor_factory: function that creates processors for DAG
         definition files. Arguments are (dag_definition_path, log_file_path)
         :type processor_factory: (unicode, unicode) -> (AbstractDagFileProcessor)
+        :param simple_dag_store: store where the processors put the SimpleDags
+        they find. Their result is the version of the stored SimpleDags
+        :type simple_dag_store: SimpleDagStore
+        :param unchanged_file_process_interval: process a file which wasn't
+        modified since it was processed last time at most once every this
+        many seconds, if it is longer than process_file_interval
+        :type unchanged_file_process_interval: float
 
         """
         self._file_paths = file_paths
@@ -345,8 +489,11 @@ class DagFileProcessorManager(LoggingMixin):
         self._dag_directory = dag_directory
         self._max_runs = max_runs
         self._process_file_interval = process_file_interval
+        self._unchanged_file_process_interval = max(process_file_interval,
+                                                    unchanged_file_process_interval)
         self._child_process_log_directory = child_process_log_directory
         self._processor_factory = processor_factory
+        self._simple_dag_store = simple_dag_store
         # Map from file path to the processor
         self._processors = {}
         # Map from file path to the last runtime
@@ -355,6 +502,9 @@ class DagFileProcessorManager(LoggingMixin):
         self._last_finish_time = {}
         # Map from file path to the number of runs
         self._run_count = defaultdict(int)
+        # Map from file path to the (mtime, size, checksum) of the file
+        # when its last processing started
+        self._file_stats = {}
         # Scheduler heartbeat key.
         self._heart_beat_key = 'heart-beat'
 
@@ -437,6 +587,9 @@ class DagFileProcessorManager(LoggingMixin):
         self._file_paths = new_file_paths
         self._file_path_queue = [x for x in self._file_path_queue
                                  if x in new_file_paths]
+        self._file_stats = {x: stats for x, stats in self._file_stats.items()
+                            if x in new_file_paths}
+        self._simple_dag_store.set_file_paths(new_file_paths)
         # Stop processors that are working on deleted files
         filtered_processors = {}
         for file_path, processor in self._processors.items():
@@ -447,6 +600,67 @@ class DagFileProcessorManager(LoggingMixin):
                 processor.stop()
         self._processors = filtered_processors
 
+    @staticmethod
+    def _get_file_checksum(file_path):
+        with open(file_path, 'rb') as f:
+            return hashlib.sha1(f.read()).hexdigest()
+
+    def _record_file_stats(self, file_path):
+        """
+        Remember the state of the file before it's processed
+
+        :param file_path: the path to the file that's going to be processed
+        :type file_path: unicode
+        :return: None
+        """
+        try:
+            stat = os.stat(file_path)
+            self._file_stats[file_path] = (stat.st_mtime,
+                                           stat.st_size,
+                                           self._get_file_checksum(file_path))
+        except (IOError, OSError):
+            self._file_stats.pop(file_path, None)
+
+    def _is_file_changed(self, file_path):
+        """
+        The content of the file is compared only if its mtime or size differ.
+
+        :param file_path: the path to the DAG definition file
+        :type file_path: unicode
+        :return: whether the file is new or its content was modified since
+        its last processing started
+        :rtype: bool
+        """
+        last_stats = self._file_stats.get(file_path)
+        if last_stats is None:
+            return True
+        try:
+            stat = os.stat(file_path)
+            if (stat.st_mtime, stat.st_size) == last_stats[:2]:
+                return False
+            checksum = self._get_file_checksum(file_path)
+        except (IOError, OSError):
+            # The file was deleted, it's dropped with the next listing of
+            # the DAG directory
+            return False
+        if checksum == last_stats[2]:
+            # Only touched, no need to compare the content again
+            self._file_stats[file_path] = (stat.st_mtime, stat.st_size, checksum)
+            return False
+        return True
+
+    def _sort_by_last_runtime(self, file_paths):
+        """
+        :param file_paths: the paths to the DAG definition files
+        :type file_paths: list[unicode]
+        :return: the file paths, the files that were processed faster last
+        time (or were never processed) go first
+        :rtype: list[unicode]
+        """
+        return sorted(file_paths,
+                      key=lambda file_path: (self._last_runtime.get(file_path, 0),
+                                             file_path))
+
     @staticmethod
     def _split_path(file_path):
         """
@@ -546,8 +760,9 @@ class DagFileProcessorManager(LoggingMixin):
         kick of new processes to process DAG definition files and read the
         results from the finished processors.
 
-        :return: a list of SimpleDags that were produced by processors that
-        have finished since the last time this was called
+        :return: a list of SimpleDags of all the files that were processed,
+        updated with the ones produced by processors that have finished since
+        the last time this was called
         :rtype: list[SimpleDag]
         """
         finished_processors = {}
@@ -568,8 +783,7 @@ class DagFileProcessorManager(LoggingMixin):
                 running_processors[file_path] = processor
         self._processors = running_processors
 
-        # Collect all the DAGs that were found in the processed files
-        simple_dags = []
+        # Read the DAGs that were found in the processed files, if they changed
         for file_path, processor in finished_processors.items():
             if processor.result is None:
                 self.logger.warning("Processor for {} exited with return code "
@@ -578,32 +792,45 @@ class DagFileProcessorManager(LoggingMixin):
                                             processor.exit_code,
                                             processor.log_file))
             else:
-                for simple_dag in processor.result:
-                    simple_dags.append(simple_dag)
+                self._simple_dag_store.read(file_path, processor.result)
+
+        file_paths_in_progress = self._processors.keys()
+        files_paths_at_run_limit = [file_path
+                                    for file_path, num_runs in self._run_count.items()
+                                    if num_runs == self._max_runs]
+
+        # New and modified files jump the queue, so that new DAGs appear
+        # without waiting for all the other files to be processed
+        changed_file_paths = [file_path for file_path in
+                              (set(self._file_paths) -
+                               set(file_paths_in_progress) -
+                               set(files_paths_at_run_limit))
+                              if self._is_file_changed(file_path)]
+        if changed_file_paths:
+            self._file_path_queue = (
+                self._sort_by_last_runtime(changed_file_paths) +
+                [x for x in self._file_path_queue if x not in changed_file_paths])
 
         # Generate more file paths to process if we processed all the files
         # already.
         if len(self._file_path_queue) == 0:
             # If the file path is already being processed, or if a file was
-            # processed recently, wait until the next batch
-            file_paths_in_progress = self._processors.keys()
+            # processed recently, wait until the next batch. Modified files
+            # were queued above, so the files here are all unchanged.
             now = datetime.now()
             file_paths_recently_processed = []
             for file_path in self._file_paths:
                 last_finish_time = self.get_last_finish_time(file_path)
                 if (last_finish_time is not None and
                     (now - last_finish_time).total_seconds() <
-                        self._process_file_interval):
+                        self._unchanged_file_process_interval):
                     file_paths_recently_processed.append(file_path)
 
-            files_paths_at_run_limit = [file_path
-                                        for file_path, num_runs in self._run_count.items()
-                                        if num_runs == self._max_runs]
-
-            files_paths_to_queue = list(set(self._file_paths) -
-                                        set(file_paths_in_progress) -
-                                        set(file_paths_recently_processed) -
-                                        set(files_paths_at_run_limit))
+            files_paths_to_queue = self._sort_by_last_runtime(
+                set(self._file_paths) -
+                set(file_paths_in_progress) -
+                set(file_paths_recently_processed) -
+                set(files_paths_at_run_limit))
 
             for file_path, processor in self._processors.items():
                 self.logger.debug("File path {} is still being processed (started: {})"
@@ -619,6 +846,7 @@ class DagFileProcessorManager(LoggingMixin):
         while (self._parallelism - len(self._processors) > 0 and
                len(self._file_path_queue) > 0):
             file_path = self._file_path_queue.pop(0)
+            self._record_file_stats(file_path)
             log_file_path = self._get_log_file_path(file_path)
             processor = self._processor_factory(file_path, log_file_path)
 
@@ -634,7 +862,7 @@ class DagFileProcessorManager(LoggingMixin):
         # Update scheduler heartbeat count.
         self._run_count[self._heart_beat_key] += 1
 
-        return simple_dags
+        return self._simple_dag_store.simple_dags
 
     def max_runs_reached(self):
         """
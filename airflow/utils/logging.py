@@ -20,6 +20,7 @@ from __future__ import unicode_literals
 from builtins import object
 
 import logging
+import os
 
 from airflow import configuration
 from airflow.exceptions import AirflowException
@@ -39,23 +40,56 @@ class LoggingMixin(object):
             return self._logger
 
 
-class S3Log(object):
+class RemoteLog(object):
     """
-    Utility class for reading and writing logs in S3.
-    Requires airflow[s3] and setting the REMOTE_BASE_LOG_FOLDER and
-    REMOTE_LOG_CONN_ID configuration options in airflow.cfg.
+    Base class of the remote task logs. A log is kept as the object at its
+    remote location, which older versions of Airflow rewrote on each
+    upload, followed by append-only parts named
+    ``<remote_log_location>.part-<n>``, one per upload. Reading a log
+    stitches its parts back together.
+
+    Subclasses implement listing, reading, uploading and deleting the parts
+    in their storage.
     """
-    def __init__(self):
-        remote_conn_id = configuration.get('core', 'REMOTE_LOG_CONN_ID')
-        try:
-            from airflow.hooks.S3_hook import S3Hook
-            self.hook = S3Hook(remote_conn_id)
-        except:
-            self.hook = None
-            logging.error(
-                'Could not create an S3Hook with connection id "{}". '
-                'Please make sure that airflow[s3] is installed and '
-                'the S3 connection exists.'.format(remote_conn_id))
+    PART_SEPARATOR = '.part-'
+
+    def _list_parts(self, remote_log_location):
+        """
+        Returns a list of (part, size) tuples for the objects of the log in
+        order, a part being whatever _read_part and _delete_part accept
+        """
+        raise NotImplementedError()
+
+    def _read_part(self, part, start, end):
+        """
+        Returns the bytes from start (included) to end (excluded) of a part
+        """
+        raise NotImplementedError()
+
+    def _upload_part(self, filename, offset, remote_part_location):
+        """
+        Uploads the local file from offset to its end, streaming it from the
+        file
+        """
+        raise NotImplementedError()
+
+    def _delete_part(self, part):
+        raise NotImplementedError()
+
+    def _part_name(self, part):
+        """
+        Returns the name of the object of a part
+        """
+        raise NotImplementedError()
+
+    @classmethod
+    def _part_number(cls, name):
+        """
+        Returns the number of a part from its name, None for names which
+        aren't the ones of parts
+        """
+        _, separator, suffix = name.rpartition(cls.PART_SEPARATOR)
+        return int(suffix) if separator and suffix.isdigit() else None
 
     def read(self, remote_log_location, return_error=False):
         """
@@ -70,9 +104,10 @@ class S3Log(object):
         """
         if self.hook:
             try:
-                s3_key = self.hook.get_key(remote_log_location)
-                if s3_key:
-                    return s3_key.get_contents_as_string().decode()
+                return b''.join(
+                    self._read_part(part, 0, size)
+                    for part, size in self._list_parts(remote_log_location)
+                    if size).decode()
             except:
                 pass
 
@@ -81,6 +116,47 @@ class S3Log(object):
         logging.error(err)
         return err if return_error else ''
 
+    def size(self, remote_log_location):
+        """
+        Returns the size in bytes of the log at the remote_log_location, 0 if
+        there is no log there.
+
+        :param remote_log_location: the log's location in remote storage
+        :type remote_log_location: string (path)
+        """
+        if not self.hook:
+            raise AirflowException(
+                'Could not read logs from {}'.format(remote_log_location))
+        return sum(size for _, size in self._list_parts(remote_log_location))
+
+    def read_range(self, remote_log_location, start, end):
+        """
+        Returns the bytes from start (included) to end (excluded) of the log
+        at the remote_log_location, reading only the parts of the log which
+        overlap the range.
+
+        :param remote_log_location: the log's location in remote storage
+        :type remote_log_location: string (path)
+        :param start: offset of the first byte to read
+        :type start: int
+        :param end: offset after the last byte to read
+        :type end: int
+        """
+        if not self.hook:
+            raise AirflowException(
+                'Could not read logs from {}'.format(remote_log_location))
+        chunks = []
+        part_start = 0
+        for part, size in self._list_parts(remote_log_location):
+            part_end = part_start + size
+            if part_start < end and part_end > start:
+                chunks.append(self._read_part(
+                    part,
+                    max(start, part_start) - part_start,
+                    min(end, part_end) - part_start))
+            part_start = part_end
+        return b''.join(chunks)
+
     def write(self, log, remote_log_location, append=True):
         """
         Writes the log to the remote_log_location. Fails silently if no hook
@@ -95,17 +171,55 @@ class S3Log(object):
         :type append: bool
 
         """
-        if self.hook:
+        from tempfile import NamedTemporaryFile
+        with NamedTemporaryFile(mode='w+') as tmpfile:
+            tmpfile.write(log)
+            # Force the file to be flushed, since we're doing the upload from
+            # within the file context (it hasn't been closed).
+            tmpfile.flush()
+            self.write_file(tmpfile.name, remote_log_location, append=append)
 
-            if append:
-                old_log = self.read(remote_log_location)
-                log = old_log + '\n' + log
+    def write_file(self, filename, remote_log_location, offset=0, append=True):
+        """
+        Writes the local log file, from offset to its end, to the
+        remote_log_location. The file is uploaded as a new part of the log,
+        so that the existing log is neither downloaded nor uploaded again.
+        Nothing is uploaded when the file has no bytes after offset.
+        Fails silently if no hook was created.
+
+        :param filename: the local log file
+        :type filename: string (path)
+        :param remote_log_location: the log's location in remote storage
+        :type remote_log_location: string (path)
+        :param offset: the offset in the file of the first byte to write,
+            the bytes before it are expected to be in the remote log already
+        :type offset: int
+        :param append: if False, any existing log file is overwritten. If True,
+            the new log is appended to any existing logs.
+        :type append: bool
+        """
+        if self.hook:
             try:
-                self.hook.load_string(
-                    log,
-                    key=remote_log_location,
-                    replace=True,
-                    encrypt=configuration.getboolean('core', 'ENCRYPT_S3_LOGS'))
+                has_new_bytes = os.path.getsize(filename) > offset
+                if append and not has_new_bytes:
+                    return
+                parts = self._list_parts(remote_log_location)
+                if not append:
+                    for part, _ in parts:
+                        self._delete_part(part)
+                    parts = []
+                if has_new_bytes:
+                    # the object at the remote_log_location itself, left by
+                    # older versions, isn't numbered
+                    numbers = [
+                        self._part_number(self._part_name(part))
+                        for part, _ in parts]
+                    self._upload_part(
+                        filename, offset,
+                        '{}{}{:05d}'.format(
+                            remote_log_location, self.PART_SEPARATOR,
+                            max([n for n in numbers if n is not None] or [0])
+                            + 1))
                 return
             except:
                 pass
@@ -114,7 +228,58 @@ class S3Log(object):
         logging.error('Could not write logs to {}'.format(remote_log_location))
 
 
-class GCSLog(object):
+class S3Log(RemoteLog):
+    """
+    Utility class for reading and writing logs in S3.
+    Requires airflow[s3] and setting the REMOTE_BASE_LOG_FOLDER and
+    REMOTE_LOG_CONN_ID configuration options in airflow.cfg.
+    """
+    def __init__(self):
+        remote_conn_id = configuration.get('core', 'REMOTE_LOG_CONN_ID')
+        try:
+            from airflow.hooks.S3_hook import S3Hook
+            self.hook = S3Hook(remote_conn_id)
+        except:
+            self.hook = None
+            logging.error(
+                'Could not create an S3Hook with connection id "{}". '
+                'Please make sure that airflow[s3] is installed and '
+                'the S3 connection exists.'.format(remote_conn_id))
+
+    def _list_parts(self, remote_log_location):
+        bucket_name, key = self.hook.parse_s3_url(remote_log_location)
+        bucket = self.hook.get_bucket(bucket_name)
+        parts = sorted(
+            (k for k in bucket.list(prefix=key + self.PART_SEPARATOR)
+             if self._part_number(k.name) is not None),
+            key=lambda k: self._part_number(k.name))
+        s3_key = bucket.get_key(key)
+        if s3_key:
+            parts.insert(0, s3_key)
+        return [(k, k.size) for k in parts]
+
+    def _read_part(self, part, start, end):
+        return part.get_contents_as_string(
+            headers={'Range': 'bytes={}-{}'.format(start, end - 1)})
+
+    def _upload_part(self, filename, offset, remote_part_location):
+        bucket_name, key = self.hook.parse_s3_url(remote_part_location)
+        s3_key = self.hook.get_bucket(bucket_name).new_key(key_name=key)
+        with open(filename, 'rb') as f:
+            f.seek(offset)
+            s3_key.set_contents_from_file(
+                f,
+                replace=True,
+                encrypt_key=configuration.getboolean('core', 'ENCRYPT_S3_LOGS'))
+
+    def _delete_part(self, part):
+        part.delete()
+
+    def _part_name(self, part):
+        return part.name
+
+
+class GCSLog(RemoteLog):
     """
     Utility class for reading and writing logs in GCS. Requires
     airflow[gcp_api] and setting the REMOTE_BASE_LOG_FOLDER and
@@ -137,60 +302,54 @@ class GCSLog(object):
                 '"{}". Please make sure that airflow[gcp_api] is installed '
                 'and the GCS connection exists.'.format(remote_conn_id))
 
-    def read(self, remote_log_location, return_error=False):
-        """
-        Returns the log found at the remote_log_location.
+    def _list_parts(self, remote_log_location):
+        bkt, blob = self.parse_gcs_url(remote_log_location)
+        objects = self.hook.get_conn().objects()
+        items = []
+        page_token = None
+        while True:
+            response = objects.list(
+                bucket=bkt, prefix=blob + self.PART_SEPARATOR,
+                pageToken=page_token).execute()
+            items.extend(
+                item for item in response.get('items', [])
+                if self._part_number(item['name']) is not None)
+            page_token = response.get('nextPageToken')
+            if not page_token:
+                break
+        items.sort(key=lambda item: self._part_number(item['name']))
+        if self.hook.exists(bkt, blob):
+            items.insert(0, objects.get(bucket=bkt, object=blob).execute())
+        return [((bkt, item['name']), int(item['size'])) for item in items]
 
-        :param remote_log_location: the log's location in remote storage
-        :type remote_log_location: string (path)
-        :param return_error: if True, returns a string error message if an
-            error occurs. Otherwise returns '' when an error occurs.
-        :type return_error: bool
-        """
-        if self.hook:
-            try:
-                bkt, blob = self.parse_gcs_url(remote_log_location)
-                return self.hook.download(bkt, blob).decode()
-            except:
-                pass
+    def _read_part(self, part, start, end):
+        bkt, blob = part
+        media_request = self.hook.get_conn().objects().get_media(
+            bucket=bkt, object=blob)
+        media_request.headers['Range'] = 'bytes={}-{}'.format(start, end - 1)
+        return media_request.execute()
 
-        # raise/return error if we get here
-        err = 'Could not read logs from {}'.format(remote_log_location)
-        logging.error(err)
-        return err if return_error else ''
+    def _upload_part(self, filename, offset, remote_part_location):
+        bkt, blob = self.parse_gcs_url(remote_part_location)
+        if not offset:
+            self.hook.upload(bkt, blob, filename)
+            return
+        # the upload reads the whole file, so the new bytes are copied to a
+        # temporary file first, a block at a time
+        import shutil
+        from tempfile import NamedTemporaryFile
+        with open(filename, 'rb') as f, NamedTemporaryFile() as tmpfile:
+            f.seek(offset)
+            shutil.copyfileobj(f, tmpfile)
+            tmpfile.flush()
+            self.hook.upload(bkt, blob, tmpfile.name)
 
-    def write(self, log, remote_log_location, append=True):
-        """
-        Writes the log to the remote_log_location. Fails silently if no hook
-        was created.
-
-        :param log: the log to write to the remote_log_location
-        :type log: string
-        :param remote_log_location: the log's location in remote storage
-        :type remote_log_location: string (path)
-        :param append: if False, any existing log file is overwritten. If True,
-            the new log is appended to any existing logs.
-        :type append: bool
+    def _delete_part(self, part):
+        bkt, blob = part
+        self.hook.get_conn().objects().delete(bucket=bkt, object=blob).execute()
 
-        """
-        if self.hook:
-            if append:
-                old_log = self.read(remote_log_location)
-                log = old_log + '\n' + log
-
-            try:
-                bkt, blob = self.parse_gcs_url(remote_log_location)
-                from tempfile import NamedTemporaryFile
-                with NamedTemporaryFile(mode='w+') as tmpfile:
-                    tmpfile.write(log)
-                    # Force the file to be flushed, since we're doing the
-                    # upload from within the file context (it hasn't been
-                    # closed).
-                    tmpfile.flush()
-                    self.hook.upload(bkt, blob, tmpfile.name)
-            except:
-                # raise/return error if we get here
-                logging.error('Could not write logs to {}'.format(remote_log_location))
+    def _part_name(self, part):
+        return part[1]
 
     def parse_gcs_url(self, gsurl):
         """
@@ -211,3 +370,137 @@ class GCSLog(object):
             bucket = parsed_url.netloc
             blob = parsed_url.path.strip('/')
             return (bucket, blob)
+
+
+class LogReader(object):
+    """
+    Reads a task log by byte ranges, so that a big log can be shown and
+    followed a chunk at a time instead of being loaded whole. Subclasses
+    implement ``size`` and ``read`` for a log location.
+    """
+    def size(self):
+        """
+        Returns the current size of the log in bytes
+        """
+        raise NotImplementedError()
+
+    def read(self, start, end):
+        """
+        Returns the bytes of the log from start (included) to end (excluded)
+        """
+        raise NotImplementedError()
+
+    def read_chunk(self, start=None, end=None, chunk_size=65536):
+        """
+        Reads at most chunk_size bytes of the log: the chunk after start if
+        start is given, the chunk before end if only end is given, and the
+        tail of the log otherwise. Returns a dict with the decoded content,
+        its start and end offsets and the size of the log.
+
+        The offsets are moved back to the first byte of the UTF-8 character
+        they fall in, so that a character is never split between two
+        adjacent chunks.
+        """
+        size = self.size()
+        if start is None:
+            end = size if end is None else min(max(end, 0), size)
+            start = max(end - chunk_size, 0)
+        else:
+            start = min(max(start, 0), size)
+            end = min(start + chunk_size, size)
+        if end <= start:
+            return {'start': start, 'end': start, 'size': size, 'content': ''}
+
+        # a UTF-8 character is at most 4 bytes long, so the first byte of the
+        # characters at start and end is among the 3 bytes before them
+        data_start = max(start - 3, 0)
+        data = bytearray(self.read(data_start, min(end + 1, size)))
+
+        def snap(offset):
+            if offset >= size:
+                return offset
+            lead = offset
+            while (lead > max(offset - 3, 0) and
+                   data[lead - data_start] & 0xC0 == 0x80):
+                lead -= 1
+            # not a continuation of a valid character, keep the offset
+            return lead if data[lead - data_start] & 0xC0 == 0xC0 else offset
+
+        start, end = snap(start), snap(end)
+        content = bytes(data[start - data_start:end - data_start])
+        return {
+            'start': start,
+            'end': end,
+            'size': size,
+            'content': content.decode('utf-8', 'replace'),
+        }
+
+    def iter_chunks(self, chunk_size=65536):
+        """
+        Yields the log from its beginning, chunk_size bytes at a time
+        """
+        start = 0
+        size = self.size()
+        while start < size:
+            end = min(start + chunk_size, size)
+            yield self.read(start, end)
+            start = end
+
+
+class LocalLogReader(LogReader):
+    """
+    Reads a log file on the local filesystem
+    """
+    def __init__(self, path):
+        self.path = path
+
+    def size(self):
+        return os.path.getsize(self.path)
+
+    def read(self, start, end):
+        with open(self.path, 'rb') as f:
+            f.seek(start)
+            return f.read(end - start)
+
+
+class HttpLogReader(LogReader):
+    """
+    Reads a log served over HTTP by the log server of a worker, with Range
+    requests. Servers that ignore the Range header are supported, but then
+    the whole log is downloaded for each chunk.
+    """
+    def __init__(self, url, timeout=None):
+        self.url = url
+        self.timeout = timeout
+
+    def size(self):
+        import requests
+        response = requests.head(self.url, timeout=self.timeout)
+        response.raise_for_status()
+        return int(response.headers['Content-Length'])
+
+    def read(self, start, end):
+        import requests
+        response = requests.get(
+            self.url,
+            headers={'Range': 'bytes={}-{}'.format(start, end - 1)},
+            timeout=self.timeout)
+        response.raise_for_status()
+        if response.status_code != 206:
+            return response.content[start:end]
+        return response.content
+
+
+class RemoteLogReader(LogReader):
+    """
+    Reads a log in remote storage through an S3Log or a GCSLog
+    """
+    def __init__(self, remote_log, remote_log_location):
+        self.remote_log = remote_log
+        self.remote_log_location = remote_log_location
+
+    def size(self):
+        return self.remote_log.size(self.remote_log_location)
+
+    def read(self, start, end):
+        return self.remote_log.read_range(self.remote_log_location, start, end)
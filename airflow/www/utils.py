@@ -18,11 +18,14 @@ from builtins import str
 from builtins import object
 
 from cgi import escape
+from collections import OrderedDict
 from io import BytesIO as IO
 import functools
 import gzip
+import hashlib
 import dateutil.parser as dateparser
 import json
+import threading
 import time
 
 from flask import after_this_request, request, Response
@@ -31,7 +34,7 @@ import wtforms
 from wtforms.compat import text_type
 
 from airflow import configuration, models, settings
-from airflow.utils.json import AirflowJsonEncoder
+from airflow.utils.json import AirflowJsonEncoder, json_ser
 
 AUTHENTICATE = configuration.getboolean('webserver', 'AUTHENTICATE')
 
@@ -184,6 +187,89 @@ def json_response(obj):
         mimetype="application/json")
 
 
+def etag_json_response(obj):
+    """
+    returns a json response with an ETag of its content, the response is
+    304 Not Modified if the client already has the same content
+    """
+    response = json_response(obj)
+    response.set_etag(hashlib.md5(response.get_data()).hexdigest())
+    return response.make_conditional(request)
+
+
+class JsonCache(object):
+    """
+    Keeps the most recently used json bodies, with their gzipped copy, so
+    that a view which builds a big payload serves it again as is while the
+    data it is built from doesn't change. Each entry has a version, e.g. a
+    fingerprint of the rows it was built from, and is rebuilt when the
+    version changes.
+
+    :param max_entries: the number of bodies to keep
+    :type max_entries: int
+    """
+    def __init__(self, max_entries=50):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, version):
+        """
+        Returns the (body, gzipped body, etag) entry of key if it has the
+        version, None otherwise
+        """
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None or entry[0] != version:
+                return None
+            # move to the end as the most recently used
+            self._entries[key] = entry
+            return entry[1]
+
+    def set(self, key, version, obj):
+        """
+        Serializes and compresses obj and keeps it as the entry of key
+        """
+        body = json.dumps(
+            obj, separators=(',', ':'), default=json_ser).encode('utf-8')
+        gzip_buffer = IO()
+        gzip_file = gzip.GzipFile(mode='wb', fileobj=gzip_buffer)
+        gzip_file.write(body)
+        gzip_file.close()
+        entry = (body, gzip_buffer.getvalue(), hashlib.md5(body).hexdigest())
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (version, entry)
+            while len(self._entries) > max(self.max_entries, 1):
+                self._entries.popitem(last=False)
+        return entry
+
+
+def cached_json_response(cache, key, version, build):
+    """
+    returns a json response of the body cached for key and version, calling
+    build to get the object to serialize when there is none. The body is
+    sent gzipped when the client accepts it, and with an ETag.
+    """
+    entry = cache.get(key, version)
+    if entry is None:
+        entry = cache.set(key, version, build())
+    body, gzipped_body, etag = entry
+
+    if 'gzip' in request.headers.get('Accept-Encoding', '').lower():
+        response = Response(
+            response=gzipped_body, status=200, mimetype="application/json")
+        response.headers['Content-Encoding'] = 'gzip'
+        # the gzipped body is a different representation
+        etag += '-gzip'
+    else:
+        response = Response(
+            response=body, status=200, mimetype="application/json")
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.set_etag(etag)
+    return response.make_conditional(request)
+
+
 def gzipped(f):
     '''
     Decorator to make a view compressed
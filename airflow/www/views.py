@@ -13,7 +13,7 @@
 # limitations under the License.
 #
 
-from past.builtins import basestring, unicode
+from past.builtins import basestring
 
 import ast
 import os
@@ -24,25 +24,26 @@ from datetime import datetime, timedelta
 import dateutil.parser
 import copy
 import json
+import math
 import bleach
-from collections import defaultdict
+from collections import OrderedDict, defaultdict
 
 import inspect
 from textwrap import dedent
 import traceback
 
 import sqlalchemy as sqla
-from sqlalchemy import or_, desc, and_, union_all
+from sqlalchemy import or_, desc, and_
 
 from flask import (
-    redirect, url_for, request, Markup, Response, current_app, render_template, make_response)
+    redirect, url_for, request, Markup, Response, current_app, render_template, make_response,
+    stream_with_context)
 from flask_admin import BaseView, expose, AdminIndexView
 from flask_admin.contrib.sqla import ModelView
 from flask_admin.actions import action
 from flask_admin.babel import lazy_gettext
 from flask_admin.tools import iterdecode
 from flask_login import flash
-from flask._compat import PY2
 
 from jinja2.sandbox import ImmutableSandboxedEnvironment
 import markdown
@@ -67,7 +68,6 @@ from airflow.models import BaseOperator
 from airflow.operators.subdag_operator import SubDagOperator
 
 from airflow.utils.logging import LoggingMixin
-from airflow.utils.json import json_ser
 from airflow.utils.state import State
 from airflow.utils.db import provide_session
 from airflow.utils.helpers import alchemy_to_dict
@@ -80,7 +80,16 @@ from airflow.configuration import AirflowConfigException
 QUERY_LIMIT = 100000
 CHART_LIMIT = 200000
 
-dagbag = models.DagBag(settings.DAGS_FOLDER)
+LAZY_DAGBAG = conf.getboolean('webserver', 'LAZY_DAGBAG')
+DAGS_PER_PAGE = conf.getint('webserver', 'DAGS_PER_PAGE')
+LOG_CHUNK_SIZE = conf.getint('webserver', 'LOG_CHUNK_SIZE')
+
+if LAZY_DAGBAG:
+    dagbag = models.LazyDagBag(
+        settings.DAGS_FOLDER,
+        max_loaded_dags=conf.getint('webserver', 'LAZY_DAGBAG_SIZE'))
+else:
+    dagbag = models.DagBag(settings.DAGS_FOLDER)
 
 login_required = airflow.login.login_required
 current_user = airflow.login.current_user
@@ -285,6 +294,240 @@ def should_hide_value_for_key(key_name):
 
 
 
+def get_known_dags(session):
+    """
+    DAGs the web server knows about: the imported ones or, with the lazy
+    DagBag, the active DAGs from the metadata DB
+    """
+    if LAZY_DAGBAG:
+        DM = models.DagModel
+        return session.query(DM).filter(DM.is_active).all()
+    return dagbag.dags.values()
+
+
+def get_log_task_instance(session, dag_id, task_id, execution_date):
+    TI = models.TaskInstance
+    return session.query(TI).filter(
+        TI.dag_id == dag_id, TI.task_id == task_id,
+        TI.execution_date == execution_date).first()
+
+
+def get_log_reader(ti, source=None):
+    """
+    Returns a LogReader for the log of the task instance and a header
+    telling where the log is read from. The reader is None if the log can't
+    be read.
+
+    Logs are read from remote storage once the task has run, and from the
+    local file or the worker log server while it is running, since they are
+    uploaded when the run completes. ``source`` can be 'remote' or 'local'
+    to read from a given place anyway.
+    """
+    log_relative = "{}/{}/{}".format(
+        ti.dag_id, ti.task_id, ti.execution_date.isoformat())
+    remote_log_base = conf.get('core', 'REMOTE_BASE_LOG_FOLDER')
+    if not source:
+        # Only the tasks which completed or ran at least once before have a
+        # remote log
+        has_remote_log = (
+            ti.state in {State.SUCCESS, State.FAILED} or
+            (ti.state != State.RUNNING and ti.try_number > 1))
+        source = 'remote' if remote_log_base and has_remote_log else 'local'
+
+    if source == 'remote' and remote_log_base:
+        remote_log_path = os.path.join(remote_log_base, log_relative)
+        header = '*** Reading remote log from {}.\n'.format(remote_log_path)
+        if remote_log_path.startswith('s3:/'):
+            return log_utils.RemoteLogReader(
+                log_utils.S3Log(), remote_log_path), header
+        elif remote_log_path.startswith('gs:/'):
+            return log_utils.RemoteLogReader(
+                log_utils.GCSLog(), remote_log_path), header
+        return None, '*** Unsupported remote log location.\n'
+
+    loc = os.path.join(
+        os.path.expanduser(conf.get('core', 'BASE_LOG_FOLDER')), log_relative)
+    if os.path.exists(loc):
+        return log_utils.LocalLogReader(loc), "*** Reading local log.\n"
+
+    url = os.path.join(
+        "http://{}:{}/log".format(
+            ti.hostname, conf.get('celery', 'WORKER_LOG_SERVER_PORT')),
+        log_relative)
+    timeout = None  # No timeout
+    try:
+        timeout = conf.getint('webserver', 'log_fetch_timeout_sec')
+    except (AirflowConfigException, ValueError):
+        pass
+    header = "*** Log file isn't local.\n*** Fetching here: {}\n".format(url)
+    return log_utils.HttpLogReader(url, timeout=timeout), header
+
+
+TREE_CACHE_SIZE = conf.getint('webserver', 'TREE_CACHE_SIZE')
+
+tree_cache = wwwutils.JsonCache(max_entries=TREE_CACHE_SIZE)
+
+# json of the graph view nodes and edges by (dag_id, root), with the load
+# time of the DAG they were built from
+graph_structures = OrderedDict()
+
+
+def get_tree_version(session, dag, min_date, max_date):
+    """
+    Returns a fingerprint of the task instances and dag runs of the DAG
+    between the dates, which changes when any of their states changes. It
+    is computed by the db from the rows, without loading them.
+    """
+    TI = models.TaskInstance
+    DR = models.DagRun
+    ti_version = (
+        session.query(
+            TI.state, sqla.func.count(TI.task_id),
+            sqla.func.sum(TI.try_number),
+            sqla.func.max(TI.start_date), sqla.func.max(TI.end_date))
+        .filter(
+            TI.dag_id == dag.dag_id,
+            TI.execution_date >= min_date,
+            TI.execution_date <= max_date)
+        .group_by(TI.state)
+        .all()
+    )
+    dr_version = (
+        session.query(
+            DR.state, sqla.func.count(DR.id),
+            sqla.func.max(DR.start_date), sqla.func.max(DR.end_date))
+        .filter(
+            DR.dag_id == dag.dag_id,
+            DR.execution_date >= min_date,
+            DR.execution_date <= max_date)
+        .group_by(DR.state)
+        .all()
+    )
+    return (
+        dag.last_loaded,
+        # keyed by state, as None states can't be ordered with the others
+        {row[0]: tuple(row[1:]) for row in ti_version},
+        {row[0]: tuple(row[1:]) for row in dr_version},
+    )
+
+
+def get_tree_data(session, dag, min_date, max_date):
+    """
+    Builds the tree view payload of the DAG between the dates. Instead of a
+    nested node per task and path holding a dict per task instance, the
+    tasks are listed once with the indexes of their upstream tasks, and the
+    task instance attributes are matrices indexed by task and date, which
+    the page turns back into a tree.
+    """
+    DR = models.DagRun
+    dag_runs = {
+        dr.execution_date: dr
+        for dr in session.query(DR).filter(
+            DR.dag_id == dag.dag_id,
+            DR.execution_date <= max_date,
+            DR.execution_date >= min_date)
+    }
+    dates = sorted(dag_runs.keys())
+    date_index = {d: i for i, d in enumerate(dates)}
+    tasks = dag.tasks
+    task_index = {task.task_id: i for i, task in enumerate(tasks)}
+
+    def matrix():
+        return [[None] * len(dates) for _ in tasks]
+
+    instances = {
+        'state': matrix(),
+        'start_date': matrix(),
+        'end_date': matrix(),
+        'duration': matrix(),
+    }
+    for ti in dag.get_task_instances(
+            session, start_date=min_date, end_date=max_date):
+        i = task_index.get(ti.task_id)
+        j = date_index.get(ti.execution_date)
+        if i is None or j is None:
+            continue
+        instances['state'][i][j] = ti.state
+        instances['start_date'][i][j] = ti.start_date
+        instances['end_date'][i][j] = ti.end_date
+        instances['duration'][i][j] = ti.duration
+
+    return {
+        'dates': dates,
+        'dag_runs': [{
+            'id': dag_runs[d].id,
+            'run_id': dag_runs[d].run_id,
+            'state': dag_runs[d].state,
+            'external_trigger': dag_runs[d].external_trigger,
+            'start_date': dag_runs[d].start_date,
+            'end_date': dag_runs[d].end_date,
+        } for d in dates],
+        'tasks': [{
+            'task_id': task.task_id,
+            'upstream': [task_index[t.task_id] for t in task.upstream_list],
+            'operator': task.task_type,
+            'retries': task.retries,
+            'owner': task.owner,
+            'start_date': task.start_date,
+            'end_date': task.end_date,
+            'depends_on_past': task.depends_on_past,
+            'ui_color': task.ui_color,
+        } for task in tasks],
+        'roots': [task_index[t.task_id] for t in dag.roots],
+        'instances': instances,
+    }
+
+
+def get_graph_structure(dag):
+    """
+    Returns the nodes and edges the graph view draws for the DAG
+    """
+    nodes = []
+    for task in dag.tasks:
+        nodes.append({
+            'id': task.task_id,
+            'value': {
+                'label': task.task_id,
+                'labelStyle': "fill:{0};".format(task.ui_fgcolor),
+                'style': "fill:{0};".format(task.ui_color),
+            }
+        })
+
+    edges = []
+    seen = set()
+
+    def get_upstream(task):
+        for t in task.upstream_list:
+            if (t.task_id, task.task_id) not in seen:
+                seen.add((t.task_id, task.task_id))
+                edges.append({
+                    'u': t.task_id,
+                    'v': task.task_id,
+                })
+                get_upstream(t)
+
+    for t in dag.roots:
+        get_upstream(t)
+    return {'nodes': nodes, 'edges': edges}
+
+
+def get_graph_structure_json(dag, root):
+    """
+    Returns the json of the nodes and edges of the graph view, which only
+    change when the DAG is reloaded, from the most recently used ones
+    """
+    key = (dag.dag_id, root or '')
+    entry = graph_structures.pop(key, None)
+    if entry is None or entry[0] != dag.last_loaded:
+        entry = (
+            dag.last_loaded,
+            json.dumps(get_graph_structure(dag), separators=(',', ':')))
+    graph_structures[key] = entry
+    while len(graph_structures) > max(TREE_CACHE_SIZE, 1):
+        graph_structures.popitem(last=False)
+    return entry[1]
+
+
 def get_chart_height(dag):
     """
     TODO(aoen): See [AIRFLOW-1263] We use the number of tasks in the DAG as a heuristic to
@@ -484,8 +727,7 @@ class Airflow(BaseView):
         ds = models.DagStat
         session = Session()
 
-        ds.update()
-
+        # the stats are updated by the scheduler
         qry = (
             session.query(ds.dag_id, ds.state, ds.count)
         )
@@ -497,7 +739,7 @@ class Airflow(BaseView):
             data[dag_id][state] = count
 
         payload = {}
-        for dag in dagbag.dags.values():
+        for dag in get_known_dags(session):
             payload[dag.safe_dag_id] = []
             for state in State.dag_states:
                 try:
@@ -511,50 +753,17 @@ class Airflow(BaseView):
                     'color': State.color(state)
                 }
                 payload[dag.safe_dag_id].append(d)
-        return wwwutils.json_response(payload)
+        session.close()
+        return wwwutils.etag_json_response(payload)
 
     @expose('/task_stats')
     def task_stats(self):
-        TI = models.TaskInstance
-        DagRun = models.DagRun
-        Dag = models.DagModel
+        ts = models.TaskStat
         session = Session()
 
-        LastDagRun = (
-            session.query(DagRun.dag_id, sqla.func.max(DagRun.execution_date).label('execution_date'))
-            .join(Dag, Dag.dag_id == DagRun.dag_id)
-            .filter(DagRun.state != State.RUNNING)
-            .filter(Dag.is_active == True)
-            .group_by(DagRun.dag_id)
-            .subquery('last_dag_run')
-        )
-        RunningDagRun = (
-            session.query(DagRun.dag_id, DagRun.execution_date)
-            .join(Dag, Dag.dag_id == DagRun.dag_id)
-            .filter(DagRun.state == State.RUNNING)
-            .filter(Dag.is_active == True)
-            .subquery('running_dag_run')
-        )
-
-        # Select all task_instances from active dag_runs.
-        # If no dag_run is active, return task instances from most recent dag_run.
-        LastTI = (
-            session.query(TI.dag_id.label('dag_id'), TI.state.label('state'))
-            .join(LastDagRun, and_(
-                LastDagRun.c.dag_id == TI.dag_id,
-                LastDagRun.c.execution_date == TI.execution_date))
-        )
-        RunningTI = (
-            session.query(TI.dag_id.label('dag_id'), TI.state.label('state'))
-            .join(RunningDagRun, and_(
-                RunningDagRun.c.dag_id == TI.dag_id,
-                RunningDagRun.c.execution_date == TI.execution_date))
-        )
-
-        UnionTI = union_all(LastTI, RunningTI).alias('union_ti')
+        # the stats are updated by the scheduler
         qry = (
-            session.query(UnionTI.c.dag_id, UnionTI.c.state, sqla.func.count())
-            .group_by(UnionTI.c.dag_id, UnionTI.c.state)
+            session.query(ts.dag_id, ts.state, ts.count)
         )
 
         data = {}
@@ -562,11 +771,9 @@ class Airflow(BaseView):
             if dag_id not in data:
                 data[dag_id] = {}
             data[dag_id][state] = count
-        session.commit()
-        session.close()
 
         payload = {}
-        for dag in dagbag.dags.values():
+        for dag in get_known_dags(session):
             payload[dag.safe_dag_id] = []
             for state in State.task_states:
                 try:
@@ -580,7 +787,9 @@ class Airflow(BaseView):
                     'color': State.color(state)
                 }
                 payload[dag.safe_dag_id].append(d)
-        return wwwutils.json_response(payload)
+        session.commit()
+        session.close()
+        return wwwutils.etag_json_response(payload)
 
     @expose('/code')
     @login_required
@@ -657,7 +866,7 @@ class Airflow(BaseView):
     def pickle_info(self):
         d = {}
         dag_id = request.args.get('dag_id')
-        dags = [dagbag.dags.get(dag_id)] if dag_id else dagbag.dags.values()
+        dags = [dagbag.get_dag(dag_id)] if dag_id else dagbag.dags.values()
         for dag in dags:
             if not dag.is_subdag:
                 d[dag.dag_id] = dag.pickle_info()
@@ -712,108 +921,98 @@ class Airflow(BaseView):
     @login_required
     @wwwutils.action_logging
     def log(self):
-        BASE_LOG_FOLDER = os.path.expanduser(
-            conf.get('core', 'BASE_LOG_FOLDER'))
         dag_id = request.args.get('dag_id')
         task_id = request.args.get('task_id')
         execution_date = request.args.get('execution_date')
         dag = dagbag.get_dag(dag_id)
-        log_relative = "{dag_id}/{task_id}/{execution_date}".format(
-            **locals())
-        loc = os.path.join(BASE_LOG_FOLDER, log_relative)
-        loc = loc.format(**locals())
-        log = ""
-        TI = models.TaskInstance
         dttm = dateutil.parser.parse(execution_date)
         form = DateTimeForm(data={'execution_date': dttm})
         session = Session()
-        ti = session.query(TI).filter(
-            TI.dag_id == dag_id, TI.task_id == task_id,
-            TI.execution_date == dttm).first()
+        ti = get_log_task_instance(session, dag_id, task_id, dttm)
+        session.close()
 
+        chunk = None
+        follow = False
         if ti is None:
-            log = "*** Task instance did not exist in the DB\n"
+            log_header = "*** Task instance did not exist in the DB\n"
         else:
-            # load remote logs
-            remote_log_base = conf.get('core', 'REMOTE_BASE_LOG_FOLDER')
-            remote_log_loaded = False
-            if remote_log_base:
-                remote_log_path = os.path.join(remote_log_base, log_relative)
-                remote_log = ""
-
-                # Only display errors reading the log if the task completed or ran at least
-                # once before (otherwise there won't be any remote log stored).
-                ti_execution_completed = ti.state in {State.SUCCESS, State.FAILED}
-                ti_ran_more_than_once = ti.try_number > 1
-                surface_log_retrieval_errors = (
-                    ti_execution_completed or ti_ran_more_than_once)
-
-                # S3
-                if remote_log_path.startswith('s3:/'):
-                    remote_log += log_utils.S3Log().read(
-                        remote_log_path, return_error=surface_log_retrieval_errors)
-                    remote_log_loaded = True
-                # GCS
-                elif remote_log_path.startswith('gs:/'):
-                    remote_log += log_utils.GCSLog().read(
-                        remote_log_path, return_error=surface_log_retrieval_errors)
-                    remote_log_loaded = True
-                # unsupported
-                else:
-                    remote_log += '*** Unsupported remote log location.'
-
-                if remote_log:
-                    log += ('*** Reading remote log from {}.\n{}\n'.format(
-                        remote_log_path, remote_log))
-
-            # We only want to display the
-            # local logs while the task is running if a remote log configuration is set up
-            # since the logs will be transfered there after the run completes.
-            # TODO(aoen): One problem here is that if a task is running on a worker it
-            # already ran on, then duplicate logs will be printed for all of the previous
-            # runs of the task that already completed since they will have been printed as
-            # part of the remote log section above. This can be fixed either by streaming
-            # logs to the log servers as tasks are running, or by creating a proper
-            # abstraction for multiple task instance runs).
-            if not remote_log_loaded or ti.state == State.RUNNING:
-                if os.path.exists(loc):
-                    try:
-                        f = open(loc)
-                        log += "*** Reading local log.\n" + "".join(f.readlines())
-                        f.close()
-                    except:
-                        log = "*** Failed to load local log file: {0}.\n".format(loc)
-                else:
-                    WORKER_LOG_SERVER_PORT = \
-                        conf.get('celery', 'WORKER_LOG_SERVER_PORT')
-                    url = os.path.join(
-                        "http://{ti.hostname}:{WORKER_LOG_SERVER_PORT}/log", log_relative
-                    ).format(**locals())
-                    log += "*** Log file isn't local.\n"
-                    log += "*** Fetching here: {url}\n".format(**locals())
-                    try:
-                        import requests
-                        timeout = None  # No timeout
-                        try:
-                            timeout = conf.getint('webserver', 'log_fetch_timeout_sec')
-                        except (AirflowConfigException, ValueError):
-                            pass
-
-                        response = requests.get(url, timeout=timeout)
-                        response.raise_for_status()
-                        log += '\n' + response.text
-                    except:
-                        log += "*** Failed to fetch log file from worker.\n".format(
-                            **locals())
-
-        if PY2 and not isinstance(log, unicode):
-            log = log.decode('utf-8')
+            reader, log_header = get_log_reader(ti, request.args.get('source'))
+            follow = ti.state == State.RUNNING
+            if reader is not None:
+                try:
+                    chunk = reader.read_chunk(chunk_size=LOG_CHUNK_SIZE)
+                except Exception:
+                    log_header += "*** Failed to read the log.\n"
 
         return self.render(
-            'airflow/ti_code.html',
-            code=log, dag=dag, title="Log", task_id=task_id,
+            'airflow/ti_log.html',
+            log_header=log_header, chunk=chunk, follow=follow,
+            source=request.args.get('source') or '',
+            dag=dag, title="Log", task_id=task_id,
             execution_date=execution_date, form=form)
 
+    @expose('/log_chunk')
+    @login_required
+    @wwwutils.action_logging
+    def log_chunk(self):
+        """
+        Returns a chunk of a task log as json: the chunk after ``start``, the
+        one before ``end``, or the tail of the log
+        """
+        dag_id = request.args.get('dag_id')
+        task_id = request.args.get('task_id')
+        dttm = dateutil.parser.parse(request.args.get('execution_date'))
+        start = request.args.get('start', None, type=int)
+        end = request.args.get('end', None, type=int)
+        session = Session()
+        ti = get_log_task_instance(session, dag_id, task_id, dttm)
+        session.close()
+        if ti is None:
+            return wwwutils.json_response(
+                {'error': "Task instance did not exist in the DB"})
+
+        reader, _ = get_log_reader(ti, request.args.get('source'))
+        if reader is None:
+            return wwwutils.json_response({'error': "Can't read the log"})
+        try:
+            chunk = reader.read_chunk(
+                start=start, end=end, chunk_size=LOG_CHUNK_SIZE)
+        except Exception:
+            return wwwutils.json_response({'error': "Failed to read the log"})
+        chunk['follow'] = ti.state == State.RUNNING
+        return wwwutils.json_response(chunk)
+
+    @expose('/log_download')
+    @login_required
+    @wwwutils.action_logging
+    def log_download(self):
+        """
+        Streams the whole task log as plain text, chunk by chunk
+        """
+        dag_id = request.args.get('dag_id')
+        task_id = request.args.get('task_id')
+        dttm = dateutil.parser.parse(request.args.get('execution_date'))
+        session = Session()
+        ti = get_log_task_instance(session, dag_id, task_id, dttm)
+        session.close()
+        if ti is None:
+            return Response(
+                "*** Task instance did not exist in the DB\n",
+                mimetype='text/plain')
+
+        reader, log_header = get_log_reader(ti, request.args.get('source'))
+
+        def generate():
+            yield log_header
+            if reader is not None:
+                try:
+                    for chunk in reader.iter_chunks(chunk_size=LOG_CHUNK_SIZE):
+                        yield chunk
+                except Exception:
+                    yield "\n*** Failed to read the log.\n"
+
+        return Response(stream_with_context(generate()), mimetype='text/plain')
+
     @expose('/task')
     @login_required
     @wwwutils.action_logging
@@ -1055,6 +1254,7 @@ class Airflow(BaseView):
                 start_date=start_date,
                 end_date=end_date,
                 include_subdags=recursive)
+            models.TaskStat.update([dag_id])
 
             flash("{0} task instances have been cleared".format(count))
             return redirect(origin)
@@ -1090,11 +1290,12 @@ class Airflow(BaseView):
             .group_by(DR.dag_id)
             .all()
         )
+        known_dags = {dag.dag_id: dag for dag in get_known_dags(session)}
         payload = []
         for dag_id, active_dag_runs in dags:
             max_active_runs = 0
-            if dag_id in dagbag.dags:
-                max_active_runs = dagbag.dags[dag_id].max_active_runs
+            if dag_id in known_dags:
+                max_active_runs = known_dags[dag_id].max_active_runs or 0
             payload.append({
                 'dag_id': dag_id,
                 'active_dag_run': active_dag_runs,
@@ -1137,6 +1338,7 @@ class Airflow(BaseView):
                                 upstream=upstream, downstream=downstream,
                                 future=future, past=past, state=State.SUCCESS,
                                 commit=True)
+            models.TaskStat.update([dag.dag_id])
 
             flash("Marked success on {} task instances".format(len(altered)))
             return redirect(origin)
@@ -1185,87 +1387,14 @@ class Airflow(BaseView):
         min_date = dates[0] if dates else datetime(2000, 1, 1)
 
         DR = models.DagRun
-        dag_runs = (
-            session.query(DR)
+        max_date = (
+            session.query(sqla.func.max(DR.execution_date))
             .filter(
                 DR.dag_id==dag.dag_id,
                 DR.execution_date<=base_date,
                 DR.execution_date>=min_date)
-            .all()
+            .scalar()
         )
-        dag_runs = {
-            dr.execution_date: alchemy_to_dict(dr) for dr in dag_runs}
-
-        dates = sorted(list(dag_runs.keys()))
-        max_date = max(dates) if dates else None
-
-        tis = dag.get_task_instances(
-            session, start_date=min_date, end_date=base_date)
-        task_instances = {}
-        for ti in tis:
-            tid = alchemy_to_dict(ti)
-            dr = dag_runs.get(ti.execution_date)
-            tid['external_trigger'] = dr['external_trigger'] if dr else False
-            task_instances[(ti.task_id, ti.execution_date)] = tid
-
-        expanded = []
-        # The default recursion traces every path so that tree view has full
-        # expand/collapse functionality. After 5,000 nodes we stop and fall
-        # back on a quick DFS search for performance. See PR #320.
-        node_count = [0]
-        node_limit = 5000 / max(1, len(dag.roots))
-
-        def recurse_nodes(task, visited):
-            visited.add(task)
-            node_count[0] += 1
-
-            children = [
-                recurse_nodes(t, visited) for t in task.upstream_list
-                if node_count[0] < node_limit or t not in visited]
-
-            # D3 tree uses children vs _children to define what is
-            # expanded or not. The following block makes it such that
-            # repeated nodes are collapsed by default.
-            children_key = 'children'
-            if task.task_id not in expanded:
-                expanded.append(task.task_id)
-            elif children:
-                children_key = "_children"
-
-            def set_duration(tid):
-                if (isinstance(tid, dict) and tid.get("state") == State.RUNNING and
-                        tid["start_date"] is not None):
-                    d = datetime.now() - dateutil.parser.parse(tid["start_date"])
-                    tid["duration"] = d.total_seconds()
-                return tid
-
-            return {
-                'name': task.task_id,
-                'instances': [
-                    set_duration(task_instances.get((task.task_id, d))) or {
-                        'execution_date': d.isoformat(),
-                        'task_id': task.task_id
-                    }
-                    for d in dates],
-                children_key: children,
-                'num_dep': len(task.upstream_list),
-                'operator': task.task_type,
-                'retries': task.retries,
-                'owner': task.owner,
-                'start_date': task.start_date,
-                'end_date': task.end_date,
-                'depends_on_past': task.depends_on_past,
-                'ui_color': task.ui_color,
-            }
-        data = {
-            'name': '[DAG]',
-            'children': [recurse_nodes(t, set()) for t in dag.roots],
-            'instances': [
-                dag_runs.get(d) or {'execution_date': d.isoformat()}
-                for d in dates],
-        }
-
-        data = json.dumps(data, indent=4, default=json_ser)
         session.commit()
         session.close()
 
@@ -1279,7 +1408,50 @@ class Airflow(BaseView):
             ),
             root=root,
             form=form,
-            dag=dag, data=data, blur=blur)
+            data_url=url_for(
+                'airflow.tree_data', dag_id=dag_id, root=root or '',
+                base_date=base_date.isoformat(), num_runs=num_runs),
+            now=datetime.now().isoformat(),
+            dag=dag, blur=blur)
+
+    @expose('/tree_data')
+    @login_required
+    def tree_data(self):
+        """
+        Returns the task instances shown by the tree view as json: the
+        tasks, the dates and matrices of task instance attributes indexed
+        by task and date. The body is cached until the task instances or
+        dag runs of the dates change.
+        """
+        dag_id = request.args.get('dag_id')
+        dag = dagbag.get_dag(dag_id)
+        if dag is None:
+            return wwwutils.json_response(
+                {'error': 'DAG "{0}" seems to be missing.'.format(dag_id)})
+        root = request.args.get('root')
+        if root:
+            dag = dag.sub_dag(
+                task_regex=root,
+                include_downstream=False,
+                include_upstream=True)
+        base_date = request.args.get('base_date')
+        if base_date:
+            base_date = dateutil.parser.parse(base_date)
+        else:
+            base_date = dag.latest_execution_date or datetime.now()
+        num_runs = request.args.get('num_runs', 25, type=int)
+
+        dates = dag.date_range(base_date, num=-abs(num_runs))
+        min_date = dates[0] if dates else datetime(2000, 1, 1)
+
+        session = settings.Session()
+        version = get_tree_version(session, dag, min_date, base_date)
+        response = wwwutils.cached_json_response(
+            tree_cache, (dag_id, base_date, num_runs, root or ''), version,
+            lambda: get_tree_data(session, dag, min_date, base_date))
+        session.commit()
+        session.close()
+        return response
 
     @expose('/graph')
     @login_required
@@ -1290,7 +1462,7 @@ class Airflow(BaseView):
         dag_id = request.args.get('dag_id')
         blur = conf.getboolean('webserver', 'demo_mode')
         dag = dagbag.get_dag(dag_id)
-        if dag_id not in dagbag.dags:
+        if dag is None:
             flash('DAG "{0}" seems to be missing.'.format(dag_id), "error")
             return redirect('/admin/')
 
@@ -1303,30 +1475,6 @@ class Airflow(BaseView):
 
         arrange = request.args.get('arrange', dag.orientation)
 
-        nodes = []
-        edges = []
-        for task in dag.tasks:
-            nodes.append({
-                'id': task.task_id,
-                'value': {
-                    'label': task.task_id,
-                    'labelStyle': "fill:{0};".format(task.ui_fgcolor),
-                    'style': "fill:{0};".format(task.ui_color),
-                }
-            })
-
-        def get_upstream(task):
-            for t in task.upstream_list:
-                edge = {
-                    'u': t.task_id,
-                    'v': task.task_id,
-                }
-                if edge not in edges:
-                    edges.append(edge)
-                    get_upstream(t)
-
-        for t in dag.roots:
-            get_upstream(t)
 
         dttm = request.args.get('execution_date')
         if dttm:
@@ -1389,10 +1537,9 @@ class Airflow(BaseView):
             ),
             blur=blur,
             root=root or '',
-            task_instances=json.dumps(task_instances, indent=2),
-            tasks=json.dumps(tasks, indent=2),
-            nodes=json.dumps(nodes, indent=2),
-            edges=json.dumps(edges, indent=2),)
+            task_instances=json.dumps(task_instances, separators=(',', ':')),
+            tasks=json.dumps(tasks, separators=(',', ':')),
+            structure=get_graph_structure_json(dag, root),)
 
     @expose('/duration')
     @login_required
@@ -1840,19 +1987,36 @@ class HomeView(AdminIndexView):
         qry_fltr = []
 
         if do_filter and owner_mode == 'ldapgroup':
-            qry_fltr = qry.filter(
+            qry = qry.filter(
                 ~DM.is_subdag, DM.is_active,
                 DM.owners.in_(current_user.ldap_groups)
-            ).all()
+            )
         elif do_filter and owner_mode == 'user':
-            qry_fltr = qry.filter(
+            qry = qry.filter(
                 ~DM.is_subdag, DM.is_active,
                 DM.owners == current_user.user.username
-            ).all()
+            )
         else:
-            qry_fltr = qry.filter(
+            qry = qry.filter(
                 ~DM.is_subdag, DM.is_active
-            ).all()
+            )
+
+        page = 0
+        num_pages = 1
+        if LAZY_DAGBAG:
+            # list a page of DAGs from the db without importing them
+            if hide_paused:
+                qry = qry.filter(~DM.is_paused)
+            num_pages = max(int(math.ceil(qry.count() / float(DAGS_PER_PAGE))), 1)
+            page = min(max(request.args.get('page', 0, type=int), 0), num_pages - 1)
+            qry_fltr = (
+                qry.order_by(DM.dag_id)
+                .offset(page * DAGS_PER_PAGE)
+                .limit(DAGS_PER_PAGE)
+                .all()
+            )
+        else:
+            qry_fltr = qry.all()
 
         # optionally filter out "paused" dags
         if hide_paused:
@@ -1872,7 +2036,10 @@ class HomeView(AdminIndexView):
 
         # get a list of all non-subdag dags visible to everyone
         # optionally filter out "paused" dags
-        if hide_paused:
+        if LAZY_DAGBAG:
+            unfiltered_webserver_dags = []
+
+        elif hide_paused:
             unfiltered_webserver_dags = [dag for dag in dagbag.dags.values() if
                                          not dag.parent_dag and not dag.is_paused]
 
@@ -1881,7 +2048,11 @@ class HomeView(AdminIndexView):
                                          not dag.parent_dag]
 
         # optionally filter to get only dags that the user should see
-        if do_filter and owner_mode == 'ldapgroup':
+        if LAZY_DAGBAG:
+            # the DAG models are already filtered and hold everything the
+            # list shows, so the DAGs aren't imported
+            webserver_dags = orm_dags
+        elif do_filter and owner_mode == 'ldapgroup':
             # only show dags owned by someone in @current_user.ldap_groups
             webserver_dags = {
                 dag.dag_id: dag
@@ -1907,7 +2078,9 @@ class HomeView(AdminIndexView):
             webserver_dags=webserver_dags,
             orm_dags=orm_dags,
             hide_paused=hide_paused,
-            all_dag_ids=all_dag_ids)
+            all_dag_ids=all_dag_ids,
+            page=page,
+            num_pages=num_pages)
 
 
 class QueryView(wwwutils.DataProfilingMixin, BaseView):
@@ -2322,6 +2495,7 @@ class DagRunModelView(ModelViewOnly):
         for row in deleted:
             dirty_ids.append(row.dag_id)
         models.DagStat.update(dirty_ids, dirty_only=False, session=session)
+        models.TaskStat.update(dirty_ids, session=session)
         session.close()
 
     @action('set_running', "Set state to 'running'", None)
@@ -2352,6 +2526,7 @@ class DagRunModelView(ModelViewOnly):
                     dr.end_date = datetime.now()
             session.commit()
             models.DagStat.update(dirty_ids, session=session)
+            models.TaskStat.update(dirty_ids, session=session)
             flash(
                 "{count} dag runs were set to '{target_state}'".format(**locals()))
         except Exception as ex:
@@ -2440,6 +2615,7 @@ class TaskInstanceModelView(ModelViewOnly):
         try:
             TI = models.TaskInstance
             count = len(ids)
+            dirty_ids = set()
             for id in ids:
                 task_id, dag_id, execution_date = id.split(',')
                 execution_date = datetime.strptime(execution_date, '%Y-%m-%d %H:%M:%S')
@@ -2447,7 +2623,9 @@ class TaskInstanceModelView(ModelViewOnly):
                                               TI.dag_id == dag_id,
                                               TI.execution_date == execution_date).one()
                 ti.state = target_state
+                dirty_ids.add(dag_id)
             session.commit()
+            models.TaskStat.update(dirty_ids, session=session)
             flash(
                 "{count} task instances were set to '{target_state}'".format(**locals()))
         except Exception as ex:
@@ -145,6 +145,7 @@ gcp_api = [
     'pandas-gbq'
 ]
 hdfs = ['snakebite>=2.7.8']
+inotify = ['pyinotify>=0.9.6']
 webhdfs = ['hdfs[dataframe,avro,kerberos]>=2.0.4']
 jira = ['JIRA>1.0.7']
 hive = [
@@ -273,6 +274,7 @@ def do_setup():
             'github_enterprise': github_enterprise,
             'hdfs': hdfs,
             'hive': hive,
+            'inotify': inotify,
             'jdbc': jdbc,
             'kerberos': kerberos,
             'ldap': ldap,
@@ -316,7 +318,8 @@ def do_setup():
         entry_points={
             'console_scripts': [
                 "airflow-cwl-runner=airflow.cwl_runner.main:main",
-                "cwl-runner=airflow.cwl_runner.main:main"
+                "cwl-runner=airflow.cwl_runner.main:main",
+                "airflow-cwl-jobwatcher=airflow.cwl_runner.jobwatcher:main"
             ]
         }
     )
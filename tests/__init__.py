@@ -18,6 +18,7 @@ from .api import *
 from .configuration import *
 from .contrib import *
 from .core import *
+from .cwl_runner import *
 from .executors import *
 from .jobs import *
 from .impersonation import *
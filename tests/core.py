@@ -15,6 +15,7 @@
 from __future__ import print_function
 
 import doctest
+import json
 import os
 import re
 import unittest
@@ -1550,6 +1551,10 @@ class WebUiTests(unittest.TestCase):
         assert "runme_0" in response.data.decode('utf-8')
         response = self.app.get(
             '/admin/airflow/tree?num_runs=25&dag_id=example_bash_operator')
+        assert "example_bash_operator" in response.data.decode('utf-8')
+        response = self.app.get(
+            '/admin/airflow/tree_data?num_runs=25&dag_id=example_bash_operator&'
+            'base_date={}'.format(DEFAULT_DATE_ISO))
         assert "runme_0" in response.data.decode('utf-8')
         response = self.app.get(
             '/admin/airflow/duration?days=30&dag_id=example_bash_operator')
@@ -1587,6 +1592,16 @@ class WebUiTests(unittest.TestCase):
             'dag_id=example_bash_operator&execution_date={}'
             ''.format(DEFAULT_DATE_ISO))
         assert "run_this_last" in response.data.decode('utf-8')
+        response = self.app.get(
+            '/admin/airflow/log_chunk?task_id=run_this_last&'
+            'dag_id=example_bash_operator&execution_date={}'
+            ''.format(DEFAULT_DATE_ISO))
+        assert response.status_code == 200
+        response = self.app.get(
+            '/admin/airflow/log_download?task_id=run_this_last&'
+            'dag_id=example_bash_operator&execution_date={}'
+            ''.format(DEFAULT_DATE_ISO))
+        assert response.status_code == 200
         response = self.app.get(
             '/admin/airflow/task?'
             'task_id=runme_0&dag_id=example_bash_operator&'
@@ -1677,6 +1692,46 @@ class WebUiTests(unittest.TestCase):
         response = self.app.get(url)
         self.assertIn("run_this_last", response.data.decode('utf-8'))
 
+    def test_stats_etag(self):
+        for url in ['/admin/airflow/dag_stats', '/admin/airflow/task_stats']:
+            response = self.app.get(url)
+            self.assertEqual(200, response.status_code)
+            etag = response.headers['ETag']
+            response = self.app.get(url, headers={'If-None-Match': etag})
+            self.assertEqual(304, response.status_code)
+
+    def test_tree_data_cache(self):
+        url = (
+            '/admin/airflow/tree_data?num_runs=25&'
+            'dag_id=test_example_bash_operator&'
+            'base_date={}'.format(DEFAULT_DATE_ISO))
+        response = self.app.get(url, headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual('gzip', response.headers['Content-Encoding'])
+        etag = response.headers['ETag']
+        response = self.app.get(
+            url, headers={'Accept-Encoding': 'gzip', 'If-None-Match': etag})
+        self.assertEqual(304, response.status_code)
+        # the plain body has its own ETag
+        response = self.app.get(url, headers={'If-None-Match': etag})
+        self.assertEqual(200, response.status_code)
+        etag = response.headers['ETag']
+
+        # changing the state of a task instance invalidates the payload
+        session = Session()
+        ti = session.query(models.TaskInstance).filter_by(
+            dag_id='test_example_bash_operator', task_id='run_this_last',
+            execution_date=DEFAULT_DATE).first()
+        ti.state = State.FAILED
+        session.commit()
+        session.close()
+        response = self.app.get(url, headers={'If-None-Match': etag})
+        self.assertEqual(200, response.status_code)
+        payload = json.loads(response.data.decode('utf-8'))
+        task_index = [
+            t['task_id'] for t in payload['tasks']].index('run_this_last')
+        self.assertEqual(
+            State.FAILED, payload['instances']['state'][task_index][0])
+
     def tearDown(self):
         configuration.conf.set("webserver", "expose_config", "False")
         self.dag_bash.clear(start_date=DEFAULT_DATE, end_date=datetime.now())
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+from datetime import datetime
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import cwltool.load_tool
+from mock import patch
+from schema_salad.ref_resolver import uri_file_path
+
+from airflow.cwl_runner import cwlcache
+from airflow.cwl_runner.cwldag import CWLDAG
+
+TOOL = {
+    "cwlVersion": "v1.0",
+    "class": "CommandLineTool",
+    "baseCommand": "echo",
+    "inputs": {"message": {"type": "string", "inputBinding": {"position": 1}}},
+    "outputs": {"greeting": {"type": "stdout"}},
+    "stdout": "greeting.txt"
+}
+
+WORKFLOW = {
+    "cwlVersion": "v1.0",
+    "class": "Workflow",
+    "inputs": {"message": "string"},
+    "outputs": {"greeting": {"type": "File", "outputSource": "echo/greeting"}},
+    "steps": {"echo": {"run": "tool.cwl", "in": {"message": "message"}, "out": ["greeting"]}}
+}
+
+
+class CWLCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.tool = os.path.join(self.folder, "tool.cwl")
+        self.workflow = os.path.join(self.folder, "workflow.cwl")
+        for location, document in [(self.tool, TOOL), (self.workflow, WORKFLOW)]:
+            with open(location, 'w') as document_stream:
+                json.dump(document, document_stream)
+        self.cache_folder = os.path.join(self.folder, "cache")
+        patchers = [patch('airflow.cwl_runner.cwlcache.get_cache_folder', return_value=self.cache_folder),
+                    patch.dict(cwlcache._loaded_workflows, clear=True)]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def reload_from_pickle(self):
+        cwlcache._loaded_workflows.clear()
+        with patch.object(cwltool.load_tool, 'load_tool') as cwltool_load_tool:
+            cwlwf = cwlcache.load_tool(self.workflow)
+            cwltool_load_tool.assert_not_called()
+        return cwlwf
+
+    @patch('airflow.cwl_runner.cwlstepoperator.get_step_cache', return_value=None)
+    def test_run_pickled_tool(self, get_step_cache):
+        cwlcache.load_tool(self.workflow)
+        cwlwf = self.reload_from_pickle()
+        # the Loader isn't pickled
+        self.assertIsNone(cwlwf.doc_loader)
+
+        dag = CWLDAG(default_args={"owner": "airflow",
+                                   "start_date": datetime(2017, 1, 1),
+                                   "cwl_workflow": self.workflow,
+                                   "strict": False,
+                                   "basedir": self.folder,
+                                   "use_container": True,
+                                   "rm_container": True,
+                                   "rm_tmpdir": True,
+                                   "move_outputs": "move",
+                                   "compute_checksum": True})
+        self.assertIs(dag.cwlwf, cwlwf)
+        dag.create()
+
+        task = dag.get_task("echo")
+        task.outdir = os.path.join(self.folder, "outputs")
+        os.makedirs(task.outdir)
+        output = task.run_job({"message": "hello"})
+        with open(uri_file_path(output["greeting"]["location"]), 'r') as greeting_stream:
+            self.assertEqual(greeting_stream.read(), "hello\n")
+
+    def test_outdated(self):
+        cwlwf = cwlcache.load_tool(self.workflow)
+        self.assertIn(self.tool, cwlcache.get_dependencies(cwlwf))
+        self.assertIs(cwlcache.load_tool(self.workflow), cwlwf)
+        self.reload_from_pickle()
+
+        # the tool the workflow runs is changed
+        mtime = os.path.getmtime(self.tool) + 10
+        os.utime(self.tool, (mtime, mtime))
+        with patch.object(cwltool.load_tool, 'load_tool',
+                          wraps=cwltool.load_tool.load_tool) as cwltool_load_tool:
+            cwlcache.load_tool(self.workflow)
+            self.assertEqual(cwltool_load_tool.call_count, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import unittest
+
+import cwltool.errors
+
+from airflow.cwl_runner.cwlstepoperator import eval_value_from, nest, scatter_jobs
+
+
+class ScatterTest(unittest.TestCase):
+
+    def test_dotproduct(self):
+        jobs, dims = scatter_jobs({"a": [1, 2], "b": ["x", "y"], "c": "z"}, ["a", "b"])
+        self.assertEqual(jobs, [{"a": 1, "b": "x", "c": "z"},
+                                {"a": 2, "b": "y", "c": "z"}])
+        self.assertEqual(dims, [2])
+
+    def test_dotproduct_unequal_lengths(self):
+        with self.assertRaises(cwltool.errors.WorkflowException):
+            scatter_jobs({"a": [1, 2], "b": ["x"]}, ["a", "b"], "dotproduct")
+
+    def test_flat_crossproduct(self):
+        jobs, dims = scatter_jobs({"a": [1, 2], "b": ["x", "y", "z"]}, ["a", "b"],
+                                  "flat_crossproduct")
+        self.assertEqual([(job["a"], job["b"]) for job in jobs],
+                         [(1, "x"), (1, "y"), (1, "z"), (2, "x"), (2, "y"), (2, "z")])
+        self.assertEqual(dims, [6])
+        self.assertEqual(nest(list(range(6)), dims), list(range(6)))
+
+    def test_nested_crossproduct(self):
+        jobs, dims = scatter_jobs({"a": [1, 2], "b": ["x", "y", "z"]}, ["a", "b"],
+                                  "nested_crossproduct")
+        self.assertEqual(len(jobs), 6)
+        self.assertEqual(dims, [2, 3])
+        self.assertEqual(nest([(job["a"], job["b"]) for job in jobs], dims),
+                         [[(1, "x"), (1, "y"), (1, "z")],
+                          [(2, "x"), (2, "y"), (2, "z")]])
+
+    def test_nest(self):
+        self.assertEqual(nest(list(range(8)), [2, 2, 2]),
+                         [[[0, 1], [2, 3]], [[4, 5], [6, 7]]])
+        self.assertEqual(nest([], [0, 3]), [])
+
+    def test_value_from_per_element(self):
+        jobs, _ = scatter_jobs({"sample": [{"name": "a"}, {"name": "b"}], "name": None},
+                               ["sample"])
+        jobs = [eval_value_from(job, {"name": "$(inputs.sample.name)"}, [])
+                for job in jobs]
+        self.assertEqual([job["name"] for job in jobs], ["a", "b"])
+        self.assertEqual([job["sample"] for job in jobs], [{"name": "a"}, {"name": "b"}])
+
+
+if __name__ == '__main__':
+    unittest.main()
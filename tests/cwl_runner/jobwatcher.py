@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from mock import patch
+
+from airflow.cwl_runner.jobwatcher import JobWatcher, get_state_file, read_jobs_state
+
+
+class JobWatcherTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.jobs_folder = os.path.join(self.folder, "jobs")
+        for state in ["new", "running", "fail", "success"]:
+            os.makedirs(os.path.join(self.jobs_folder, "biowardrobe", state))
+        patcher = patch('airflow.cwl_runner.jobwatcher.get_cache_folder',
+                        return_value=os.path.join(self.folder, "cache"))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def add_job(self, state, name):
+        location = os.path.join(self.jobs_folder, "biowardrobe", state, name)
+        open(location, 'w').close()
+        return location
+
+    def write_state(self, age, interval):
+        state_file = get_state_file(self.jobs_folder)
+        if not os.path.exists(os.path.dirname(state_file)):
+            os.makedirs(os.path.dirname(state_file))
+        with open(state_file, 'w') as state_stream:
+            json.dump({"timestamp": time.time() - age, "interval": interval,
+                       "jobs": {"new": [], "running": [], "fail": [], "success": []}},
+                      state_stream)
+
+    def test_admit(self):
+        ctimes = {self.add_job("running", "job_r.json"): 0,
+                  self.add_job("new", "job_a.json"): 2,
+                  self.add_job("new", "job_b.json"): 1,
+                  self.add_job("new", "job_c.json"): 3}
+
+        watcher = JobWatcher(self.jobs_folder, max_jobs_to_run=2)
+        with patch('os.path.getctime', side_effect=lambda location: ctimes[location]):
+            watcher.process()
+
+        # the oldest new job takes the only free slot
+        running_folder = os.path.join(self.jobs_folder, "biowardrobe", "running")
+        self.assertEqual(sorted(os.listdir(running_folder)), ["job_b.json", "job_r.json"])
+        self.assertEqual(sorted(os.listdir(os.path.join(self.jobs_folder, "biowardrobe", "new"))),
+                         ["job_a.json", "job_c.json"])
+
+        state = read_jobs_state(self.jobs_folder)
+        self.assertEqual(state["interval"], 1)
+        self.assertEqual(sorted(state["jobs"]["running"]),
+                         [os.path.join(running_folder, "job_b.json"),
+                          os.path.join(running_folder, "job_r.json")])
+
+    def test_read_jobs_state(self):
+        self.assertIsNone(read_jobs_state(self.jobs_folder))
+
+        # the watcher runs with a larger interval than the default one
+        self.write_state(age=30, interval=20)
+        self.assertIsNotNone(read_jobs_state(self.jobs_folder))
+
+        # the watcher missed three of its intervals
+        self.write_state(age=30, interval=5)
+        self.assertIsNone(read_jobs_state(self.jobs_folder))
+        self.assertIsNotNone(read_jobs_state(self.jobs_folder, missed_intervals=10))
+
+
+if __name__ == '__main__':
+    unittest.main()
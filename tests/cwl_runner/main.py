@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+from argparse import Namespace
+from datetime import datetime
+import os
+import shutil
+import tempfile
+import unittest
+
+from mock import patch
+
+from airflow import models, settings
+from airflow.cwl_runner import main
+from airflow.models import DAG
+from airflow.operators.bash_operator import BashOperator
+from airflow.operators.dummy_operator import DummyOperator
+from airflow.utils.state import State
+from airflow.utils.trigger_rule import TriggerRule
+
+DEFAULT_DATE = datetime(2016, 1, 1)
+NOT_RUN_MARKER = None
+RUN_TASK_INSTANCE = main.run_task_instance
+
+
+class BackupTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.workflow = os.path.join(self.folder, "chipseq.cwl")
+        self.job = os.path.join(self.folder, "sample.json")
+        for location in [self.workflow, self.job]:
+            with open(location, 'w') as file_stream:
+                file_stream.write("{}")
+        patchers = [patch.object(main, 'AIRFLOW_HOME', self.folder),
+                    patch.dict(os.environ)]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        os.environ.pop(main.RUN_PARAM_ENV, None)
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def reserve(self, dag_id):
+        backup_filename = main.get_backup_filename(dag_id)
+        if not os.path.exists(os.path.dirname(backup_filename)):
+            os.makedirs(os.path.dirname(backup_filename))
+        open(backup_filename, 'w').close()
+
+    def test_gen_dag_id(self):
+        dag_id = main.gen_dag_id(self.workflow, self.job)
+        self.assertTrue(dag_id.startswith("chipseq-sample-"))
+
+        self.reserve(dag_id)
+        self.assertEqual(main.gen_dag_id(self.workflow, self.job), dag_id + "_1")
+        self.reserve(dag_id + "_1")
+        self.assertEqual(main.gen_dag_id(self.workflow, self.job), dag_id + "_2")
+
+    def test_create_backup(self):
+        dag_id = main.gen_dag_id(self.workflow, self.job)
+        args = {"dag_id": dag_id, "workflow": self.workflow, "job": self.job}
+        # another runner reserves the same dag_id in the meantime
+        self.reserve(dag_id)
+
+        main.create_backup(args)
+        self.assertEqual(args["dag_id"], dag_id + "_1")
+        self.assertEqual(os.environ[main.RUN_PARAM_ENV], dag_id + "_1")
+        self.assertEqual(main.read_backup(), args)
+        with open(main.get_backup_filename(dag_id), 'r') as backup_file:
+            self.assertEqual(backup_file.read(), "")
+
+        main.remove_backup()
+        self.assertFalse(os.path.exists(main.get_backup_filename(dag_id + "_1")))
+        self.assertTrue(os.path.exists(main.get_backup_filename(dag_id)))
+
+    def test_no_backup(self):
+        self.assertIsNone(main.read_backup())
+        # nothing is removed when create_backup failed before passing dag_id
+        main.remove_backup()
+
+
+def run_task_instance_later(dag_id, task_id, execution_date, mark_success, pool):
+    """
+    Leaves the task instance of "ok" task as it is the first time, the way
+    TaskInstance.run does when its dependencies aren't met
+    """
+    if task_id == "ok" and not os.path.exists(NOT_RUN_MARKER):
+        open(NOT_RUN_MARKER, 'w').close()
+        return State.NONE
+    return RUN_TASK_INSTANCE(dag_id, task_id, execution_date, mark_success, pool)
+
+
+class RunDagInprocessTest(unittest.TestCase):
+
+    def setUp(self):
+        global NOT_RUN_MARKER
+        self.folder = tempfile.mkdtemp()
+        NOT_RUN_MARKER = os.path.join(self.folder, "not_run")
+
+        self.dag_id = 'RunDagInprocessTest'
+        session = settings.Session()
+        for model in [models.TaskInstance, models.DagRun]:
+            session.query(model).filter(model.dag_id == self.dag_id).delete()
+        session.commit()
+        session.close()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_run_dag_inprocess(self):
+        dag = DAG(dag_id=self.dag_id, start_date=DEFAULT_DATE)
+        fail = BashOperator(task_id='fail', bash_command='exit 1', dag=dag)
+        after_fail = DummyOperator(task_id='after_fail', dag=dag)
+        after_fail.set_upstream(fail)
+        DummyOperator(task_id='after_after_fail', dag=dag).set_upstream(after_fail)
+        DummyOperator(task_id='on_fail', trigger_rule=TriggerRule.ALL_FAILED,
+                      dag=dag).set_upstream(fail)
+        ok = DummyOperator(task_id='ok', dag=dag)
+        skipped = DummyOperator(task_id='skipped', trigger_rule=TriggerRule.ONE_FAILED, dag=dag)
+        skipped.set_upstream(ok)
+        DummyOperator(task_id='after_skipped', dag=dag).set_upstream(skipped)
+
+        args = Namespace(dag_id=self.dag_id, start_date=DEFAULT_DATE, parallelism=2,
+                         mark_success=False, pool=None)
+        with patch.dict(main.__dict__, {self.dag_id: dag}), \
+                patch.object(main, 'run_task_instance', run_task_instance_later):
+            main.run_dag_inprocess(args)
+
+        session = settings.Session()
+        dag_run = models.DagRun.find(dag_id=self.dag_id, session=session)[0]
+        self.assertEqual({ti.task_id: ti.state for ti in dag_run.get_task_instances(session=session)},
+                         {'fail': State.FAILED,
+                          'after_fail': State.UPSTREAM_FAILED,
+                          'after_after_fail': State.UPSTREAM_FAILED,
+                          'on_fail': State.SUCCESS,
+                          'ok': State.SUCCESS,
+                          'skipped': State.SKIPPED,
+                          'after_skipped': State.SKIPPED})
+        self.assertEqual(dag_run.state, State.FAILED)
+        # the task instance left as it was is run again
+        self.assertTrue(os.path.exists(NOT_RUN_MARKER))
+        session.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import errno
+import os
+import shutil
+import stat
+import tempfile
+import unittest
+
+from mock import patch
+
+from airflow.cwl_runner.outputstager import OutputStager
+
+
+class OutputStagerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.outdir = os.path.join(self.folder, "outdir")
+        self.dest_folder = os.path.join(self.folder, "results")
+        os.makedirs(os.path.join(self.outdir, "reports", "plots"))
+        os.makedirs(self.dest_folder)
+        self.items = []
+        for location, contents in [("output.txt", "outputs\n"),
+                                   ("reports/report.txt", "report\n"),
+                                   ("reports/plots/plot.txt", "plot\n")]:
+            with open(os.path.join(self.outdir, location), 'w') as output_stream:
+                output_stream.write(contents)
+        for location in ["output.txt", "reports"]:
+            os.chmod(os.path.join(self.outdir, location), 0o700)
+            self.items.append(os.path.join(self.outdir, location))
+        self.stager = OutputStager(self.dest_folder, threads=2, dir_perm=0o750, file_perm=0o640)
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def assert_staged(self, report, method):
+        self.assertEqual([(item["src"], item["dst"], item["size"], item["method"]) for item in report],
+                         [(self.items[0], os.path.join(self.dest_folder, "output.txt"), 8, method),
+                          (self.items[1], os.path.join(self.dest_folder, "reports"), 12, method)])
+        for item in self.items:
+            self.assertFalse(os.path.exists(item))
+        permissions = {}
+        for root, dirs, files in os.walk(self.dest_folder):
+            for name in dirs + files:
+                location = os.path.join(root, name)
+                permissions[os.path.relpath(location, self.dest_folder)] = stat.S_IMODE(os.stat(location).st_mode)
+        self.assertEqual(permissions, {"output.txt": 0o640,
+                                       "reports": 0o750,
+                                       "reports/report.txt": 0o640,
+                                       "reports/plots": 0o750,
+                                       "reports/plots/plot.txt": 0o640})
+        with open(os.path.join(self.dest_folder, "reports", "plots", "plot.txt"), 'r') as output_stream:
+            self.assertEqual(output_stream.read(), "plot\n")
+
+    def test_stage_rename(self):
+        # the previous output is replaced
+        os.makedirs(os.path.join(self.dest_folder, "reports"))
+        self.assert_staged(self.stager.stage(self.items), "rename")
+
+    @patch('airflow.cwl_runner.outputstager.os.rename',
+           side_effect=OSError(errno.EXDEV, "Invalid cross-device link"))
+    def test_stage_copy(self, rename):
+        with open(os.path.join(self.dest_folder, "output.txt"), 'w') as output_stream:
+            output_stream.write("previous outputs\n")
+        self.assert_staged(self.stager.stage(self.items), "copy")
+        self.assertEqual(rename.call_count, 2)
+
+    @patch('airflow.cwl_runner.outputstager.os.rename',
+           side_effect=OSError(errno.EACCES, "Permission denied"))
+    def test_stage_error(self, rename):
+        with self.assertRaises(OSError):
+            self.stager.stage(self.items)
+        self.assertTrue(os.path.exists(self.items[0]))
+
+
+if __name__ == '__main__':
+    unittest.main()
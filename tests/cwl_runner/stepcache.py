@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from mock import patch
+from schema_salad.ref_resolver import file_uri, uri_file_path
+
+from airflow.cwl_runner.stepcache import StepCache
+
+
+class Tool(object):
+
+    def __init__(self, tool):
+        self.tool = tool
+        self.requirements = []
+        self.hints = []
+
+
+class StepCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.cache = StepCache(os.path.join(self.folder, "cache"), 1024)
+        self.tool = Tool({"id": "#step", "class": "CommandLineTool"})
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def make_outdir(self, name, contents="outputs\n"):
+        """
+        Returns an outdir with a file and a directory in it and the output object of them
+        """
+        outdir = os.path.join(self.folder, name)
+        os.makedirs(os.path.join(outdir, "reports"))
+        with open(os.path.join(outdir, "output.txt"), 'w') as output_stream:
+            output_stream.write(contents)
+        with open(os.path.join(outdir, "reports", "report.txt"), 'w') as output_stream:
+            output_stream.write(contents)
+        output = {"output_file": {"class": "File",
+                                  "location": file_uri(os.path.join(outdir, "output.txt"))},
+                  "reports": {"class": "Directory",
+                              "location": file_uri(os.path.join(outdir, "reports"))}}
+        return outdir, output
+
+    def make_input(self, name, contents):
+        location = os.path.join(self.folder, name)
+        with open(location, 'w') as input_stream:
+            input_stream.write(contents)
+        return {"input_file": {"class": "File", "location": file_uri(location)}, "threads": 2}
+
+    def test_get_key(self):
+        key = self.cache.get_key(self.tool, self.make_input("input_1.txt", "ACGT"))
+        # the same content at another location
+        self.assertEqual(key, self.cache.get_key(self.tool, self.make_input("input_2.txt", "ACGT")))
+        self.assertNotEqual(key, self.cache.get_key(self.tool, self.make_input("input_3.txt", "ACGA")))
+        self.assertNotEqual(key, self.cache.get_key(Tool({"id": "#other_step"}),
+                                                    self.make_input("input_4.txt", "ACGT")))
+
+    def test_store_restore(self):
+        self.assertIsNone(self.cache.restore("missing", self.folder))
+
+        outdir, output = self.make_outdir("outdir_1")
+        self.cache.store("key", output, outdir)
+
+        restore_outdir = os.path.join(self.folder, "outdir_2")
+        os.makedirs(restore_outdir)
+        restored = self.cache.restore("key", restore_outdir)
+        restored_file = uri_file_path(restored["output_file"]["location"])
+        self.assertEqual(restored_file, os.path.join(restore_outdir, "output.txt"))
+        self.assertEqual(uri_file_path(restored["reports"]["location"]),
+                         os.path.join(restore_outdir, "reports"))
+        self.assertTrue(os.path.isfile(os.path.join(restore_outdir, "reports", "report.txt")))
+
+        # restored outputs are copies of the cache entry
+        with open(restored_file, 'w') as output_stream:
+            output_stream.write("changed\n")
+        other_outdir = os.path.join(self.folder, "outdir_3")
+        os.makedirs(other_outdir)
+        restored = self.cache.restore("key", other_outdir)
+        with open(uri_file_path(restored["output_file"]["location"]), 'r') as output_stream:
+            self.assertEqual(output_stream.read(), "outputs\n")
+
+    def test_restore_cleanup(self):
+        outdir, output = self.make_outdir("outdir_1")
+        self.cache.store("key", output, outdir)
+        restore_outdir = os.path.join(self.folder, "outdir_2")
+        os.makedirs(restore_outdir)
+
+        def partial_copytree(src, dst):
+            os.makedirs(dst)
+            raise shutil.Error([(src, dst, "failed")])
+
+        # the directory is copied partially or not created at all
+        for side_effect in [partial_copytree, OSError("failed")]:
+            with patch('airflow.cwl_runner.stepcache.shutil.copytree', side_effect=side_effect):
+                self.assertIsNone(self.cache.restore("key", restore_outdir))
+            self.assertEqual(os.listdir(restore_outdir), [])
+
+        # outputs which were already in outdir are left there
+        with open(os.path.join(restore_outdir, "output.txt"), 'w') as output_stream:
+            output_stream.write("existing\n")
+        self.assertIsNone(self.cache.restore("key", restore_outdir))
+        self.assertEqual(os.listdir(restore_outdir), ["output.txt"])
+        with open(os.path.join(restore_outdir, "output.txt"), 'r') as output_stream:
+            self.assertEqual(output_stream.read(), "existing\n")
+
+    def test_evict(self):
+        # every entry keeps two 8 bytes files
+        for i, key in enumerate(["key_1", "key_2", "key_3"]):
+            outdir, output = self.make_outdir("outdir_{0}".format(i))
+            self.cache.store(key, output, outdir)
+            os.utime(os.path.join(self.cache.cache_folder, key), (1000 * (i + 1), 1000 * (i + 1)))
+        self.assertEqual(sorted(os.listdir(self.cache.cache_folder)), ["key_1", "key_2", "key_3"])
+
+        restore_outdir = os.path.join(self.folder, "restored")
+        os.makedirs(restore_outdir)
+        self.assertIsNotNone(self.cache.restore("key_1", restore_outdir))
+
+        self.cache.max_size = 32
+        self.cache.evict()
+        self.assertEqual(sorted(os.listdir(self.cache.cache_folder)), ["key_1", "key_3"])
+
+
+if __name__ == '__main__':
+    unittest.main()
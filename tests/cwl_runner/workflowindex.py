@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from mock import patch
+
+from airflow.cwl_runner.workflowindex import WorkflowIndex
+
+
+class WorkflowIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.workflows_folder = os.path.join(self.folder, "workflows")
+        self.index_file = os.path.join(self.folder, "cache", "index.json")
+        for workflow in ["chipseq/chipseq.cwl", "chipseq/chipseq-se.cwl", "rnaseq/rnaseq.cwl"]:
+            self.add_workflow(workflow)
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def add_workflow(self, workflow, mtime=1000):
+        location = os.path.join(self.workflows_folder, workflow)
+        if not os.path.exists(os.path.dirname(location)):
+            os.makedirs(os.path.dirname(location))
+        open(location, 'w').close()
+        # folders keep the same mtime unless a test changes it
+        for folder in [os.path.dirname(location), self.workflows_folder]:
+            os.utime(folder, (mtime, mtime))
+        return location
+
+    def test_find(self):
+        index = WorkflowIndex(self.workflows_folder, index_file=self.index_file)
+        self.assertEqual(index.find("/jobs/new/chipseq-se-sample.json"),
+                         os.path.join(self.workflows_folder, "chipseq", "chipseq-se.cwl"))
+        self.assertEqual(index.find("/jobs/new/chipseq-pe-sample.json"),
+                         os.path.join(self.workflows_folder, "chipseq", "chipseq.cwl"))
+        self.assertEqual(index.find("rnaseq.json"),
+                         os.path.join(self.workflows_folder, "rnaseq", "rnaseq.cwl"))
+
+    def test_find_no_match(self):
+        index = WorkflowIndex(self.workflows_folder, index_file=self.index_file)
+        self.assertIsNone(index.find("/jobs/new/atacseq-sample.json"))
+        self.assertIsNone(index.find("/jobs/new/chip.json"))
+
+    def test_refresh(self):
+        index = WorkflowIndex(self.workflows_folder, index_file=self.index_file)
+        rnaseq_folder = os.path.join(self.workflows_folder, "rnaseq")
+        with open(os.path.join(rnaseq_folder, "rnaseq-pe.cwl"), 'w'):
+            pass
+        os.utime(rnaseq_folder, (2000, 2000))
+
+        with patch.object(WorkflowIndex, 'scan_folder', autospec=True,
+                          side_effect=WorkflowIndex.scan_folder) as scan_folder:
+            index.refresh()
+            self.assertEqual([args[1] for args, _ in scan_folder.call_args_list], [rnaseq_folder])
+            self.assertEqual(index.find("rnaseq-pe-sample.json"),
+                             os.path.join(rnaseq_folder, "rnaseq-pe.cwl"))
+
+            # the saved index is up to date
+            scan_folder.reset_mock()
+            index = WorkflowIndex(self.workflows_folder, index_file=self.index_file)
+            scan_folder.assert_not_called()
+            self.assertEqual(index.find("rnaseq-pe-sample.json"),
+                             os.path.join(rnaseq_folder, "rnaseq-pe.cwl"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -12,4 +12,6 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+from .base_executor import *
 from .dask_executor import *
+from .local_executor import *
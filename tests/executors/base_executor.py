@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+
+from mock import MagicMock
+
+from airflow.executors.base_executor import BaseExecutor
+from airflow.utils.operator_resources import Resources
+from airflow.utils.state import State
+
+
+class RecordingExecutor(BaseExecutor):
+
+    def __init__(self, *args, **kwargs):
+        self.launched = []
+        super(RecordingExecutor, self).__init__(*args, **kwargs)
+
+    def execute_async(self, key, command, queue=None):
+        self.launched.append(key)
+
+    def refresh_task_instance_states(self, task_instances, session=None):
+        pass
+
+
+class BaseExecutorTest(unittest.TestCase):
+
+    def queue(self, executor, key, priority, cpus=1, ram=512):
+        ti = MagicMock(key=key, state=State.QUEUED)
+        executor.queue_command(ti, key, priority=priority,
+                               resources=Resources(cpus=cpus, ram=ram))
+
+    def test_heartbeat_packs_by_resources(self):
+        executor = RecordingExecutor(parallelism=10, cpus=8, ram=4096)
+        self.queue(executor, 'big', 3, cpus=6)
+        self.queue(executor, 'medium', 2, cpus=4)
+        self.queue(executor, 'small', 1, cpus=2)
+        executor.heartbeat()
+        self.assertEqual(['big', 'small'], executor.launched)
+        self.assertEqual(['medium'], list(executor.queued_tasks))
+
+        executor.success('big')
+        executor.heartbeat()
+        self.assertEqual(['big', 'small', 'medium'], executor.launched)
+
+    def test_heartbeat_caps_oversized_request(self):
+        executor = RecordingExecutor(parallelism=10, cpus=4, ram=4096)
+        self.queue(executor, 'huge', 2, ram=100000)
+        self.queue(executor, 'small', 1)
+        executor.heartbeat()
+        self.assertEqual(['huge'], executor.launched)
+
+        executor.success('huge')
+        executor.heartbeat()
+        self.assertEqual(['huge', 'small'], executor.launched)
+
+    def test_heartbeat_without_budget(self):
+        executor = RecordingExecutor(parallelism=2, cpus=0, ram=0)
+        self.queue(executor, 'a', 3, cpus=100)
+        self.queue(executor, 'b', 2, cpus=100)
+        self.queue(executor, 'c', 1, cpus=100)
+        executor.heartbeat()
+        self.assertEqual(['a', 'b'], executor.launched)
+
+    def test_heartbeat_priority_order(self):
+        executor = RecordingExecutor(parallelism=2, cpus=0, ram=0)
+        self.queue(executor, 'low', 1)
+        self.queue(executor, 'high', 5)
+        self.queue(executor, 'high_later', 5)
+        executor.heartbeat()
+        self.assertEqual(['high', 'high_later'], executor.launched)
+
+        # removed from the queue outside of heartbeat
+        executor.queued_tasks.clear()
+        executor.success('high')
+        executor.heartbeat()
+        self.assertEqual(['high', 'high_later'], executor.launched)
+
+    def test_heartbeat_skips_running_task_instances(self):
+        executor = RecordingExecutor(parallelism=2, cpus=0, ram=0)
+        self.queue(executor, 'running', 2)
+        self.queue(executor, 'queued', 1)
+        executor.queued_tasks['running'][3].state = State.RUNNING
+        executor.heartbeat()
+        self.assertEqual(['queued'], executor.launched)
+        self.assertEqual({}, executor.queued_tasks)
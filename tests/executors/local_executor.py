@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+
+from mock import patch
+from sqlalchemy import create_engine
+from sqlalchemy.pool import QueuePool
+
+from airflow import settings
+from airflow.exceptions import AirflowException
+from airflow.executors.local_executor import LocalWorker
+from airflow.utils.state import State
+
+RUN_COMMAND = 'airflow run example_bash_operator runme_0 2017-01-01 --local -p 1'
+
+
+class LocalWorkerTest(unittest.TestCase):
+
+    def test_execute_work_subprocess(self):
+        worker = LocalWorker(None, None, fork_tasks=True)
+        self.assertEqual(State.SUCCESS, worker.execute_work('true'))
+        self.assertEqual(State.FAILED, worker.execute_work('false'))
+
+    @patch('airflow.bin.cli.run')
+    def test_execute_work_fork(self, run):
+        worker = LocalWorker(None, None, fork_tasks=True)
+        self.assertEqual(State.SUCCESS, worker.execute_work(RUN_COMMAND))
+
+        run.side_effect = AirflowException('failed')
+        self.assertEqual(State.FAILED, worker.execute_work(RUN_COMMAND))
+
+        # run was called in the forked processes only
+        run.assert_not_called()
+
+    @patch('airflow.bin.cli.run')
+    def test_execute_work_fork_connection(self, run):
+        engine = create_engine('sqlite://', poolclass=QueuePool)
+        # a connection of the worker, back in its pool
+        connection = engine.raw_connection()
+        parent_connection = connection.connection
+        connection.close()
+
+        def check_connection(args, dag=None):
+            connection = settings.engine.raw_connection()
+            try:
+                if connection.connection is parent_connection:
+                    raise AirflowException('connection of the worker reused')
+            finally:
+                connection.close()
+        run.side_effect = check_connection
+
+        worker = LocalWorker(None, None, fork_tasks=True)
+        with patch.object(settings, 'engine', engine):
+            self.assertEqual(State.SUCCESS, worker.execute_work(RUN_COMMAND))
@@ -29,7 +29,7 @@ from tempfile import mkdtemp
 from airflow import AirflowException, settings, models
 from airflow.bin import cli
 from airflow.executors import SequentialExecutor
-from airflow.jobs import BackfillJob, SchedulerJob, LocalTaskJob
+from airflow.jobs import BackfillJob, SchedulerJob, LocalTaskJob, BaseJob, HeartbeatAgentJob
 from airflow.models import DAG, DagModel, DagBag, DagRun, Pool, TaskInstance as TI
 from airflow.operators.dummy_operator import DummyOperator
 from airflow.operators.bash_operator import BashOperator
@@ -531,6 +531,40 @@ class BackfillJobTest(unittest.TestCase):
         session.close()
 
 
+    def test_refresh_task_instances(self):
+        dag = DAG(
+            dag_id='test_refresh_task_instances',
+            start_date=DEFAULT_DATE)
+
+        task1 = DummyOperator(task_id='dummy1', dag=dag, owner='airflow')
+        task2 = DummyOperator(task_id='dummy2', dag=dag, owner='airflow')
+
+        job = BackfillJob(dag=dag)
+
+        session = settings.Session()
+        dr = dag.create_dagrun(run_id=DagRun.ID_PREFIX,
+                               state=State.RUNNING,
+                               execution_date=DEFAULT_DATE,
+                               start_date=DEFAULT_DATE,
+                               session=session)
+        ti1 = TI(task1, dr.execution_date)
+        ti2 = TI(task2, dr.execution_date)
+        ti3 = TI(task2, DEFAULT_DATE + datetime.timedelta(days=1))
+        ti1.refresh_from_db()
+        ti2.refresh_from_db()
+
+        # changed by another process
+        TI(task1, dr.execution_date).set_state(State.SUCCESS, session)
+        TI(task2, dr.execution_date).set_state(State.FAILED, session)
+
+        job._refresh_task_instances([ti1, ti2, ti3])
+        self.assertEqual(State.SUCCESS, ti1.state)
+        self.assertEqual(State.FAILED, ti2.state)
+        self.assertIsNone(ti3.state)
+
+        session.close()
+
+
 class LocalTaskJobTest(unittest.TestCase):
     def setUp(self):
         pass
@@ -606,6 +640,60 @@ class LocalTaskJobTest(unittest.TestCase):
         session.close()
 
 
+class HeartbeatAgentJobTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_write_heartbeats(self):
+        session = settings.Session()
+        jobs = {}
+        for state in [State.RUNNING, State.SHUTDOWN, State.SUCCESS]:
+            jobs[state] = BaseJob(executor=SequentialExecutor(), heartrate=0)
+            jobs[state].state = state
+            session.add(jobs[state])
+        session.commit()
+        for job in jobs.values():
+            session.refresh(job)
+            session.expunge(job)
+
+        heartbeat = 1483228800
+        for job in jobs.values():
+            heartbeat_file = os.path.join(self.folder, str(job.id))
+            open(heartbeat_file, 'a').close()
+            os.utime(heartbeat_file, (heartbeat, heartbeat))
+
+        agent = HeartbeatAgentJob(folder=self.folder, interval=5,
+                                  executor=SequentialExecutor())
+        self.assertFalse(HeartbeatAgentJob.is_agent_alive(self.folder, 5))
+        self.assertEqual(3, agent.write_heartbeats())
+        self.assertTrue(HeartbeatAgentJob.is_agent_alive(self.folder, 5))
+
+        latest_heartbeats = dict(
+            session.query(BaseJob.state, BaseJob.latest_heartbeat)
+            .filter(BaseJob.id.in_([job.id for job in jobs.values()]))
+            .all())
+        self.assertEqual(datetime.datetime.fromtimestamp(heartbeat),
+                         latest_heartbeats[State.RUNNING])
+        self.assertNotEqual(datetime.datetime.fromtimestamp(heartbeat),
+                            latest_heartbeats[State.SUCCESS])
+        self.assertTrue(os.path.exists(os.path.join(
+            self.folder, str(jobs[State.SHUTDOWN].id) + HeartbeatAgentJob.SHUTDOWN_SUFFIX)))
+        self.assertFalse(os.path.exists(os.path.join(
+            self.folder, str(jobs[State.SUCCESS].id))))
+
+        # unchanged heartbeats are not written again
+        self.assertEqual(0, agent.write_heartbeats())
+
+        with patch('airflow.jobs.HEARTBEAT_AGENT_FOLDER', self.folder):
+            jobs[State.RUNNING].heartbeat()
+            self.assertEqual(1, agent.write_heartbeats())
+            self.assertRaises(AirflowException, jobs[State.SHUTDOWN].heartbeat)
+        session.close()
+
+
 class SchedulerJobTest(unittest.TestCase):
     # These defaults make the test faster to run
     default_scheduler_args = {"file_process_interval": 0,
@@ -697,6 +785,76 @@ class SchedulerJobTest(unittest.TestCase):
 
         session.close()
 
+    def test_execute_task_instances_backfill_runs(self):
+        dag_id = 'SchedulerJobTest.test_execute_task_instances_backfill_runs'
+        dag = DAG(dag_id=dag_id, start_date=DEFAULT_DATE)
+        task1 = DummyOperator(dag=dag, task_id='dummy')
+        dagbag = SimpleDagBag([dag])
+
+        scheduler = SchedulerJob(**self.default_scheduler_args)
+        session = settings.Session()
+
+        # only the runs of backfill jobs are left to them
+        run_ids = [BackfillJob.ID_PREFIX + 'run', 'rerun_backfill_fix']
+        tis = []
+        for i, run_id in enumerate(run_ids):
+            dr = dag.create_dagrun(
+                run_id=run_id,
+                execution_date=DEFAULT_DATE + datetime.timedelta(days=i),
+                state=State.RUNNING,
+                session=session)
+            ti = TI(task1, dr.execution_date)
+            ti.state = State.SCHEDULED
+            session.merge(ti)
+            tis.append(ti)
+        session.commit()
+
+        scheduler._execute_task_instances(dagbag, [State.SCHEDULED])
+
+        for ti in tis:
+            ti.refresh_from_db()
+        self.assertEqual([State.SCHEDULED, State.QUEUED],
+                         [ti.state for ti in tis])
+
+        session.close()
+
+    def test_change_state_for_executable_task_instances(self):
+        dag_id = 'SchedulerJobTest.test_change_state_for_executable_task_instances'
+        dag = DAG(dag_id=dag_id, start_date=DEFAULT_DATE)
+        task1 = DummyOperator(dag=dag, task_id='dummy1')
+        task2 = DummyOperator(dag=dag, task_id='dummy2')
+
+        scheduler = SchedulerJob(**self.default_scheduler_args)
+        session = settings.Session()
+
+        dr = scheduler.create_dag_run(dag)
+        ti1 = TI(task1, dr.execution_date)
+        ti2 = TI(task2, dr.execution_date)
+        ti1.state = State.SCHEDULED
+        ti2.state = State.SCHEDULED
+        session.merge(ti1)
+        session.merge(ti2)
+        session.commit()
+
+        # another scheduler runs ti2 in the meantime
+        ti2.state = State.RUNNING
+        session.merge(ti2)
+        session.commit()
+        ti2.state = State.SCHEDULED
+
+        queued = scheduler._change_state_for_executable_task_instances(
+            [ti1, ti2], (State.SCHEDULED,), session=session)
+
+        self.assertEqual([ti1.key], [ti.key for ti in queued])
+        self.assertEqual(State.QUEUED, queued[0].state)
+        self.assertIsNotNone(queued[0].queued_dttm)
+        ti1.refresh_from_db()
+        ti2.refresh_from_db()
+        self.assertEqual(State.QUEUED, ti1.state)
+        self.assertEqual(State.RUNNING, ti2.state)
+
+        session.close()
+
     def test_change_state_for_tis_without_dagrun(self):
         dag = DAG(
             dag_id='test_change_state_for_tis_without_dagrun',
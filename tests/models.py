@@ -27,7 +27,7 @@ from airflow import models, settings, AirflowException
 from airflow.exceptions import AirflowSkipException
 from airflow.models import DAG, TaskInstance as TI
 from airflow.models import State as ST
-from airflow.models import DagModel, DagStat
+from airflow.models import DagModel, DagStat, TaskStat
 from airflow.operators.dummy_operator import DummyOperator
 from airflow.operators.bash_operator import BashOperator
 from airflow.operators.python_operator import PythonOperator
@@ -195,6 +195,31 @@ class DagTest(unittest.TestCase):
 
         self.assertEquals(tuple(), dag.topological_sort())
 
+    def test_dag_topological_sort_memoized(self):
+        dag = DAG(
+            'dag',
+            start_date=DEFAULT_DATE,
+            default_args={'owner': 'owner1'})
+
+        with dag:
+            op1 = DummyOperator(task_id='A')
+            op2 = DummyOperator(task_id='B')
+            op2.set_upstream(op1)
+
+        topological_list = dag.topological_sort()
+        self.assertEqual((op1, op2), topological_list)
+        self.assertIs(topological_list, dag.topological_sort())
+
+        # adding a task or a relationship resets the order
+        op3 = DummyOperator(task_id='C', dag=dag)
+        self.assertEqual(3, len(dag.topological_sort()))
+        op1.set_upstream(op3)
+        self.assertEqual((op3, op1, op2), dag.topological_sort())
+
+        # sub dags are sorted on their own
+        sub_dag = dag.sub_dag('B', include_upstream=False)
+        self.assertEqual(['B'], [t.task_id for t in sub_dag.topological_sort()])
+
     def test_get_num_task_instances(self):
         test_dag_id = 'test_get_num_task_instances_dag'
         test_task_id = 'task_1'
@@ -338,6 +363,77 @@ class DagStatTest(unittest.TestCase):
         for stat in res:
             self.assertFalse(stat.dirty)
 
+
+class TaskStatTest(unittest.TestCase):
+    def test_taskstats_update(self):
+        dag = DAG(
+            'test_taskstats_update',
+            start_date=DEFAULT_DATE,
+            default_args={'owner': 'owner1'})
+
+        with dag:
+            op1 = DummyOperator(task_id='A')
+            op2 = DummyOperator(task_id='B')
+
+        session = settings.Session()
+        for day, dag_run_state, task_states in [
+                (0, State.SUCCESS, [State.SUCCESS, State.FAILED]),
+                (1, State.FAILED, [State.FAILED, State.UPSTREAM_FAILED]),
+                (2, State.RUNNING, [State.RUNNING, None])]:
+            execution_date = DEFAULT_DATE + datetime.timedelta(days=day)
+            dr = dag.create_dagrun(
+                run_id='test_taskstats_update_{}'.format(day),
+                execution_date=execution_date,
+                start_date=execution_date,
+                state=dag_run_state,
+                session=session)
+            for ti, state in zip(dr.get_task_instances(session=session), task_states):
+                ti.state = state
+                session.merge(ti)
+        session.commit()
+
+        TaskStat.update(['test_taskstats_update'])
+        counts = dict(
+            session.query(TaskStat.state, TaskStat.count)
+            .filter(TaskStat.dag_id == 'test_taskstats_update')
+            .all())
+        # the running dag run and the latest finished one
+        self.assertEqual({State.FAILED: 1, State.UPSTREAM_FAILED: 1, State.RUNNING: 1},
+                         counts)
+        session.close()
+
+    def test_taskstats_update_changed_only(self):
+        session = settings.Session()
+        dag_ids = ['test_taskstats_changed_{}'.format(i) for i in range(4)]
+        for dag_id in dag_ids:
+            for model in [TaskStat, DagStat, models.DagRun]:
+                session.query(model).filter(model.dag_id == dag_id).delete()
+        for i, dag_id in enumerate(dag_ids[1:]):
+            # stale counts
+            session.add(TaskStat(dag_id=dag_id, state=State.SUCCESS, count=5))
+            session.add(DagStat(dag_id=dag_id, state=State.SUCCESS, dirty=(i == 1)))
+        session.commit()
+        dag = DAG(dag_ids[3], start_date=DEFAULT_DATE)
+        dag.create_dagrun(run_id='test_taskstats_update_changed_only',
+                          execution_date=DEFAULT_DATE,
+                          state=State.RUNNING,
+                          session=session)
+        # only the running dag run tells the task stats may be stale
+        (session.query(DagStat)
+         .filter(DagStat.dag_id == dag_ids[3])
+         .update({DagStat.dirty: False}, synchronize_session=False))
+        session.commit()
+
+        TaskStat.update(dag_ids, changed_only=True)
+        counts = dict(
+            session.query(TaskStat.dag_id, TaskStat.count)
+            .filter(TaskStat.dag_id.in_(dag_ids))
+            .all())
+        # no stats yet, up to date, dirty dag stats and a running dag run
+        self.assertEqual({dag_ids[1]: 5}, counts)
+        session.close()
+
+
 class DagRunTest(unittest.TestCase):
 
     def create_dag_run(self, dag, state=State.RUNNING, task_states=None, execution_date=None):
@@ -485,6 +581,36 @@ class DagRunTest(unittest.TestCase):
         state = dr.update_state()
         self.assertEqual(State.FAILED, state)
 
+    def test_dagrun_deadlock_check_only_without_progress(self):
+        session = settings.Session()
+
+        dag = DAG(
+            'test_dagrun_deadlock_check_only_without_progress',
+            start_date=DEFAULT_DATE,
+            default_args={'owner': 'owner1'})
+
+        with dag:
+            op1 = DummyOperator(task_id='A')
+            op2 = DummyOperator(task_id='B')
+            op2.set_upstream(op1)
+
+        dag.clear()
+
+        now = datetime.datetime.now()
+        dr = dag.create_dagrun(run_id='test_dagrun_deadlock_check_only_without_progress',
+                               state=State.RUNNING,
+                               execution_date=now,
+                               start_date=now)
+
+        ti_op1 = dr.get_task_instance(task_id=op1.task_id)
+        ti_op1.set_state(state=State.RUNNING, session=session)
+        with patch.object(models.DagRun, 'is_deadlocked') as is_deadlocked:
+            self.assertEqual(State.RUNNING, dr.update_state())
+            self.assertFalse(is_deadlocked.called)
+
+        ti_op1.set_state(state=State.FAILED, session=session)
+        self.assertEqual(State.FAILED, dr.update_state())
+
     def test_get_task_instance_on_empty_dagrun(self):
         """
         Make sure that a proper value is returned when a dagrun has no task instances
@@ -628,6 +754,74 @@ class DagBagTest(unittest.TestCase):
                 dag.fileloc.endswith('airflow/example_dags/' + path))
 
 
+class LazyDagBagTest(unittest.TestCase):
+
+    def setUp(self):
+        dagbag = models.DagBag(include_examples=True)
+        for dag_id in ['example_bash_operator',
+                       'example_branch_operator',
+                       'example_subdag_operator',
+                       'example_xcom']:
+            DAG.sync_to_db(dagbag.get_dag(dag_id), 'airflow',
+                           datetime.datetime.now())
+
+    def test_dags_imported_on_demand(self):
+        """
+        test that no DAG is imported upfront and a requested DAG is imported
+        from the file location saved in the db
+        """
+        dagbag = models.LazyDagBag(include_examples=True)
+        self.assertEqual(dagbag.size(), 0)
+
+        dag = dagbag.get_dag('example_bash_operator')
+        self.assertEqual(dag.dag_id, 'example_bash_operator')
+        self.assertEqual(list(dagbag.dags.keys()), ['example_bash_operator'])
+        self.assertIsNone(dagbag.get_dag('non_existing_dag_id'))
+
+        dagbag.collect_dags(only_if_updated=False)
+        self.assertEqual(dagbag.size(), 0)
+
+    def test_least_recently_used_dag_dropped(self):
+        dagbag = models.LazyDagBag(include_examples=True, max_loaded_dags=2)
+        dagbag.get_dag('example_bash_operator')
+        dagbag.get_dag('example_branch_operator')
+        dagbag.get_dag('example_bash_operator')
+        dagbag.get_dag('example_xcom')
+
+        self.assertEqual(list(dagbag.dags.keys()),
+                         ['example_bash_operator', 'example_xcom'])
+
+    def test_dags_of_a_file_kept_together(self):
+        """
+        test that the DAGs generated by a file stay loaded, even over
+        max_loaded_dags, until the file changes
+        """
+        dagbag = models.LazyDagBag(include_examples=True, max_loaded_dags=2)
+        dagbag.get_dag('example_bash_operator')
+        dag = dagbag.get_dag('example_subdag_operator')
+        subdag_ids = ['example_subdag_operator.section-1',
+                      'example_subdag_operator.section-2']
+        self.assertEqual(sorted(dagbag.dags.keys()),
+                         ['example_subdag_operator'] + subdag_ids)
+
+        with patch.object(dagbag, 'process_file',
+                          wraps=dagbag.process_file) as process_file:
+            for subdag_id in subdag_ids:
+                self.assertEqual(dagbag.get_dag(subdag_id).dag_id, subdag_id)
+            process_file.assert_not_called()
+
+        # the file is changed on disk
+        dagbag.file_last_changed[dag.fileloc] = datetime.datetime(2000, 1, 1)
+        self.assertIsNot(dagbag.get_dag('example_subdag_operator'), dag)
+
+    def test_dag_model_listing_columns(self):
+        dag = models.DagBag(include_examples=True).get_dag('example_bash_operator')
+        orm_dag = DagModel.get_current('example_bash_operator')
+        self.assertEqual(orm_dag.schedule_interval, '0 0 * * *')
+        self.assertEqual(orm_dag.max_active_runs, dag.max_active_runs)
+        self.assertEqual(orm_dag.safe_dag_id, 'example_bash_operator')
+
+
 class TaskInstanceTest(unittest.TestCase):
 
     def test_set_task_dates(self):
@@ -15,7 +15,9 @@
 import unittest
 from datetime import datetime
 
-from airflow.models import BaseOperator, TaskInstance
+from airflow.models import BaseOperator, DAG, TaskInstance
+from airflow.operators.dummy_operator import DummyOperator
+from airflow.ti_deps.dep_context import DepContext
 from airflow.utils.trigger_rule import TriggerRule
 from airflow.ti_deps.deps.trigger_rule_dep import TriggerRuleDep
 from airflow.utils.state import State
@@ -250,3 +252,39 @@ class TriggerRuleDepTest(unittest.TestCase):
 
         self.assertEqual(len(dep_statuses), 1)
         self.assertFalse(dep_statuses[0].passed)
+
+    def test_count_upstream_states(self):
+        """
+        Upstream states are counted from the task states of the DagRun
+        """
+        ti = self._get_task_instance(
+            upstream_task_ids=['success', 'skipped', 'failed',
+                               'upstream_failed', 'running', 'missing'])
+        task_states = {
+            'success': State.SUCCESS,
+            'skipped': State.SKIPPED,
+            'failed': State.FAILED,
+            'upstream_failed': State.UPSTREAM_FAILED,
+            'running': State.RUNNING,
+            'test_task': State.SUCCESS,
+        }
+        self.assertEqual((1, 1, 1, 1, 4),
+                         TriggerRuleDep._count_upstream_states(ti, task_states))
+
+    def test_task_states_dep_context(self):
+        """
+        The dep is evaluated against the task states of the dep context
+        """
+        dag = DAG('test_task_states_dep_context', start_date=datetime(2015, 1, 1))
+        upstream1 = DummyOperator(task_id='upstream1', dag=dag)
+        upstream2 = DummyOperator(task_id='upstream2', dag=dag)
+        task = DummyOperator(task_id='task', dag=dag)
+        task.set_upstream([upstream1, upstream2])
+        ti = TaskInstance(task=task, execution_date=datetime(2015, 1, 1))
+
+        dep_context = DepContext(task_states={'upstream1': State.SUCCESS,
+                                              'upstream2': State.RUNNING})
+        self.assertFalse(TriggerRuleDep().is_met(ti=ti, dep_context=dep_context))
+
+        dep_context.task_states['upstream2'] = State.SUCCESS
+        self.assertTrue(TriggerRuleDep().is_met(ti=ti, dep_context=dep_context))
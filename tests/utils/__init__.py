@@ -14,3 +14,6 @@
 
 from .compression import *
 from .dates import *
+from .dag_processing import *
+from .log_readers import *
+from .remote_logs import *
@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime
+
+from airflow.utils.dag_processing import (AbstractDagFileProcessor,
+                                          DagFileProcessorManager,
+                                          SimpleDag,
+                                          SimpleDagStore)
+
+
+class FakeDagFileProcessor(AbstractDagFileProcessor):
+
+    def __init__(self, file_path, started, simple_dag_store):
+        self._file_path = file_path
+        self._started = started
+        self._simple_dag_store = simple_dag_store
+
+    def start(self):
+        self._started.append(os.path.basename(self._file_path))
+        self._start_time = datetime.now()
+        self._result = self._simple_dag_store.write(
+            self._file_path,
+            [SimpleDag(os.path.basename(self._file_path), [], self._file_path,
+                       16, False, None)])
+
+    def terminate(self, sigkill=False):
+        pass
+
+    @property
+    def pid(self):
+        return 0
+
+    @property
+    def exit_code(self):
+        return 0
+
+    @property
+    def done(self):
+        return True
+
+    @property
+    def result(self):
+        return self._result
+
+    @property
+    def start_time(self):
+        return self._start_time
+
+    @property
+    def log_file(self):
+        return None
+
+    @property
+    def file_path(self):
+        return self._file_path
+
+
+class DagFileProcessorManagerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dag_directory = tempfile.mkdtemp()
+        self.file_paths = []
+        for filename in ['a.py', 'b.py', 'c.py']:
+            self.file_paths.append(os.path.join(self.dag_directory, filename))
+            self.write(filename, filename)
+        self.started = []
+        self.simple_dag_store = SimpleDagStore(os.path.join(self.dag_directory, 'store'))
+        self.manager = DagFileProcessorManager(
+            self.dag_directory,
+            self.file_paths,
+            1,
+            0,
+            os.path.join(self.dag_directory, 'logs'),
+            -1,
+            lambda file_path, _: FakeDagFileProcessor(file_path, self.started,
+                                                      self.simple_dag_store),
+            self.simple_dag_store,
+            unchanged_file_process_interval=3600)
+
+    def tearDown(self):
+        shutil.rmtree(self.dag_directory)
+
+    def write(self, filename, content):
+        with open(os.path.join(self.dag_directory, filename), 'w') as f:
+            f.write(content)
+
+    def heartbeat(self, times):
+        for _ in range(times):
+            self.manager.heartbeat()
+        started, self.started[:] = list(self.started), []
+        return started
+
+    def test_unchanged_files_are_not_processed(self):
+        self.assertEqual(['a.py', 'b.py', 'c.py'], self.heartbeat(4))
+
+        # touched only
+        os.utime(self.file_paths[1], (0, 0))
+        self.assertEqual([], self.heartbeat(2))
+
+        self.write('c.py', 'modified c.py')
+        self.assertEqual(['c.py'], self.heartbeat(2))
+
+    def test_modified_files_go_first(self):
+        self.assertEqual(['a.py', 'b.py', 'c.py'], self.heartbeat(3))
+
+        self.manager._last_runtime[self.file_paths[0]] = 10
+        self.manager._last_runtime[self.file_paths[1]] = 1
+        self.write('a.py', 'modified a.py')
+        self.write('b.py', 'modified b.py')
+        self.assertEqual(['b.py', 'a.py'], self.heartbeat(3))
+
+    def test_simple_dags_of_all_processed_files(self):
+        self.assertEqual([], self.manager.heartbeat())
+        self.heartbeat(3)
+        self.assertEqual(['a.py', 'b.py', 'c.py'],
+                         sorted(simple_dag.dag_id for simple_dag in self.manager.heartbeat()))
+
+        self.manager.set_file_paths(self.file_paths[1:])
+        self.assertEqual(['b.py', 'c.py'],
+                         sorted(simple_dag.dag_id for simple_dag in self.manager.heartbeat()))
+
+
+class SimpleDagStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_write_read(self):
+        writer = SimpleDagStore(self.folder)
+        reader = SimpleDagStore(self.folder)
+        simple_dag = SimpleDag('dag', ['task'], '/dags/dag.py', 16, False, None)
+
+        reader.read('/dags/dag.py')
+        self.assertEqual([], reader.simple_dags)
+
+        version = writer.write('/dags/dag.py', [simple_dag])
+        self.assertEqual(version, writer.write('/dags/dag.py', [simple_dag]))
+        reader.read('/dags/dag.py', version)
+        self.assertEqual(['dag'], [x.dag_id for x in reader.simple_dags])
+        self.assertEqual(['task'], reader.simple_dags[0].task_ids)
+
+        # the same version is not read again
+        read_simple_dags = reader.simple_dags
+        reader.read('/dags/dag.py', version)
+        self.assertIs(read_simple_dags[0], reader.simple_dags[0])
+
+        new_version = writer.write('/dags/dag.py', [])
+        self.assertNotEqual(version, new_version)
+        reader.read('/dags/dag.py', new_version)
+        self.assertEqual([], reader.simple_dags)
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import unicode_literals
+
+import os
+import tempfile
+import unittest
+
+from airflow.utils import logging as log_utils
+
+
+class LogReaderTest(unittest.TestCase):
+
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp()
+        with os.fdopen(fd, 'wb') as f:
+            f.write(b'0123456789')
+        self.reader = log_utils.LocalLogReader(self.path)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_read_chunk(self):
+        # tail of the log
+        chunk = self.reader.read_chunk(chunk_size=4)
+        self.assertEqual(
+            chunk, {'start': 6, 'end': 10, 'size': 10, 'content': '6789'})
+
+        # chunk before an offset
+        chunk = self.reader.read_chunk(end=6, chunk_size=4)
+        self.assertEqual((chunk['start'], chunk['content']), (2, '2345'))
+        chunk = self.reader.read_chunk(end=2, chunk_size=4)
+        self.assertEqual((chunk['start'], chunk['content']), (0, '01'))
+
+        # chunk after an offset, nothing past the end
+        chunk = self.reader.read_chunk(start=8, chunk_size=4)
+        self.assertEqual((chunk['end'], chunk['content']), (10, '89'))
+        chunk = self.reader.read_chunk(start=10, chunk_size=4)
+        self.assertEqual((chunk['end'], chunk['content']), (10, ''))
+
+    def test_iter_chunks(self):
+        self.assertEqual(
+            list(self.reader.iter_chunks(chunk_size=4)),
+            [b'0123', b'4567', b'89'])
+
+    def test_read_chunk_utf8(self):
+        with open(self.path, 'wb') as f:
+            f.write('a\u00e9b\u20acc'.encode('utf-8'))
+        # the offsets in the middle of a character move back to its first
+        # byte, so adjacent chunks share no byte and split no character
+        chunk = self.reader.read_chunk(start=0, chunk_size=2)
+        self.assertEqual((chunk['end'], chunk['content']), (1, 'a'))
+        chunk = self.reader.read_chunk(start=1, chunk_size=4)
+        self.assertEqual((chunk['end'], chunk['content']), (4, '\u00e9b'))
+        chunk = self.reader.read_chunk(end=7, chunk_size=5)
+        self.assertEqual(
+            (chunk['start'], chunk['content']), (1, '\u00e9b\u20ac'))
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import unicode_literals
+
+import os
+import tempfile
+import unittest
+
+from airflow.utils import logging as log_utils
+
+
+class DictLog(log_utils.RemoteLog):
+    """
+    A remote log kept in a dict, keyed by object location
+    """
+    def __init__(self):
+        self.hook = True
+        self.objects = {}
+
+    def _list_parts(self, remote_log_location):
+        names = sorted(
+            (name for name in self.objects
+             if name.startswith(remote_log_location + self.PART_SEPARATOR)),
+            key=self._part_number)
+        if remote_log_location in self.objects:
+            names.insert(0, remote_log_location)
+        return [(name, len(self.objects[name])) for name in names]
+
+    def _read_part(self, part, start, end):
+        return self.objects[part][start:end]
+
+    def _upload_part(self, filename, offset, remote_part_location):
+        with open(filename, 'rb') as f:
+            f.seek(offset)
+            self.objects[remote_part_location] = f.read()
+
+    def _delete_part(self, part):
+        del self.objects[part]
+
+    def _part_name(self, part):
+        return part
+
+
+class RemoteLogTest(unittest.TestCase):
+
+    def setUp(self):
+        self.rlog = DictLog()
+        fd, self.path = tempfile.mkstemp()
+        with os.fdopen(fd, 'wb') as f:
+            f.write(b'try 1\ntry 2\n')
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_append_parts(self):
+        rlog = self.rlog
+        rlog.objects['s3://bucket/log'] = b'legacy\n'
+        rlog.write_file(self.path, 's3://bucket/log')
+        rlog.write_file(self.path, 's3://bucket/log', offset=6)
+
+        self.assertEqual(
+            sorted(rlog.objects),
+            ['s3://bucket/log', 's3://bucket/log.part-00001',
+             's3://bucket/log.part-00002'])
+        self.assertEqual(rlog.read('s3://bucket/log'),
+                         'legacy\ntry 1\ntry 2\ntry 2\n')
+        self.assertEqual(rlog.size('s3://bucket/log'), 25)
+        # a range spanning parts
+        self.assertEqual(rlog.read_range('s3://bucket/log', 4, 16),
+                         b'cy\ntry 1\ntry')
+
+        rlog.write('new\n', 's3://bucket/log', append=False)
+        self.assertEqual(list(rlog.objects), ['s3://bucket/log.part-00001'])
+        self.assertEqual(rlog.read('s3://bucket/log'), 'new\n')
+
+    def test_nothing_to_append(self):
+        rlog = self.rlog
+        rlog.write_file(self.path, 's3://bucket/log')
+        rlog.write_file(self.path, 's3://bucket/log',
+                        offset=os.path.getsize(self.path))
+
+        self.assertEqual(list(rlog.objects), ['s3://bucket/log.part-00001'])
+        self.assertEqual(rlog.size('s3://bucket/log'), 12)